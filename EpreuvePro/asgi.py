@@ -5,6 +5,14 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Les téléchargements (épreuves, corrigés, livres) sont des vues asynchrones
+dont le fichier est envoyé sans occuper de thread : servi par uvicorn, un
+processus porte des milliers de téléchargements lents simultanés.
+
+    uvicorn EpreuvePro.asgi:application --workers 4
+
+Comparaison avec le chemin WSGI : python manage.py bench_downloads
 """
 
 import os
@@ -36,11 +36,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.querybudget.QueryBudgetMiddleware',  # Actif si QUERY_BUDGET['ENABLED'] (voir section 11)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'epreuves.taxonomy.TaxonomieMiddleware',  # Version du registre scolaire vérifiée une fois par requête
+    'dashboard.subscription.SubscriptionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -72,6 +75,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Base de test sur fichier (et non en mémoire partagée) : des connexions
+        # concurrentes s'attendent sur le verrou d'écriture, comme en production
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -112,6 +118,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Fichiers envoyés (épreuves, corrigés, livres)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -160,3 +170,85 @@ MESSAGE_TAGS = {
 
 
 
+
+# 6. Pagination par curseur
+PAGINATION_COUNT_TIMEOUT = 300  # Durée de cache du total des listes (secondes)
+
+# 7. Compteurs à écriture différée (vues, téléchargements, lectures)
+COUNTER_BUFFER = {
+    'BACKEND': 'memory',  # 'spool' pour partager le tampon entre workers (fichiers locaux)
+    'INTERVAL': 30,  # Secondes entre deux écritures groupées
+    'DIRECTORY': BASE_DIR / 'var' / 'compteurs',
+}
+
+# 8. Livraison des fichiers téléchargés (voir core/delivery.py)
+FILE_DELIVERY = {
+    # 'core.delivery.XAccelRedirectBackend' (nginx), 'core.delivery.XSendfileBackend'
+    # (Apache/lighttpd) ou 'core.delivery.SignedURLBackend' (URL signées)
+    'BACKEND': 'core.delivery.FileResponseBackend',
+    'OPTIONS': {
+        'LOCATION': '/protected/',  # X-Accel-Redirect : location `internal` sur MEDIA_ROOT
+        'BASE_URL': '/fichiers/',  # SignedURLBackend
+        'TTL': 300,  # Durée de validité des URL signées (secondes)
+    },
+}
+
+# 9. Abonnement de l'utilisateur courant (request.subscription, voir dashboard/subscription.py)
+SUBSCRIPTION_CACHE_TIMEOUT = 300  # Secondes ; invalidé à chaque modification de l'abonnement
+
+# 10. Archives ZIP des lots d'épreuves (voir epreuves/bundles.py)
+BUNDLE_CACHE = {
+    'ENABLED': False,  # Garder sur disque les archives des lots souvent demandés
+    'LOCATION': 'lots',  # Sous MEDIA_ROOT : servies par le backend de FILE_DELIVERY
+    'MIN_REQUESTS': 3,  # Demandes d'un même lot avant sa mise en cache
+}
+
+# 11. Budget de requêtes SQL par vue et détection des N+1 (voir core/querybudget.py)
+QUERY_BUDGET = {
+    'ENABLED': DEBUG,  # En-têtes X-Requetes, X-Budget-Requetes et X-N-Plus-Un
+    'RAISE': False,  # Lever une exception en cas de dépassement ou de N+1
+    'REPETITIONS': 5,  # Exécutions d'une même requête, au même endroit, qui font un N+1
+}
+
+# 12. Caches partagés par les workers de la machine (fichiers SQLite, voir core/cache.py) ;
+# 'fragments' : cartes des listes d'épreuves et de livres ({% cache ... using="fragments" %})
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache' / 'default.sqlite3',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'L1_MAX_ENTRIES': 500,  # Valeurs gardées en mémoire par chaque worker
+        },
+    },
+    'fragments': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache' / 'fragments.sqlite3',
+        # Éviction LRU : au-delà de MAX_ENTRIES, le quart le moins récemment lu est retiré
+        'OPTIONS': {'MAX_ENTRIES': 5000, 'CULL_FREQUENCY': 4, 'L1_MAX_ENTRIES': 1000},
+    },
+}
+FRAGMENT_CACHE_TIMEOUT = 86400  # Secondes ; la clé d'une carte change avec son updated_at
+
+# 13. Cache des pages du catalogue pour les visiteurs anonymes (voir core/pagecache.py)
+PAGE_CACHE = {
+    'ENABLED': True,
+    'CACHE': 'default',  # Alias de CACHES
+    'TIMEOUT': 300,  # Secondes ; les modifications des modèles invalident avant
+    'STATS_INTERVAL': 30,  # Secondes entre deux reports des hits/misses du processus dans le cache
+}
+
+# 14. Recalcul unique des valeurs en cache expirées (pages, facettes, totaux ; voir core/singleflight.py)
+SINGLE_FLIGHT = {
+    'CACHE': 'default',  # Alias de CACHES ; verrou partagé par les workers
+    'STALE': 60,  # Secondes pendant lesquelles une valeur expirée est encore servie, le temps de son recalcul
+    'LOCK_TIMEOUT': 30,  # Secondes ; au-delà, un calcul interrompu ne bloque plus les autres workers
+    'WAIT': 2.0,  # Secondes d'attente d'une valeur absente calculée par un autre worker
+    'BETA': 1.0,  # Recalcul anticipé probabiliste (XFetch) ; 0 pour le désactiver
+}
+
+# 15. Statistiques globales du site (voir dashboard/sitestats.py)
+SITE_STATS = {
+    'TIMEOUT': 300,  # Secondes avant un recalcul, fait en arrière-plan
+    'STALE': 86400,  # Secondes pendant lesquelles les anciens totaux restent servis
+}
@@ -8,7 +8,8 @@ from django.utils.http import url_has_allowed_host_and_scheme
 
 from .forms import UserRegistrationForm, UserLoginForm
 
-from dashboard.models import Abonnement, UserStats
+from core.decorators import budget_requetes
+from dashboard import stats as statistiques
 
 # Modèles d'epreuves (pour les téléchargements et matières)
 from epreuves.models import Telechargement, Matiere
@@ -16,6 +17,7 @@ from epreuves.models import Telechargement, Matiere
 from .models import UserPreference
 
 @require_http_methods(["GET", "POST"])
+@budget_requetes(8)
 def login_view(request):
     """Vue de connexion"""
     # ✅ Redirection si déjà connecté
@@ -67,6 +69,7 @@ def login_view(request):
 
 
 @require_http_methods(["GET", "POST"])
+@budget_requetes(14)
 def register_view(request):
     """Vue d'inscription"""
     if request.user.is_authenticated:
@@ -112,6 +115,7 @@ def register_view(request):
 
 
 @login_required
+@budget_requetes(7)
 def logout_view(request):
     """Vue de déconnexion"""
     # ✅ Logger la déconnexion avant de déconnecter
@@ -135,21 +139,16 @@ def logout_view(request):
 
 
 @login_required
+@budget_requetes(8)
 def profile_view(request):
     """Vue du profil utilisateur"""
     user = request.user
     
-    # Récupérer ou créer l'abonnement
-    abonnement, _ = Abonnement.objects.get_or_create(
-        user=user,
-        defaults={'plan': 'gratuit', 'telechargements_inclus': 3}
-    )
+    # Abonnement (chargé une fois par requête, sans écriture)
+    abonnement = request.subscription
     
-    # Récupérer les stats
-    stats, _ = UserStats.objects.get_or_create(
-        user=user,
-        defaults={'total_downloads': 0}
-    )
+    # Récupérer les stats (sans écriture)
+    stats = statistiques.charger(user)
     
     # Téléchargements récents
     recent_downloads = Telechargement.objects.filter(
@@ -170,7 +169,7 @@ def profile_view(request):
         'stats': stats,
         'recent_downloads': recent_downloads,
         'favorite_matiere': favorite_matiere,
-        'downloads_remaining': abonnement.telechargements_restant(),
+        'downloads_remaining': abonnement.downloads_remaining,
     }
     
     return render(request, 'accounts/profile.html', context)
@@ -178,6 +177,7 @@ def profile_view(request):
 
 @login_required
 @require_http_methods(["POST"])
+@budget_requetes(6)
 def update_profile_view(request):
     """Mise à jour du profil"""
     user = request.user
@@ -205,6 +205,7 @@ def update_profile_view(request):
 # apps/accounts/views.py
 
 @login_required
+@budget_requetes(6)
 def preferences_view(request):
     """Préférences utilisateur"""
     preference, _ = UserPreference.objects.get_or_create(user=request.user)
@@ -235,6 +236,7 @@ def preferences_view(request):
 
 @login_required
 @require_http_methods(["POST"])
+@budget_requetes(6)
 def update_profile_view(request):
     """Mise à jour du profil (AJAX ou formulaire)"""
     user = request.user
@@ -286,6 +288,7 @@ def verify_email_view(request, token):
 
 
 @login_required
+@budget_requetes(6)
 def resend_verification_email(request):
     """Renvoyer l'email de vérification"""
     if request.user.email_verified:
@@ -1,8 +1,8 @@
-from django.urls import path,include
-from .import views
+from django.urls import path
+from . import views
 
-app_name = ''
+app_name = 'api'
 
 urlpatterns = [
-    
+    path('stats/', views.statistiques_site, name='statistiques_site'),
 ]
@@ -1,3 +1,15 @@
-from django.shortcuts import render
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from core.decorators import budget_requetes
+from dashboard import sitestats
+
+
+@require_GET
+@budget_requetes(5)
+def statistiques_site(request):
+    """Totaux du site (épreuves, corrigés, utilisateurs, livres, téléchargements du jour)"""
+    response = JsonResponse(sitestats.totaux())
+    patch_cache_control(response, public=True, max_age=60)
+    return response
@@ -0,0 +1,373 @@
+# apps/core/cache.py
+
+"""
+Backend de cache partagé entre les workers d'une machine, sans serveur
+
+SQLiteCache range les entrées dans un fichier SQLite local en mode WAL :
+tous les processus qui ouvrent le même fichier (LOCATION) voient les mêmes
+entrées, les lectures ne bloquent pas les écritures.
+- add(), incr()/decr() et touch() sont atomiques entre processus (une seule
+  instruction SQL, ou une transaction IMMEDIATE) ;
+- les entiers sont stockés tels quels : incr() est un UPDATE value = value + n ;
+- au-delà de MAX_ENTRIES, les entrées expirées puis la fraction
+  1/CULL_FREQUENCY des moins récemment lues sont retirées (LRU). La date de
+  lecture n'est réécrite qu'au plus une fois par seconde et par entrée. Le
+  nombre d'entrées n'est compté qu'une écriture sur CULL_EVERY par processus
+  (par défaut 1 % de MAX_ENTRIES) : le cache peut dépasser MAX_ENTRIES
+  d'autant d'écritures par processus avant d'être élagué.
+
+Devant SQLite, un petit cache L1 par processus (L1_MAX_ENTRIES entrées, LRU)
+garde la forme sérialisée des dernières valeurs lues. Il reste cohérent grâce
+à des tampons de version partagés : un segment de mémoire partagée (fichier
+`<LOCATION>-tampons` projeté par mmap) de TAMPONS entiers, dont celui de la
+clé est renouvelé après chaque écriture, et une époque renouvelée par clear()
+et l'éviction. Une valeur du L1 n'est servie, sans requête SQL, que si le
+tampon relevé avant sa lecture n'a pas changé.
+
+    CACHES = {'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 4, 'CULL_EVERY': 100, 'L1_MAX_ENTRIES': 500, 'TAMPONS': 65536},
+    }}
+
+`bench_cache` compare ce backend à LocMemCache et FileBasedCache.
+"""
+
+import mmap
+import os
+import itertools
+import pickle
+import random
+import secrets
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+"""
+
+# Écart minimal (secondes) entre deux mises à jour de la date de lecture d'une entrée
+RESOLUTION_LRU = 1.0
+
+# Entiers stockés tels quels : ceux que SQLite représente (bool exclus)
+_ENTIER_MIN, _ENTIER_MAX = -(2 ** 63), 2 ** 63 - 1
+
+_TAMPON = struct.Struct('<q')
+
+
+def _serialiser(value):
+    if type(value) is int and _ENTIER_MIN <= value <= _ENTIER_MAX:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _deserialiser(stocke):
+    if isinstance(stocke, int):
+        return stocke
+    return pickle.loads(stocke)
+
+
+class Tampons:
+    """
+    Tampons de version partagés entre processus : l'époque, puis `nombre`
+    entiers de 64 bits. Plusieurs clés peuvent partager un tampon : une
+    écriture de l'une fait seulement relire les autres depuis SQLite.
+    """
+
+    def __init__(self, path, nombre):
+        self.path = path
+        self.nombre = nombre
+        self._segment = None
+        self._lock = threading.Lock()
+
+    def _projeter(self):
+        if self._segment is None:
+            with self._lock:
+                if self._segment is None:
+                    taille = _TAMPON.size * (self.nombre + 1)
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                    try:
+                        if os.fstat(fd).st_size < taille:
+                            os.ftruncate(fd, taille)
+                        # MAP_SHARED : partagé avec les autres processus, et hérité au fork
+                        self._segment = mmap.mmap(fd, taille)
+                    finally:
+                        os.close(fd)
+        return self._segment
+
+    def _position(self, key):
+        return _TAMPON.size * (1 + zlib.crc32(key.encode()) % self.nombre)
+
+    def lire(self, key):
+        segment = self._projeter()
+        return _TAMPON.unpack_from(segment, 0)[0], _TAMPON.unpack_from(segment, self._position(key))[0]
+
+    def renouveler(self, key):
+        _TAMPON.pack_into(self._projeter(), self._position(key), secrets.randbits(63))
+
+    def renouveler_tout(self):
+        _TAMPON.pack_into(self._projeter(), 0, secrets.randbits(63))
+
+
+class L1:
+    """Dernières valeurs lues par le processus : {clé: (tampon, expiration, valeur sérialisée, lue le)}, LRU"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        if not self.max_entries:
+            return None
+        with self._lock:
+            entree = self._data.get(key)
+            if entree is not None:
+                self._data.move_to_end(key)
+            return entree
+
+    def set(self, key, *entree):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._data[key] = entree
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache(BaseCache):
+    """Cache dans un fichier SQLite (WAL), partagé par les processus de la machine"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = Path(location)
+        options = params.get('OPTIONS', {})
+        self.l1 = L1(int(options.get('L1_MAX_ENTRIES', 500)))
+        self.tampons = Tampons(self.path.with_name(self.path.name + '-tampons'), int(options.get('TAMPONS', 65536)))
+        self._local = threading.local()
+        # Élagage vérifié toutes les `_elagage` écritures ; départ décalé d'un processus à l'autre
+        self._elagage = max(1, int(options.get('CULL_EVERY', self._max_entries // 100)))
+        self._ecritures = itertools.count(random.randrange(self._elagage))
+
+    # ==================== CONNEXION ====================
+
+    def _connexion(self):
+        """Connexion du thread courant, rouverte après un fork"""
+        connexion = getattr(self._local, 'connexion', None)
+        if connexion is not None and self._local.pid == os.getpid():
+            return connexion
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connexion = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        connexion.execute('PRAGMA journal_mode=WAL')
+        connexion.execute('PRAGMA synchronous=NORMAL')
+        connexion.executescript(SCHEMA)
+        self._local.connexion, self._local.pid = connexion, os.getpid()
+        return connexion
+
+    def close(self, **kwargs):
+        # Connexion conservée d'une requête à l'autre : rien à fermer
+        pass
+
+    def _modifiee(self, key):
+        """Après l'écriture d'une clé : les L1 de tous les processus la reliront"""
+        self.tampons.renouveler(key)
+        self.l1.delete(key)
+
+    # ==================== LECTURE ====================
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        # Tampon relevé avant la lecture : une écriture concurrente le renouvellera après
+        tampon = self.tampons.lire(key)
+        entree = self.l1.get(key)
+        if entree is not None and entree[0] == tampon and (entree[1] is None or entree[1] > now):
+            _, expires, stocke, lue = entree
+            if lue < now - RESOLUTION_LRU:
+                self._connexion().execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+                self.l1.set(key, tampon, expires, stocke, now)
+            return _deserialiser(stocke)
+
+        ligne = self._connexion().execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if ligne is None or (ligne[1] is not None and ligne[1] <= now):
+            self.l1.delete(key)
+            return default
+        stocke, expires, lue = ligne
+        if lue < now - RESOLUTION_LRU:
+            self._connexion().execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+            lue = now
+        self.l1.set(key, tampon, expires, stocke, lue)
+        return _deserialiser(stocke)
+
+    def get_many(self, keys, version=None):
+        cles = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not cles:
+            return {}
+        now = time.time()
+        lignes = self._connexion().execute(
+            f"SELECT key, value, expires, accessed FROM cache WHERE key IN ({', '.join('?' * len(cles))})",
+            list(cles),
+        ).fetchall()
+        resultat, lues = {}, []
+        for key, stocke, expires, accessed in lignes:
+            if expires is None or expires > now:
+                resultat[cles[key]] = _deserialiser(stocke)
+                if accessed < now - RESOLUTION_LRU:
+                    lues.append((now, key))
+        if lues:
+            self._connexion().executemany('UPDATE cache SET accessed = ? WHERE key = ?', lues)
+        return resultat
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connexion().execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    # ==================== ÉCRITURE ====================
+
+    def _ecrire(self, key, value, timeout, seulement_si_absente=False):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        sql = (
+            'INSERT INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires, accessed = excluded.accessed'
+        )
+        parametres = (key, _serialiser(value), expires, now)
+        if seulement_si_absente:
+            # Une entrée expirée compte comme absente
+            sql += ' WHERE cache.expires IS NOT NULL AND cache.expires <= ?'
+            parametres += (now,)
+        connexion = self._connexion()
+        ecrite = connexion.execute(sql, parametres).rowcount > 0
+        if ecrite:
+            self._modifiee(key)
+            self._elaguer(connexion, now)
+        return ecrite
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._ecrire(key, value, timeout, seulement_si_absente=True)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._ecrire(key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version=version)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        touchee = self._connexion().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        ).rowcount > 0
+        if touchee:
+            self._modifiee(key)
+        return touchee
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        connexion = self._connexion()
+        ligne = None
+        if _ENTIER_MIN <= delta <= _ENTIER_MAX:
+            # Un dépassement de capacité donnerait un réel : la valeur passe alors par pickle
+            ligne = connexion.execute(
+                'UPDATE cache SET value = value + ? '
+                "WHERE key = ? AND (expires IS NULL OR expires > ?) "
+                "AND typeof(value) = 'integer' AND typeof(value + ?) = 'integer' "
+                'RETURNING value',
+                (delta, key, now, delta),
+            ).fetchone()
+        valeur = ligne[0] if ligne is not None else self._incr_serialise(connexion, key, delta, now)
+        self._modifiee(key)
+        return valeur
+
+    def _incr_serialise(self, connexion, key, delta, now):
+        """incr() d'une valeur non stockée comme entier SQLite, sous verrou d'écriture"""
+        connexion.execute('BEGIN IMMEDIATE')
+        try:
+            ligne = connexion.execute(
+                'SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, now),
+            ).fetchone()
+            if ligne is None:
+                raise ValueError(f"Key '{key}' not found")
+            valeur = _deserialiser(ligne[0]) + delta
+            connexion.execute('UPDATE cache SET value = ? WHERE key = ?', (_serialiser(valeur), key))
+        except BaseException:
+            connexion.execute('ROLLBACK')
+            raise
+        connexion.execute('COMMIT')
+        return valeur
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        supprimee = self._connexion().execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+        self._modifiee(key)
+        return supprimee
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete(key, version=version)
+
+    def clear(self):
+        self._connexion().execute('DELETE FROM cache')
+        self.tampons.renouveler_tout()
+        self.l1.clear()
+
+    # ==================== ÉVICTION ====================
+
+    def _elaguer(self, connexion, now):
+        """Au-delà de MAX_ENTRIES : entrées expirées, puis les moins récemment lues"""
+        # Comptage (parcours de l'index) une écriture sur `_elagage` seulement
+        if next(self._ecritures) % self._elagage:
+            return
+        nombre = connexion.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if nombre <= self._max_entries:
+            return
+        nombre -= connexion.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (now,)
+        ).rowcount
+        if nombre > self._max_entries:
+            if self._cull_frequency:
+                connexion.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                    (nombre // self._cull_frequency,),
+                )
+            else:
+                connexion.execute('DELETE FROM cache')
+        # Entrées retirées sans renouveler leur tampon : les L1 repartent de zéro
+        self.tampons.renouveler_tout()
+        self.l1.clear()
@@ -0,0 +1,280 @@
+# apps/core/counters.py
+
+"""
+Compteurs à écriture différée (write-behind)
+
+Les compteurs de popularité (nombre_vues, nombre_telechargements,
+nombre_lectures...) ne sont plus écrits à chaque requête : les incréments
+sont accumulés puis appliqués par lots, au plus une fois par intervalle,
+sous forme d'UPDATE ... SET champ = champ + n.
+
+Deux stockages des incréments en attente :
+- 'memory' : par processus ; chaque worker vide son tampon à chaque
+  intervalle et à l'arrêt (atexit). Aucun autre processus ne le voit :
+  `flush_counters` refuse ce stockage.
+- 'spool'  : fichiers d'ajout dans un répertoire local partagé par tous
+  les workers de la machine ; n'importe quel processus (ou la commande
+  `flush_counters` lancée par cron) peut les vider. Les fichiers d'un
+  vidage interrompu (arrêt brutal) sont repris au démarrage suivant.
+
+Un compteur recopié dans une autre table (projection dénormalisée, même
+clé primaire) y reçoit les mêmes incréments : voir refleter().
+
+Configuration (settings.COUNTER_BUFFER) :
+    {'BACKEND': 'memory', 'INTERVAL': 30, 'DIRECTORY': BASE_DIR / 'var' / 'compteurs'}
+"""
+
+import atexit
+import fcntl
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore:
+    """Incréments en attente, propres au processus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = defaultdict(int)
+
+    def add(self, key, n):
+        with self._lock:
+            self._data[key] += n
+
+    def add_many(self, data):
+        with self._lock:
+            for key, n in data.items():
+                self._data[key] += n
+
+    def drain(self):
+        with self._lock:
+            data, self._data = self._data, defaultdict(int)
+        return dict(data)
+
+
+class SpoolStore:
+    """
+    Incréments en attente dans des fichiers d'ajout, partagés entre processus.
+
+    Chaque processus écrit dans son propre fichier `<pid>.spool` sous verrou
+    flock. Le vidage renomme le fichier, attend le verrou puis le lit :
+    un écrivain qui aurait ouvert l'ancien fichier le détecte (inode changé)
+    et réécrit dans un nouveau fichier, aucun incrément n'est perdu.
+
+    Le fichier renommé (`<...>.<pid du videur>.<uuid>.flush`) n'est supprimé
+    qu'une fois lu : s'il reste alors que son processus n'existe plus, il
+    est remis en attente (à la création du stockage et à chaque vidage).
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._reprendre_orphelins()
+
+    def _reprendre_orphelins(self):
+        """Remet en attente les fichiers d'un vidage dont le processus a disparu"""
+        for chemin in self.directory.glob('*.flush'):
+            try:
+                pid = int(chemin.name.split('.')[-3])
+            except (IndexError, ValueError):
+                continue
+            if _processus_actif(pid):
+                continue
+            try:
+                chemin.rename(self.directory / f'orphelin-{uuid.uuid4().hex}.spool')
+            except FileNotFoundError:
+                continue  # Déjà repris par un autre processus
+
+    def _chemin(self):
+        return self.directory / f'{os.getpid()}.spool'
+
+    def _ecrire(self, lignes):
+        chemin = self._chemin()
+        while True:
+            with open(chemin, 'a', encoding='ascii') as fichier:
+                fcntl.flock(fichier, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(fichier.fileno()).st_ino != os.stat(chemin).st_ino:
+                        continue
+                except FileNotFoundError:
+                    continue
+                fichier.write(lignes)
+                return
+
+    def add(self, key, n):
+        self.add_many({key: n})
+
+    def add_many(self, data):
+        self._ecrire(''.join(
+            f'{label} {pk} {champ} {n}\n' for (label, pk, champ), n in data.items()
+        ))
+
+    def drain(self):
+        self._reprendre_orphelins()
+        data = defaultdict(int)
+        for chemin in self.directory.glob('*.spool'):
+            cible = chemin.with_suffix(f'.{os.getpid()}.{uuid.uuid4().hex}.flush')
+            try:
+                chemin.rename(cible)
+            except FileNotFoundError:
+                continue
+            with open(cible, encoding='ascii') as fichier:
+                fcntl.flock(fichier, fcntl.LOCK_EX)
+                for ligne in fichier:
+                    label, pk, champ, n = ligne.split()
+                    data[(label, pk, champ)] += int(n)
+            cible.unlink()
+        return dict(data)
+
+
+def _processus_actif(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Processus d'un autre utilisateur
+    return True
+
+
+# (modèle, champ) -> modèles recevant les mêmes incréments (même clé
+# primaire), ex. une projection dénormalisée ; voir refleter()
+MIROIRS = defaultdict(set)
+
+
+def refleter(source, champ, cible):
+    """Applique aussi les incréments de `source.champ` au champ de même nom de `cible`"""
+    MIROIRS[(source, champ)].add(cible)
+
+
+class CounterBuffer:
+    """
+    Accumule les incréments et les applique par lots toutes les `interval`
+    secondes. Le vidage déclenché par une requête se fait dans un thread :
+    une erreur (ex. 'database is locked') est journalisée, les incréments
+    restent en attente, la requête n'échoue jamais. Seul flush(), appelé
+    explicitement (`flush_counters`), propage l'erreur.
+    """
+
+    def __init__(self, store, interval=30):
+        self.store = store
+        self.interval = interval
+        self._dernier_vidage = time.monotonic()
+        self._lock = threading.Lock()
+        # Thread du dernier vidage déclenché par incr()
+        self._vidage = None
+        self._vidage_lock = threading.Lock()
+
+    def incr(self, instance, champ, n=1):
+        label = instance._meta.label_lower
+        self.store.add((label, str(instance.pk), champ), n)
+        if time.monotonic() - self._dernier_vidage >= self.interval:
+            self._vider_en_arriere_plan()
+
+    def _vider_en_arriere_plan(self):
+        with self._vidage_lock:
+            if self._vidage is not None and self._vidage.is_alive():
+                return
+            # Les requêtes suivantes de l'intervalle ne relancent pas de vidage
+            self._dernier_vidage = time.monotonic()
+            self._vidage = threading.Thread(target=self.vider_sans_erreur, daemon=True)
+            self._vidage.start()
+
+    def vider_sans_erreur(self, attente=0):
+        """flush() dont l'échec est journalisé (incréments remis en attente)"""
+        try:
+            self.flush(attente)
+        except Exception:
+            logger.exception("Écriture des compteurs différés impossible, nouvel essai au prochain intervalle")
+        finally:
+            # Connexions ouvertes par ce thread : fermées avec lui
+            connections.close_all()
+
+    def flush(self, attente=0):
+        """
+        Applique les incréments en attente. Retourne le nombre d'UPDATE exécutés.
+        Si un autre thread est en train de vider, abandonne, ou l'attend au
+        plus `attente` secondes puis vide ce qu'il reste.
+        """
+        if not (self._lock.acquire(timeout=attente) if attente else self._lock.acquire(blocking=False)):
+            return 0
+        try:
+            self._dernier_vidage = time.monotonic()
+            data = self.store.drain()
+            if not data:
+                return 0
+
+            # Un UPDATE par (modèle, champ, incrément) pour tous les objets concernés
+            lots = defaultdict(list)
+            for (label, pk, champ), n in data.items():
+                if n:
+                    lots[(label, champ, n)].append(pk)
+
+            try:
+                with transaction.atomic():
+                    for (label, champ, n), pks in lots.items():
+                        for cible in (label, *MIROIRS.get((label, champ), ())):
+                            model = apps.get_model(cible)
+                            model.objects.filter(pk__in=pks).update(**{champ: F(champ) + n})
+            except Exception:
+                # Rien n'est perdu : les incréments retournent dans le tampon
+                self.store.add_many(data)
+                raise
+            return len(lots)
+        finally:
+            self._lock.release()
+
+
+def _creer_tampon():
+    config = getattr(settings, 'COUNTER_BUFFER', {})
+    if config.get('BACKEND', 'memory') == 'spool':
+        store = SpoolStore(config.get('DIRECTORY', Path(settings.BASE_DIR) / 'var' / 'compteurs'))
+    else:
+        store = MemoryStore()
+    return CounterBuffer(store, interval=config.get('INTERVAL', 30))
+
+
+# Attente maximale, à l'arrêt du processus, d'un vidage déjà en cours
+ATTENTE_ARRET = 10
+
+_tampon = None
+_tampon_lock = threading.Lock()
+
+
+def get_buffer():
+    global _tampon
+    if _tampon is None:
+        with _tampon_lock:
+            if _tampon is None:
+                _tampon = _creer_tampon()
+                atexit.register(_tampon.vider_sans_erreur, ATTENTE_ARRET)
+    return _tampon
+
+
+def incrementer(instance, champ, n=1):
+    """Incrémente `instance.champ` de `n` en différé"""
+    get_buffer().incr(instance, champ, n)
+
+
+async def aincrementer(instance, champ, n=1):
+    """incrementer() pour les vues asynchrones (écriture du spool hors de la boucle d'événements)"""
+    await sync_to_async(incrementer)(instance, champ, n)
+
+
+def vider():
+    """Force l'écriture des incréments en attente"""
+    return get_buffer().flush()
@@ -0,0 +1,38 @@
+# apps/core/decorators.py
+
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+
+
+def connexion_requise(vue):
+    """
+    login_required pour les vues synchrones comme asynchrones (celui de
+    Django 5.0 ne sait pas envelopper une vue `async def`).
+    L'utilisateur est lu avec request.auser() : aucune requête synchrone.
+    """
+    if not iscoroutinefunction(vue):
+        return login_required(vue)
+
+    @wraps(vue)
+    async def enveloppe(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await vue(request, *args, **kwargs)
+
+    return enveloppe
+
+
+def budget_requetes(n):
+    """
+    Nombre maximal de requêtes SQL de la vue, middleware compris.
+    Vérifié en développement par core.querybudget et par core.tests.BudgetsRequetesTests.
+    """
+    def decorateur(vue):
+        vue.budget_requetes = n
+        return vue
+
+    return decorateur
@@ -0,0 +1,177 @@
+# apps/core/delivery.py
+
+"""
+Livraison des fichiers téléchargés
+
+Les vues de téléchargement vérifient les droits et font la comptabilité,
+puis délèguent l'envoi des octets au backend configuré :
+
+- FileResponseBackend    : Django envoie le fichier lui-même (par défaut) ;
+- XAccelRedirectBackend  : nginx envoie le fichier (en-tête X-Accel-Redirect
+                           vers une location `internal`) ;
+- XSendfileBackend       : Apache (mod_xsendfile) ou lighttpd (X-Sendfile) ;
+- SignedURLBackend       : redirection vers une URL signée (HMAC-SHA256) et
+                           limitée dans le temps, vérifiable par un serveur
+                           statique sans passer par Django.
+
+Les vues asynchrones utilisent aservir() : la préparation de la réponse
+(stat du fichier) se fait dans un thread, le corps est lu bloc par bloc
+hors de la boucle d'événements (core.files).
+
+Configuration (settings.FILE_DELIVERY) :
+    {'BACKEND': 'core.delivery.XAccelRedirectBackend', 'OPTIONS': {'LOCATION': '/protected/'}}
+"""
+
+import base64
+import hashlib
+import hmac
+import time
+from functools import lru_cache
+from urllib.parse import quote, urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils.http import content_disposition_header
+from django.utils.module_loading import import_string
+
+from .files import servir_fichier
+
+
+# Un fichier désigné par l'empreinte de son contenu ne change jamais :
+# le navigateur peut le garder un an sans revalider (privé : accès contrôlé)
+CACHE_IMMUABLE = 'private, max-age=31536000, immutable'
+
+
+class FileResponseBackend:
+    """Envoi par le worker Django (Range, ETag, 304 gérés par core.files)"""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def servir(self, request, fichier, content_type=None, filename=None,
+               as_attachment=True, empreinte=None, cache_control=None):
+        return servir_fichier(
+            request, fichier,
+            content_type=content_type,
+            filename=filename,
+            as_attachment=as_attachment,
+            empreinte=empreinte,
+            cache_control=cache_control,
+        )
+
+
+class _ProxyBackend(FileResponseBackend):
+    """Réponse vide dont le corps sera fourni par le serveur frontal"""
+
+    entete = None
+
+    def cible(self, fichier):
+        raise NotImplementedError
+
+    def servir(self, request, fichier, content_type=None, filename=None,
+               as_attachment=True, empreinte=None, cache_control=None):
+        response = HttpResponse(content_type=content_type or '')
+        if not content_type:
+            # Laisser le serveur frontal déduire le type du fichier
+            del response['Content-Type']
+        response[self.entete] = self.cible(fichier)
+        disposition = content_disposition_header(as_attachment, filename or '')
+        if disposition:
+            response['Content-Disposition'] = disposition
+        if cache_control:
+            response['Cache-Control'] = cache_control
+        return response
+
+
+class XAccelRedirectBackend(_ProxyBackend):
+    """
+    nginx : LOCATION est une location `internal` pointant sur MEDIA_ROOT, ex:
+        location /protected/ { internal; alias /srv/epreuvepro/media/; }
+    nginx gère lui-même Range, ETag et If-Modified-Since.
+    """
+
+    entete = 'X-Accel-Redirect'
+
+    def cible(self, fichier):
+        return self.options.get('LOCATION', '/protected/') + quote(fichier.name)
+
+
+class XSendfileBackend(_ProxyBackend):
+    """Apache (mod_xsendfile) / lighttpd : chemin absolu du fichier"""
+
+    entete = 'X-Sendfile'
+
+    def cible(self, fichier):
+        return fichier.path
+
+
+def _cle_signature():
+    return (getattr(settings, 'FILE_DELIVERY', {}).get('OPTIONS', {}).get('KEY')
+            or settings.SECRET_KEY).encode()
+
+
+def signer(chemin, expire, nom=''):
+    """Signature HMAC-SHA256 (base64 url) de « chemin \\n expire \\n nom »"""
+    message = f'{chemin}\n{expire}\n{nom}'.encode()
+    digest = hmac.new(_cle_signature(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip('=')
+
+
+def verifier_signature(chemin, expire, nom, signature):
+    """Vrai si la signature est valide et l'URL pas encore expirée"""
+    try:
+        expire = int(expire)
+    except (TypeError, ValueError):
+        return False
+    if expire < time.time():
+        return False
+    return hmac.compare_digest(signer(chemin, expire, nom), signature or '')
+
+
+def url_signee(fichier, filename='', ttl=300, base_url='/fichiers/'):
+    """URL temporaire vers `fichier` (chemin relatif à MEDIA_ROOT)"""
+    expire = int(time.time()) + ttl
+    params = {'expire': expire, 'signature': signer(fichier.name, expire, filename)}
+    if filename:
+        params['nom'] = filename
+    return f"{base_url}{quote(fichier.name)}?{urlencode(params)}"
+
+
+class SignedURLBackend(FileResponseBackend):
+    """
+    Redirige vers une URL signée valable TTL secondes. En production, un
+    serveur statique vérifie la signature ; en local, la vue
+    core.views.fichier_signe joue ce rôle.
+    """
+
+    def servir(self, request, fichier, content_type=None, filename=None,
+               as_attachment=True, empreinte=None, cache_control=None):
+        return HttpResponseRedirect(url_signee(
+            fichier,
+            filename=filename or '',
+            ttl=self.options.get('TTL', 300),
+            base_url=self.options.get('BASE_URL', '/fichiers/'),
+        ))
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    config = getattr(settings, 'FILE_DELIVERY', {})
+    backend = import_string(config.get('BACKEND', 'core.delivery.FileResponseBackend'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+def servir(request, fichier, **kwargs):
+    """
+    Sert `fichier` avec le backend configuré. Avec `empreinte` (SHA-256 du
+    contenu), l'ETag est fort et le cache immuable par défaut.
+    """
+    if kwargs.get('empreinte') and not kwargs.get('cache_control'):
+        kwargs['cache_control'] = CACHE_IMMUABLE
+    return get_backend().servir(request, fichier, **kwargs)
+
+
+async def aservir(request, fichier, **kwargs):
+    """servir() pour les vues asynchrones, sans bloquer la boucle d'événements"""
+    return await sync_to_async(servir, thread_sensitive=False)(request, fichier, **kwargs)
@@ -0,0 +1,244 @@
+# apps/core/files.py
+
+"""
+Service des fichiers (sujets, corrigés, livres) avec requêtes conditionnelles
+et partielles
+
+- ETag / Last-Modified : 304 Not Modified si le client a déjà le fichier
+  (If-None-Match, If-Modified-Since) ;
+- Range : reprise d'un téléchargement interrompu et lecture page par page
+  des PDF (plages simples et multiples, multipart/byteranges) ;
+- If-Range : la plage n'est servie que si le fichier n'a pas changé.
+
+Les validateurs viennent de l'empreinte du fichier si elle est connue,
+sinon de sa taille et de sa date de modification.
+
+Sous ASGI, le corps de la réponse est un itérateur asynchrone : chaque
+bloc est lu dans un thread (asyncio.to_thread) et la boucle d'événements
+n'attend que le client ; un téléchargement lent n'occupe aucun thread
+entre deux blocs.
+"""
+
+import asyncio
+import mimetypes
+import re
+import uuid
+
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+
+TAILLE_BLOC = 64 * 1024
+
+# Au-delà, la requête Range est ignorée et le fichier servi en entier
+MAX_PLAGES = 16
+
+RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+class FichierStocke:
+    """Fichier désigné par son nom dans un stockage (interface minimale d'un FieldFile)"""
+
+    def __init__(self, name, storage=None):
+        self.name = name
+        self.storage = storage or default_storage
+
+    @property
+    def size(self):
+        return self.storage.size(self.name)
+
+    @property
+    def path(self):
+        return self.storage.path(self.name)
+
+    def open(self, mode='rb'):
+        return self.storage.open(self.name, mode)
+
+
+def _validateurs(fichier, empreinte=None):
+    """(taille, etag, date de modification en timestamp ou None)"""
+    taille = fichier.size
+    try:
+        modifie = int(fichier.storage.get_modified_time(fichier.name).timestamp())
+    except (NotImplementedError, OSError):
+        modifie = None
+    if empreinte:
+        etag = f'"{empreinte}"'
+    else:
+        etag = f'"{taille:x}-{modifie or 0:x}"'
+    return taille, etag, modifie
+
+
+def parse_range(entete, taille):
+    """
+    Analyse un en-tête Range "bytes=0-99,200-" pour un fichier de `taille` octets.
+    Retourne la liste des plages (debut, fin incluse), [] si aucune n'est
+    satisfiable, ou None si l'en-tête est invalide (à ignorer).
+    """
+    unite, _, spec = entete.partition('=')
+    if unite.strip().lower() != 'bytes' or not spec:
+        return None
+
+    plages = []
+    for morceau in spec.split(','):
+        match = RANGE_RE.match(morceau)
+        if not match:
+            return None
+        debut, fin = match.groups()
+        if not debut and not fin:
+            return None
+        if not debut:
+            # Suffixe : les N derniers octets
+            longueur = int(fin)
+            if longueur == 0 or taille == 0:
+                continue
+            plages.append((max(0, taille - longueur), taille - 1))
+            continue
+        debut = int(debut)
+        if fin and int(fin) < debut:
+            return None
+        if debut >= taille:
+            continue
+        fin = int(fin) if fin else taille - 1
+        plages.append((debut, min(fin, taille - 1)))
+
+    if len(plages) > MAX_PLAGES:
+        return None
+    return plages
+
+
+def _if_range_valide(request, etag, modifie):
+    """If-Range : la plage n'est honorée que si le validateur correspond exactement"""
+    valeur = request.headers.get('If-Range')
+    if not valeur:
+        return True
+    valeur = valeur.strip()
+    if valeur.startswith('"'):
+        return valeur == etag
+    date = parse_http_date_safe(valeur)
+    return date is not None and modifie is not None and date == modifie
+
+
+def _lire_plages(fichier, plages, separateurs=None, fin=b''):
+    """Générateur : contenu des plages (précédées de leur séparateur multipart)"""
+    with fichier.open('rb') as flux:
+        for index, (debut, dernier) in enumerate(plages):
+            if separateurs:
+                yield separateurs[index]
+            flux.seek(debut)
+            reste = dernier - debut + 1
+            while reste > 0:
+                bloc = flux.read(min(TAILLE_BLOC, reste))
+                if not bloc:
+                    break
+                reste -= len(bloc)
+                yield bloc
+        if fin:
+            yield fin
+
+
+async def _asynchrone(morceaux):
+    """Itérateur asynchrone sur un générateur bloquant, avancé d'un bloc à la fois dans un thread"""
+    fin = object()
+    try:
+        while True:
+            bloc = await asyncio.to_thread(next, morceaux, fin)
+            if bloc is fin:
+                return
+            yield bloc
+    finally:
+        # Client parti : fermer le fichier
+        await asyncio.to_thread(morceaux.close)
+
+
+def _corps(request, morceaux):
+    """Corps de réponse adapté au serveur : asynchrone sous ASGI, tel quel sous WSGI"""
+    if isinstance(request, ASGIRequest):
+        return _asynchrone(morceaux)
+    return morceaux
+
+
+def _entetes_cache(response, etag, modifie, cache_control=None):
+    response['ETag'] = etag
+    if modifie is not None:
+        response['Last-Modified'] = http_date(modifie)
+    response['Accept-Ranges'] = 'bytes'
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    return response
+
+
+def servir_fichier(request, fichier, content_type=None, filename=None,
+                   as_attachment=True, empreinte=None, cache_control=None):
+    """
+    Sert un FieldFile en gérant les requêtes conditionnelles et partielles.
+    Lève FileNotFoundError si le fichier n'existe plus.
+    """
+    taille, etag, modifie = _validateurs(fichier, empreinte)
+    content_type = content_type or mimetypes.guess_type(fichier.name)[0] or 'application/octet-stream'
+
+    # 304 Not Modified / 412 Precondition Failed
+    conditionnelle = get_conditional_response(request, etag=etag, last_modified=modifie)
+    if conditionnelle is not None:
+        return _entetes_cache(conditionnelle, etag, modifie, cache_control)
+
+    entete = request.headers.get('Range')
+    plages = None
+    if entete and request.method in ('GET', 'HEAD') and _if_range_valide(request, etag, modifie):
+        plages = parse_range(entete, taille)
+
+    if plages == []:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{taille}'
+        return _entetes_cache(response, etag, modifie, cache_control)
+
+    if not plages and not isinstance(request, ASGIRequest):
+        response = FileResponse(
+            fichier.open('rb'),
+            content_type=content_type,
+            as_attachment=as_attachment,
+            filename=filename or '',
+        )
+        return _entetes_cache(response, etag, modifie, cache_control)
+
+    if not plages:
+        response = StreamingHttpResponse(
+            _corps(request, _lire_plages(fichier, [(0, taille - 1)] if taille else [])),
+            content_type=content_type,
+        )
+        response['Content-Length'] = str(taille)
+    elif len(plages) == 1:
+        debut, fin = plages[0]
+        response = StreamingHttpResponse(
+            _corps(request, _lire_plages(fichier, plages)), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {debut}-{fin}/{taille}'
+        response['Content-Length'] = str(fin - debut + 1)
+    else:
+        frontiere = uuid.uuid4().hex
+        separateurs = [
+            (
+                f'\r\n--{frontiere}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Range: bytes {debut}-{fin}/{taille}\r\n\r\n'
+            ).encode()
+            for debut, fin in plages
+        ]
+        fin_multipart = f'\r\n--{frontiere}--\r\n'.encode()
+        longueur = sum(len(s) for s in separateurs) + len(fin_multipart) + sum(
+            fin - debut + 1 for debut, fin in plages
+        )
+        response = StreamingHttpResponse(
+            _corps(request, _lire_plages(fichier, plages, separateurs, fin_multipart)),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={frontiere}',
+        )
+        response['Content-Length'] = str(longueur)
+
+    disposition = content_disposition_header(as_attachment, filename or '')
+    if disposition:
+        response['Content-Disposition'] = disposition
+    return _entetes_cache(response, etag, modifie, cache_control)
@@ -0,0 +1,115 @@
+import multiprocessing
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+
+# Valeur type : une page du catalogue mise en cache (voir core/pagecache.py)
+PAGE = ('<html>' + 'x' * 30000 + '</html>').encode(), 'text/html; charset=utf-8', []
+
+
+def _backends(repertoire):
+    return {
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'bench-cache-{uuid.uuid4().hex}',
+        },
+        'fichiers': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(Path(repertoire) / 'fichiers'),
+        },
+        'sqlite': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': str(Path(repertoire) / 'cache.sqlite3'),
+            'OPTIONS': {'L1_MAX_ENTRIES': 0},
+        },
+        'sqlite+L1': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': str(Path(repertoire) / 'cache-l1.sqlite3'),
+        },
+    }
+
+
+def _incrementer(alias, caches_, nombre):
+    with override_settings(CACHES=caches_):
+        cache = caches[alias]
+        for _ in range(nombre):
+            cache.incr('bench:compteur')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le cache SQLite partagé (core/cache.py), avec et sans L1, à LocMemCache "
+        "et FileBasedCache : get (hit, miss), set, incr, puis incr concurrents entre processus"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=2000, help="Opérations mesurées par cas (défaut : 2000)")
+        parser.add_argument('--processus', type=int, default=4, help="Processus des incr concurrents (défaut : 4)")
+
+    def handle(self, *args, **options):
+        nombre = options['operations']
+        with tempfile.TemporaryDirectory() as repertoire:
+            backends = _backends(repertoire)
+            with override_settings(CACHES=backends):
+                self.stdout.write(f"{'':12} {'get hit':>10} {'get miss':>10} {'set':>10} {'incr':>10}   (µs, médianes)")
+                for alias in backends:
+                    cache = caches[alias]
+                    cache.clear()
+                    mesures = self._mesurer(cache, nombre)
+                    self.stdout.write(f"{alias:12} " + ' '.join(f"{mesure:>10.1f}" for mesure in mesures))
+            self._concurrence(backends, options['processus'], nombre)
+
+    def _mesurer(self, cache, nombre):
+        cles = [f'bench:page:{i}' for i in range(100)]
+        for cle in cles:
+            cache.set(cle, PAGE, 300)
+        cache.set('bench:compteur', 0, None)
+
+        def chrono(operation):
+            durees = []
+            for i in range(nombre):
+                debut = time.perf_counter()
+                operation(i)
+                durees.append(time.perf_counter() - debut)
+            return statistics.median(durees) * 1e6
+
+        resultats = (
+            chrono(lambda i: cache.get(cles[i % len(cles)])),
+            chrono(lambda i: cache.get('bench:absente')),
+            chrono(lambda i: cache.set(cles[i % len(cles)], PAGE, 300)),
+            chrono(lambda i: cache.incr('bench:compteur')),
+        )
+        if cache.get(cles[0]) != PAGE:
+            raise CommandError(f"{cache!r} : valeur relue différente")
+        return resultats
+
+    def _concurrence(self, backends, processus, nombre):
+        """incr() depuis plusieurs processus : aucun incrément ne doit être perdu"""
+        self.stdout.write(self.style.MIGRATE_HEADING(f"incr concurrents : {processus} processus x {nombre}"))
+        contexte = multiprocessing.get_context('fork')
+        for alias in ('fichiers', 'sqlite', 'sqlite+L1'):
+            with override_settings(CACHES=backends):
+                caches[alias].set('bench:compteur', 0, None)
+            debut = time.perf_counter()
+            travailleurs = [
+                contexte.Process(target=_incrementer, args=(alias, backends, nombre)) for _ in range(processus)
+            ]
+            for travailleur in travailleurs:
+                travailleur.start()
+            for travailleur in travailleurs:
+                travailleur.join()
+            duree = time.perf_counter() - debut
+            with override_settings(CACHES=backends):
+                total = caches[alias].get('bench:compteur')
+            attendu = processus * nombre
+            style = self.style.SUCCESS if total == attendu else self.style.WARNING
+            self.stdout.write(style(
+                f"{alias:12} {total} / {attendu} incréments conservés en {duree:.2f} s"
+            ))
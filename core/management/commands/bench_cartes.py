@@ -0,0 +1,93 @@
+import statistics
+import time
+import uuid
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.template.backends.django import Template
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+
+# Cache des fragments : désactivé (avant), puis privé et chaud (après)
+MODES = {
+    'sans cache des cartes': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'avec cache des cartes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-cartes',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la part du rendu des gabarits dans la liste des épreuves et la "
+        "bibliothèque, sans puis avec le cache des fragments de cartes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=50, help="Requêtes mesurées par page et par mode (défaut : 50)")
+        parser.add_argument('--email', help="Utilisateur connecté (défaut : utilisateur temporaire)")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        temporaire = not options['email']
+        if temporaire:
+            user = User.objects.create_user(email=f'bench-{uuid.uuid4().hex[:12]}@example.invalid', password=None)
+        else:
+            user = User.objects.filter(email=options['email']).first()
+            if user is None:
+                raise CommandError(f"Utilisateur inconnu : {options['email']}")
+
+        try:
+            client = Client()
+            client.force_login(user)
+            for url in (reverse('epreuves:liste') + '?annee_scolaire=', reverse('livres:bibliotheque')):
+                self.stdout.write(self.style.MIGRATE_HEADING(url))
+                for mode, fragments in MODES.items():
+                    with override_settings(CACHES={
+                        'default': {
+                            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                            'LOCATION': 'bench-cartes-defaut',
+                        },
+                        'fragments': fragments,
+                    }):
+                        self._afficher(mode, self._mesurer(client, url, options['requetes']))
+        finally:
+            if temporaire:
+                user.delete()
+
+    def _mesurer(self, client, url, nombre):
+        """(durée de la requête, durée du rendu) de chaque requête, après une requête de chauffe"""
+        rendu = []
+        original = Template.render
+
+        def chronometrer(template, context=None, request=None):
+            debut = time.perf_counter()
+            try:
+                return original(template, context, request)
+            finally:
+                rendu.append(time.perf_counter() - debut)
+
+        mesures = []
+        with mock.patch.object(Template, 'render', chronometrer):
+            client.get(url)
+            for _ in range(nombre):
+                rendu.clear()
+                debut = time.perf_counter()
+                response = client.get(url)
+                duree = time.perf_counter() - debut
+                if response.status_code != 200:
+                    raise CommandError(f"{url} : statut {response.status_code}")
+                mesures.append((duree, sum(rendu)))
+        return mesures
+
+    def _afficher(self, mode, mesures):
+        requete = statistics.median(duree for duree, _ in mesures)
+        rendu = statistics.median(duree for _, duree in mesures)
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode} : requête {requete * 1000:.1f} ms, rendu {rendu * 1000:.1f} ms "
+            f"({rendu / requete:.0%} de la requête) ; médianes sur {len(mesures)} requêtes"
+        ))
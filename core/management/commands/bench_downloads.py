@@ -0,0 +1,174 @@
+import asyncio
+import io
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la capacité en clients lents simultanés d'un téléchargement servi "
+        "par le chemin WSGI (workers synchrones) et par le chemin ASGI (vues asynchrones)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="URL à télécharger (défaut : premier livre gratuit, sinon première épreuve)")
+        parser.add_argument('--clients', type=int, default=200, help="Clients simultanés (défaut : 200)")
+        parser.add_argument('--workers', type=int, default=8, help="Workers synchrones WSGI, threads compris (défaut : 8)")
+        parser.add_argument('--debit', type=int, default=256, help="Débit de chaque client en Ko/s (défaut : 256)")
+        parser.add_argument('--email', help="Utilisateur connecté (défaut : utilisateur temporaire)")
+
+    def handle(self, *args, **options):
+        url = options['url'] or self._url_par_defaut()
+        User = get_user_model()
+        temporaire = not options['email']
+        if temporaire:
+            user = User.objects.create_user(email=f'bench-{uuid.uuid4().hex[:12]}@example.invalid', password=None)
+        else:
+            user = User.objects.filter(email=options['email']).first()
+            if user is None:
+                raise CommandError(f"Utilisateur inconnu : {options['email']}")
+
+        try:
+            client = Client()
+            client.force_login(user)
+            cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+            debit = options['debit'] * 1024
+
+            self.stdout.write(
+                f"{url} : {options['clients']} clients à {options['debit']} Ko/s, "
+                f"{options['workers']} workers WSGI"
+            )
+            self._afficher('WSGI', self._wsgi(url, cookie, debit, options))
+            self._afficher('ASGI', asyncio.run(self._asgi(url, cookie, debit, options)))
+        finally:
+            if temporaire:
+                user.delete()
+
+    def _url_par_defaut(self):
+        from epreuves.models import Epreuve
+        from livres.models import Livre
+
+        livre = Livre.objects.filter(is_active=True, is_premium=False).exclude(fichier_pdf='').first()
+        if livre:
+            return f'/livres/{livre.slug}/telecharger/'
+        epreuve = Epreuve.objects.filter(is_active=True).exclude(fichier_sujet='').first()
+        if epreuve:
+            return f'/epreuves/{epreuve.slug}/telecharger/'
+        raise CommandError("Aucun fichier à télécharger : précisez --url.")
+
+    # ==================== WSGI ====================
+
+    def _wsgi(self, url, cookie, debit, options):
+        """Chaque client occupe un worker du pool jusqu'à la fin de son téléchargement"""
+        application = get_wsgi_application()
+        adresse = urlsplit(url)
+
+        def client():
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': adresse.path,
+                'QUERY_STRING': adresse.query,
+                'HTTP_HOST': 'localhost',
+                'HTTP_COOKIE': cookie,
+                'wsgi.input': io.BytesIO(),
+            }
+            setup_testing_defaults(environ)
+            statuts = []
+            corps = application(environ, lambda statut, entetes, exc_info=None: statuts.append(int(statut[:3])))
+            octets = 0
+            try:
+                for bloc in corps:
+                    octets += len(bloc)
+                    time.sleep(len(bloc) / debit)
+            finally:
+                if hasattr(corps, 'close'):
+                    corps.close()
+            return statuts[0], octets, time.perf_counter() - debut
+
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            resultats = list(pool.map(lambda _: client(), range(options['clients'])))
+        return resultats, time.perf_counter() - debut
+
+    # ==================== ASGI ====================
+
+    async def _asgi(self, url, cookie, debit, options):
+        """Tous les clients sur une seule boucle d'événements, comme un processus uvicorn"""
+        application = get_asgi_application()
+        adresse = urlsplit(url)
+        debut = time.perf_counter()
+
+        async def client():
+            termine = asyncio.Event()
+            requete_lue = False
+            statut = None
+            octets = 0
+
+            async def receive():
+                nonlocal requete_lue
+                if not requete_lue:
+                    requete_lue = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await termine.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                nonlocal statut, octets
+                if message['type'] == 'http.response.start':
+                    statut = message['status']
+                elif message['type'] == 'http.response.body':
+                    bloc = message.get('body', b'')
+                    octets += len(bloc)
+                    if bloc:
+                        await asyncio.sleep(len(bloc) / debit)
+                    if not message.get('more_body'):
+                        termine.set()
+
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': adresse.path,
+                'raw_path': adresse.path.encode(),
+                'query_string': adresse.query.encode(),
+                'root_path': '',
+                'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+                'client': ('127.0.0.1', 0),
+                'server': ('localhost', 80),
+            }
+            await application(scope, receive, send)
+            termine.set()
+            return statut, octets, time.perf_counter() - debut
+
+        resultats = await asyncio.gather(*(client() for _ in range(options['clients'])))
+        return resultats, time.perf_counter() - debut
+
+    # ==================== RÉSULTATS ====================
+
+    def _afficher(self, nom, mesures):
+        resultats, duree = mesures
+        reussis = [r for r in resultats if r[0] in (200, 206)]
+        if not reussis:
+            statuts = sorted({r[0] for r in resultats})
+            raise CommandError(f"{nom} : aucun téléchargement réussi (statuts {statuts}).")
+        latences = sorted(r[2] for r in reussis)
+        p95 = latences[min(len(latences) - 1, int(len(latences) * 0.95))]
+        self.stdout.write(self.style.SUCCESS(
+            f"{nom} : {len(reussis)}/{len(resultats)} réussis en {duree:.2f} s, "
+            f"{len(reussis) / duree:.1f} téléchargements/s, "
+            f"latence médiane {statistics.median(latences):.2f} s, p95 {p95:.2f} s, "
+            f"{reussis[0][1] // 1024} Ko par fichier"
+        ))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from core import storage
+
+
+class Command(BaseCommand):
+    help = "Supprime les fichiers du stockage par contenu qui ne sont plus référencés"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=24,
+            help="Âge minimal (heures) d'un fichier non référencé avant suppression (défaut : 24)",
+        )
+        parser.add_argument(
+            '--recompter', action='store_true',
+            help="Corrige les compteurs de références d'après les modèles",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="N'affiche que le bilan")
+
+    def handle(self, *args, **options):
+        bilan = storage.collecter(
+            timedelta(hours=options['grace']),
+            dry_run=options['dry_run'],
+            recompter=options['recompter'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{bilan['supprimes']} fichier(s) supprimé(s) ({filesizeformat(bilan['octets'])}), "
+            f"{bilan['corriges']} compteur(s) corrigé(s)."
+        ))
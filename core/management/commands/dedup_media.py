@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from core import storage
+
+
+class Command(BaseCommand):
+    help = "Migre les fichiers existants vers le stockage par contenu (un exemplaire par SHA-256)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Calcule les doublons et l'espace récupérable sans rien modifier",
+        )
+
+    def handle(self, *args, **options):
+        bilan = storage.dedoublonner(dry_run=options['dry_run'], journal=self.stderr.write)
+        self.stdout.write(self.style.SUCCESS(
+            f"{bilan['fichiers']} fichier(s) traité(s), {bilan['doublons']} doublon(s), "
+            f"{filesizeformat(bilan['octets_economises'])} récupéré(s), "
+            f"{bilan['manquants']} manquant(s)."
+        ))
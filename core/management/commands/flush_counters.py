@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Écrit en base les incréments de compteurs en attente de tous les workers "
+        "(COUNTER_BUFFER['BACKEND'] = 'spool' requis : le stockage 'memory' est "
+        "propre à chaque worker, cette commande n'y a pas accès)"
+    )
+
+    def handle(self, *args, **options):
+        if not isinstance(counters.get_buffer().store, counters.SpoolStore):
+            raise CommandError(
+                "COUNTER_BUFFER['BACKEND'] = 'memory' : les incréments sont dans la mémoire de chaque "
+                "worker, qui les écrit lui-même. Passez au stockage 'spool' pour les vider ici."
+            )
+        total = counters.vider()
+        self.stdout.write(self.style.SUCCESS(f"{total} mise(s) à jour groupée(s) appliquée(s)."))
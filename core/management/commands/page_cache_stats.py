@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver
+
+from core import pagecache
+
+
+class Command(BaseCommand):
+    help = "Hits et misses du cache des pages, par vue ; chaque worker les reporte toutes les PAGE_CACHE['STATS_INTERVAL'] secondes (voir core/pagecache.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invalider', nargs='*', metavar='ETIQUETTE', help="Invalide les pages des étiquettes données")
+
+    def handle(self, *args, **options):
+        if options['invalider']:
+            pagecache.invalider(*options['invalider'])
+            self.stdout.write(self.style.SUCCESS(f"Pages invalidées : {', '.join(options['invalider'])}"))
+            return
+
+        # Importe les vues : chacune s'inscrit dans pagecache.VUES
+        get_resolver().url_patterns
+        for vue, (hits, misses) in sorted(pagecache.statistiques(sorted(pagecache.VUES)).items()):
+            total = hits + misses
+            taux = f"{hits / total:.0%}" if total else '-'
+            self.stdout.write(f"{vue:45} {hits:>8} hits {misses:>8} misses  {taux:>5}")
@@ -0,0 +1,39 @@
+# apps/core/middleware.py
+
+from urllib.parse import unquote
+
+from django.conf import settings
+
+from .files import FichierStocke, servir_fichier
+from .storage import empreinte_de
+
+
+class XAccelRedirectEmulationMiddleware:
+    """
+    Développement sans nginx : sert depuis MEDIA_ROOT les réponses portant
+    un en-tête X-Accel-Redirect, comme le ferait la location `internal`.
+    À ne pas activer derrière un vrai nginx.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = getattr(settings, 'FILE_DELIVERY', {}).get('OPTIONS', {})
+        self.location = options.get('LOCATION', '/protected/')
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cible = response.get('X-Accel-Redirect')
+        if not cible or not cible.startswith(self.location):
+            return response
+
+        fichier = FichierStocke(unquote(cible[len(self.location):]))
+        emulee = servir_fichier(
+            request,
+            fichier,
+            content_type=response.get('Content-Type'),
+            empreinte=empreinte_de(fichier.name) or None,
+            cache_control=response.get('Cache-Control'),
+        )
+        if response.has_header('Content-Disposition') and emulee.status_code in (200, 206):
+            emulee['Content-Disposition'] = response['Content-Disposition']
+        return emulee
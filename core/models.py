@@ -1,3 +1,24 @@
 from django.db import models
 
-# Create your models here.
+
+class StoredBlob(models.Model):
+    """
+    Fichier stocké une seule fois sous son empreinte SHA-256 (core.storage).
+    `references` compte les champs de modèles qui pointent vers lui ; un blob
+    sans référence est supprimé par la commande `collect_blobs`.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    taille = models.PositiveBigIntegerField(help_text="En octets")
+    references = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Fichier stocké"
+        verbose_name_plural = "Fichiers stockés"
+        indexes = [
+            models.Index(fields=['references', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.references})"
@@ -0,0 +1,93 @@
+# apps/core/outils_tests.py
+
+"""
+Outils partagés par les tests des applications (<app>/tests.py)
+
+- CACHES_TESTS : caches en mémoire, rien de partagé avec var/cache ni
+  entre deux exécutions ;
+- MediaTemporaire : MEDIA_ROOT temporaire, le temps de la classe de test ;
+- DonneesScolaires : système scolaire béninois (fixture) et quelques
+  matières, caches vidés et compteurs différés privés à chaque test ;
+- creer_utilisateur : compte et abonnement.
+"""
+
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.test import override_settings
+
+from dashboard.models import Abonnement
+from epreuves import taxonomy
+from epreuves.models import Classe, Epreuve, Matiere, Periode
+
+from . import counters
+
+
+CACHES_TESTS = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'tests-{alias}'}
+    for alias in ('default', 'fragments')
+}
+
+MATIERES = (('Mathématiques', 'maths'), ('Français', 'francais'), ('Physique-Chimie', 'pct'), ('SVT', 'svt'))
+
+
+def vider_caches():
+    """Caches vidés et registre du système scolaire rechargé (les on_commit ne s'exécutent pas dans un TestCase)"""
+    for alias in CACHES_TESTS:
+        caches[alias].clear()
+    taxonomy.invalider()
+
+
+def creer_utilisateur(email, plan='gratuit', inclus=3):
+    """Utilisateur et son abonnement (créé par le signal d'inscription)"""
+    user = get_user_model().objects.create_user(email=email, password=None)
+    Abonnement.objects.filter(user=user).update(plan=plan, telechargements_inclus=inclus, telechargements_utilises=0)
+    return user
+
+
+class MediaTemporaire:
+    """Fichiers envoyés écrits dans un MEDIA_ROOT temporaire, supprimé après la classe"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media))
+        cls.addClassCleanup(shutil.rmtree, cls.media, ignore_errors=True)
+        super().setUpClass()
+
+
+class DonneesScolaires(MediaTemporaire):
+    """Système scolaire béninois (fixture) et quelques matières"""
+
+    fixtures = ['benin_school_system']
+
+    @classmethod
+    def creer_referentiel(cls):
+        """Matières (absentes de la fixture), deux classes et une période"""
+        cls.matieres = [Matiere.objects.create(nom=nom, code=code) for nom, code in MATIERES]
+        cls.classes = list(Classe.objects.order_by('numero_classe')[:2])
+        cls.periode = Periode.objects.order_by('numero').first()
+        taxonomy.invalider()
+
+    def setUp(self):
+        super().setUp()
+        vider_caches()
+        # Tampon privé : aucun incrément différé n'est écrit après le test (base de développement)
+        tampon = mock.patch.object(counters, '_tampon', counters.CounterBuffer(counters.MemoryStore(), interval=3600))
+        tampon.start()
+        self.addCleanup(tampon.stop)
+
+    @classmethod
+    def creer_epreuve(cls, titre='Épreuve', classe=None, matiere=None, **champs):
+        classe = classe or cls.classes[0]
+        epreuve = Epreuve(
+            titre=titre, niveau_id=classe.niveau_id, classe=classe, matiere=matiere or cls.matieres[0],
+            periode=cls.periode, annee_scolaire='2024-2025', type_epreuve='composition_1', **champs,
+        )
+        epreuve.fichier_sujet.save(f'{titre}.pdf', ContentFile(f'%PDF-1.4 {titre}'.encode()), save=False)
+        epreuve.save()
+        return epreuve
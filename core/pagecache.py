@@ -0,0 +1,256 @@
+# apps/core/pagecache.py
+
+"""
+Cache des pages entières du catalogue, partagées entre visiteurs
+
+@cache_partage(*etiquettes, parametres={...}) sert aux visiteurs non
+connectés la page déjà rendue pour la même URL canonique :
+- seuls les paramètres GET lus par la vue (`parametres`) comptent ; un
+  paramètre absent prend sa valeur par défaut (valeur ou fonction), puis les
+  valeurs vides sont retirées et les paramètres triés : ordre différent,
+  filtres vides ou paramètres inconnus (utm_*, ...) partagent une entrée ;
+- la clé contient la version de chaque étiquette ('epreuves', 'livres', ...) :
+  invalider(etiquette), appelé par les signaux des modèles après le commit,
+  rend caduques toutes les pages de l'étiquette ;
+- ne sont ni servies ni mises en cache : requêtes autres que GET/HEAD,
+  messages en attente, réponses autres que 200 ou qui écrivent un cookie
+  (jeton CSRF, session).
+
+Avec connectes=True, les utilisateurs connectés partagent aussi une entrée
+(distincte de celle des anonymes) : la vue leur rend une coquille sans
+donnée personnelle, complétée dans le navigateur par un point d'accès JSON
+(voir epreuves.views.personnalisation). Sinon ils ne passent pas par le cache.
+
+Une page absente ou expirée n'est rendue que par un worker à la fois
+(core/singleflight.py) : les autres attendent son rendu ou servent la page
+expirée, gardée SINGLE_FLIGHT['STALE'] secondes de plus.
+
+Les compteurs différés de la vue passent par compter() : mémorisés avec la
+page, ils sont rejoués à chaque service depuis le cache.
+Hits et misses sont comptés par vue dans le processus, puis ajoutés au
+cache au plus une fois par PAGE_CACHE['STATS_INTERVAL'] (statistiques()).
+"""
+
+import atexit
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from . import counters, singleflight
+
+
+DEFAUTS = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'TIMEOUT': 300,
+    'STATS_INTERVAL': 30,
+}
+
+PREFIXE = 'pagecache'
+
+
+def reglages():
+    return {**DEFAUTS, **getattr(settings, 'PAGE_CACHE', {})}
+
+
+def _cache():
+    return caches[reglages()['CACHE']]
+
+
+# ==================== VERSIONS DES ÉTIQUETTES ====================
+
+def _cle_version(etiquette):
+    return f'{PREFIXE}:version:{etiquette}'
+
+
+def versions(etiquettes):
+    """Version courante de chaque étiquette (créée au premier accès)"""
+    cache = _cache()
+    cles = [_cle_version(etiquette) for etiquette in etiquettes]
+    valeurs = cache.get_many(cles)
+    for cle in cles:
+        if cle not in valeurs:
+            cache.add(cle, uuid.uuid4().hex, None)
+            valeurs[cle] = cache.get(cle)
+    return [valeurs[cle] for cle in cles]
+
+
+def invalider(*etiquettes):
+    """Nouvelle version : les pages des étiquettes données ne seront plus servies"""
+    _cache().set_many({_cle_version(etiquette): uuid.uuid4().hex for etiquette in etiquettes}, None)
+
+
+# ==================== CLÉS ====================
+
+def canonique(request, parametres):
+    """Chaîne de requête canonique des paramètres lus par la vue"""
+    valeurs = []
+    for nom in sorted(parametres):
+        if nom in request.GET:
+            valeur = request.GET.get(nom)
+        else:
+            defaut = parametres[nom]
+            valeur = defaut() if callable(defaut) else defaut
+        if valeur:
+            valeurs.append((nom, valeur))
+    return urlencode(valeurs)
+
+
+def _cle_page(request, parametres, etiquettes):
+    variante = 'connecte' if request.user.is_authenticated else 'anonyme'
+    empreinte = hashlib.md5(
+        '|'.join([variante, request.path, canonique(request, parametres), *versions(etiquettes)]).encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+    return f'{PREFIXE}:page:{empreinte}'
+
+
+# ==================== COMPTEURS ====================
+
+def compter(request, instance, champ, n=1):
+    """counters.incrementer(), rejoué quand la page est servie depuis le cache"""
+    counters.incrementer(instance, champ, n)
+    compteurs = getattr(request, '_pagecache_compteurs', None)
+    if compteurs is not None:
+        compteurs.append((instance._meta.label_lower, instance.pk, champ, n))
+
+
+def _rejouer(compteurs):
+    for label, pk, champ, n in compteurs:
+        counters.incrementer(apps.get_model(label)(pk=pk), champ, n)
+
+
+# Hits et misses comptés dans le processus, ajoutés au cache partagé au plus
+# une fois par STATS_INTERVAL (et à l'arrêt) : pas d'écriture par requête
+_releve = Counter()
+_releve_lock = threading.Lock()
+_dernier_report = time.monotonic()
+
+
+def _noter(vue, resultat):
+    with _releve_lock:
+        _releve[(vue, resultat)] += 1
+        echu = time.monotonic() - _dernier_report >= reglages()['STATS_INTERVAL']
+    if echu:
+        reporter()
+
+
+def reporter():
+    """Ajoute au cache les hits et misses comptés dans le processus depuis le dernier report"""
+    global _releve, _dernier_report
+    with _releve_lock:
+        releve, _releve = _releve, Counter()
+        _dernier_report = time.monotonic()
+    cache = _cache()
+    for (vue, resultat), n in releve.items():
+        cle = f'{PREFIXE}:stats:{vue}:{resultat}'
+        if not cache.add(cle, n, None):
+            try:
+                cache.incr(cle, n)
+            except ValueError:
+                # Clé évincée entre add() et incr()
+                cache.add(cle, n, None)
+
+
+atexit.register(reporter)
+
+
+def statistiques(vues):
+    """{vue: (hits, misses)} ; les autres processus ont jusqu'à STATS_INTERVAL de retard"""
+    reporter()
+    cles = {
+        (vue, resultat): f'{PREFIXE}:stats:{vue}:{resultat}'
+        for vue in vues for resultat in ('hit', 'miss')
+    }
+    valeurs = _cache().get_many(cles.values())
+    return {
+        vue: (valeurs.get(cles[(vue, 'hit')], 0), valeurs.get(cles[(vue, 'miss')], 0))
+        for vue in vues
+    }
+
+
+# ==================== DÉCORATEUR ====================
+
+VUES = set()
+
+
+def _servable(request, connectes):
+    return (
+        request.method in ('GET', 'HEAD')
+        and (connectes or not request.user.is_authenticated)
+        and not len(get_messages(request))
+    )
+
+
+def _partageable(request, response):
+    """La réponse peut-elle être servie à tous les visiteurs de la même variante ?"""
+    session = getattr(request, 'session', None)
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and not (session is not None and session.modified)
+        and not len(get_messages(request))
+    )
+
+
+def cache_partage(*etiquettes, parametres=None, connectes=False):
+    """
+    Cache de page partagé entre visiteurs.
+    etiquettes : invalidées par les signaux des modèles affichés ;
+    parametres : {nom: défaut} des paramètres GET lus par la vue ;
+    connectes : la vue rend aux connectés une coquille sans donnée personnelle.
+    """
+    parametres = parametres or {}
+
+    def decorateur(vue):
+        nom = f'{vue.__module__}.{vue.__name__}'
+        VUES.add(nom)
+
+        @wraps(vue)
+        def enveloppe(request, *args, **kwargs):
+            config = reglages()
+            if not config['ENABLED'] or not _servable(request, connectes):
+                return vue(request, *args, **kwargs)
+
+            rendu = {}
+
+            def rendre():
+                request._pagecache_compteurs = []
+                rendu['response'] = response = vue(request, *args, **kwargs)
+                if _partageable(request, response):
+                    return response.content, response['Content-Type'], request._pagecache_compteurs
+                return None
+
+            # Un seul worker rend une page absente ou expirée, les autres l'attendent
+            # ou servent l'ancienne version (voir core/singleflight.py)
+            entree = singleflight.get_or_compute(
+                _cle_page(request, parametres, etiquettes), rendre, config['TIMEOUT'], using=config['CACHE'],
+            )
+            if 'response' in rendu:
+                _noter(nom, 'miss')
+                response = rendu['response']
+                response['X-Cache'] = 'MISS'
+                return response
+
+            contenu, type_contenu, compteurs = entree
+            _rejouer(compteurs)
+            _noter(nom, 'hit')
+            response = HttpResponse(contenu, content_type=type_contenu)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        return enveloppe
+
+    return decorateur
@@ -0,0 +1,200 @@
+# apps/core/pagination.py
+
+"""
+Pagination par curseur (keyset)
+
+Contrairement à django.core.paginator.Paginator, aucune page ne fait
+d'OFFSET ni de COUNT(*) : chaque page reprend après la dernière ligne
+de la précédente (WHERE (a, b, id) > (...)), ce qui coûte autant en page 1
+qu'en page 500. Les curseurs next/prev sont des jetons opaques.
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from . import singleflight
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """Garde la précision à la microseconde (DjangoJSONEncoder tronque à la milliseconde)"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _encoder(data):
+    brut = json.dumps(data, cls=_CursorEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(brut).decode().rstrip('=')
+
+
+def _decoder(jeton, champs):
+    """
+    (valeurs, inverse) du curseur, chaque valeur convertie par le champ de tri
+    correspondant (`champs`) ; None si le jeton est invalide, forgé ou périmé
+    """
+    try:
+        brut = base64.urlsafe_b64decode(jeton + '=' * (-len(jeton) % 4))
+        data = json.loads(brut)
+        valeurs = list(data['v'])
+        if len(valeurs) != len(champs):
+            return None
+        valeurs = [champ.to_python(valeur) for champ, valeur in zip(champs, valeurs)]
+        # Les champs de tri sont non nuls
+        if any(valeur is None for valeur in valeurs):
+            return None
+        return valeurs, bool(data['r'])
+    except (ValidationError, ValueError, TypeError, KeyError):
+        return None
+
+
+class CursorPage:
+    """Page de résultats, itérable comme une page de Paginator"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Pagine un queryset selon son ordre (order_by() ou Meta.ordering),
+    complété par la clé primaire pour départager les égalités.
+
+    Les champs de tri doivent être non nuls ; les champs de relations
+    (ex: 'matiere__nom') doivent être chargés par select_related().
+    """
+
+    def __init__(self, queryset, per_page, count_timeout=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.count_timeout = (
+            getattr(settings, 'PAGINATION_COUNT_TIMEOUT', 300)
+            if count_timeout is None else count_timeout
+        )
+        self.ordering = self._ordering()
+        self.champs = [self._champ(nom) for nom, _ in self.ordering]
+
+    def _ordering(self):
+        query = self.queryset.query
+        champs = list(query.order_by) or list(self.queryset.model._meta.ordering)
+        ordering = []
+        for champ in champs:
+            desc = champ.startswith('-')
+            nom = champ.lstrip('-')
+            if nom == 'pk':
+                nom = self.queryset.model._meta.pk.name
+            ordering.append((nom, desc))
+        pk = self.queryset.model._meta.pk.name
+        if pk not in [nom for nom, _ in ordering]:
+            ordering.append((pk, False))
+        return ordering
+
+    def _champ(self, nom):
+        """Champ du modèle (ou de l'annotation) trié sous le nom `nom`"""
+        annotation = self.queryset.query.annotations.get(nom)
+        if annotation is not None:
+            return annotation.output_field
+        modele = self.queryset.model
+        *relations, dernier = nom.split('__')
+        for relation in relations:
+            modele = modele._meta.get_field(relation).related_model
+        return modele._meta.get_field(dernier)
+
+    def _valeurs(self, obj):
+        valeurs = []
+        for nom, _ in self.ordering:
+            valeur = obj
+            for attr in nom.split('__'):
+                valeur = getattr(valeur, attr)
+            valeurs.append(valeur)
+        return valeurs
+
+    def _filtre(self, valeurs, avant):
+        """Lignes strictement après (ou avant) `valeurs` dans l'ordre de tri"""
+        condition = Q()
+        for i, (nom, desc) in enumerate(self.ordering):
+            egalites = {champ: valeur for (champ, _), valeur in zip(self.ordering[:i], valeurs[:i])}
+            operateur = 'gt' if desc == avant else 'lt'
+            condition |= Q(**egalites, **{f'{nom}__{operateur}': valeurs[i]})
+        return condition
+
+    def _ordre(self, inverse):
+        return [
+            f"{'-' if desc != inverse else ''}{nom}"
+            for nom, desc in self.ordering
+        ]
+
+    def _curseur(self, obj, inverse):
+        return _encoder({'v': self._valeurs(obj), 'r': int(inverse)})
+
+    @property
+    def count(self):
+        """Nombre total de résultats, mis en cache `count_timeout` secondes"""
+        try:
+            sql, params = self.queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        empreinte = hashlib.md5(f"{sql}|{params!r}".encode()).hexdigest()
+        # Un seul worker recompte un total expiré (voir core/singleflight.py)
+        return singleflight.get_or_compute(
+            f'pagination:count:{empreinte}', self.queryset.count, self.count_timeout
+        )
+
+    def get_page(self, cursor=None):
+        # Curseur invalide : première page
+        decode = _decoder(cursor, self.champs) if cursor else None
+
+        queryset = self.queryset
+        inverse = False
+        if decode:
+            valeurs, inverse = decode
+            queryset = queryset.filter(self._filtre(valeurs, avant=inverse))
+
+        lignes = list(queryset.order_by(*self._ordre(inverse))[:self.per_page + 1])
+        encore = len(lignes) > self.per_page
+        lignes = lignes[:self.per_page]
+
+        if inverse:
+            lignes.reverse()
+            has_previous, has_next = encore, True
+        else:
+            has_previous, has_next = decode is not None, encore
+
+        return CursorPage(
+            lignes,
+            self,
+            next_cursor=self._curseur(lignes[-1], False) if lignes and has_next else None,
+            previous_cursor=self._curseur(lignes[0], True) if lignes and has_previous else None,
+        )
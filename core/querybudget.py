@@ -0,0 +1,189 @@
+# apps/core/querybudget.py
+
+"""
+Budget de requêtes par vue et détection des N+1 (développement)
+
+Chaque requête SQL exécutée pendant une requête HTTP est relevée, y compris
+dans les threads de sync_to_async (le relevé suit le contexte). Les requêtes
+répétées sont regroupées par SQL normalisé et par site d'appel (première
+ligne du code du projet dans la pile) : à partir de REPETITIONS exécutions,
+c'est un N+1.
+
+QueryBudgetMiddleware ajoute à la réponse :
+- X-Requetes : nombre de requêtes SQL ;
+- X-Budget-Requetes : budget déclaré par la vue (@budget_requetes) ;
+- X-N-Plus-Un : les groupes suspects (nombre, site, SQL).
+Avec RAISE, un dépassement ou un N+1 lève une exception (page d'erreur).
+core.tests.BudgetsRequetesTests vérifie les budgets des pages de chaque application.
+"""
+
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+DEFAUTS = {
+    'ENABLED': False,
+    'RAISE': False,
+    'REPETITIONS': 5,
+}
+
+_releve = ContextVar('releve_requetes', default=None)
+
+# Instructions de transaction : ni comptées ni regroupées
+_TRANSACTION = re.compile(r'^\s*(SAVEPOINT|RELEASE|ROLLBACK|BEGIN|COMMIT)\b', re.IGNORECASE)
+_LISTE = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_ESPACES = re.compile(r'\s+')
+
+_RACINE = os.path.realpath(settings.BASE_DIR) + os.sep
+_EXCLUS = (os.sep + 'site-packages' + os.sep, os.sep + 'venv' + os.sep, os.path.realpath(__file__))
+
+
+def reglages():
+    return {**DEFAUTS, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+class BudgetDepasse(Exception):
+    """La vue a exécuté plus de requêtes que son budget"""
+
+
+class RequetesRepetees(Exception):
+    """Même requête exécutée en boucle depuis le même endroit (N+1)"""
+
+
+def normaliser(sql):
+    """SQL sans listes de paramètres de longueur variable ni espaces superflus"""
+    return _ESPACES.sub(' ', _LISTE.sub('(...)', sql)).strip()
+
+
+def site_appel():
+    """Première ligne du code du projet dans la pile (fichier:ligne fonction)"""
+    cadre = sys._getframe(2)
+    while cadre is not None:
+        fichier = os.path.realpath(cadre.f_code.co_filename)
+        if fichier.startswith(_RACINE) and not any(exclu in fichier for exclu in _EXCLUS):
+            return f"{fichier[len(_RACINE):]}:{cadre.f_lineno} {cadre.f_code.co_name}"
+        cadre = cadre.f_back
+    return '?'
+
+
+@dataclass
+class Groupe:
+    sql: str
+    site: str
+    nombre: int
+
+    def __str__(self):
+        return f"{self.nombre}x {self.site} : {self.sql[:160]}"
+
+
+@dataclass
+class Releve:
+    """Requêtes d'une requête HTTP (ou d'un bloc `relever()`)"""
+    requetes: Counter = field(default_factory=Counter)
+
+    @property
+    def total(self):
+        return sum(self.requetes.values())
+
+    def ajouter(self, sql):
+        self.requetes[(normaliser(sql), site_appel())] += 1
+
+    def repetitions(self, seuil=None):
+        """Groupes exécutés au moins `seuil` fois, du plus fréquent au moins fréquent"""
+        seuil = seuil or reglages()['REPETITIONS']
+        return [
+            Groupe(sql, site, nombre)
+            for (sql, site), nombre in self.requetes.most_common()
+            if nombre >= seuil
+        ]
+
+
+def _intercepter(execute, sql, params, many, context):
+    releve = _releve.get()
+    if releve is not None and not _TRANSACTION.match(sql):
+        releve.ajouter(sql)
+    return execute(sql, params, many, context)
+
+
+def _brancher(sender=None, connection=None, **kwargs):
+    # En tête de liste : connection.execute_wrapper() retire le dernier ajouté
+    if _intercepter not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _intercepter)
+
+
+def installer():
+    """Relève les requêtes de toutes les connexions, présentes et futures"""
+    connection_created.connect(_brancher, dispatch_uid='core.querybudget')
+    for connection in connections.all(initialized_only=True):
+        _brancher(connection=connection)
+
+
+@contextmanager
+def relever():
+    """Relevé des requêtes exécutées dans le bloc (installer() requis)"""
+    releve = Releve()
+    jeton = _releve.set(releve)
+    try:
+        yield releve
+    finally:
+        _releve.reset(jeton)
+
+
+class QueryBudgetMiddleware:
+    """Compte les requêtes SQL de chaque requête HTTP, vérifie le budget de la vue et signale les N+1"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not reglages()['ENABLED']:
+            raise MiddlewareNotUsed
+        installer()
+        self.get_response = get_response
+        self.asynchrone = iscoroutinefunction(get_response)
+        if self.asynchrone:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.asynchrone:
+            return self._acall(request)
+        with relever() as releve:
+            response = self.get_response(request)
+        return self._verifier(request, response, releve)
+
+    async def _acall(self, request):
+        with relever() as releve:
+            response = await self.get_response(request)
+        return self._verifier(request, response, releve)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.budget_requetes = getattr(view_func, 'budget_requetes', None)
+
+    def _verifier(self, request, response, releve):
+        budget = getattr(request, 'budget_requetes', None)
+        repetees = releve.repetitions()
+        response['X-Requetes'] = str(releve.total)
+        if budget is not None:
+            response['X-Budget-Requetes'] = str(budget)
+        if repetees:
+            response['X-N-Plus-Un'] = ' | '.join(str(groupe) for groupe in repetees[:3]).encode(
+                'ascii', 'replace'
+            ).decode()
+
+        if reglages()['RAISE']:
+            if budget is not None and releve.total > budget:
+                raise BudgetDepasse(f"{request.path} : {releve.total} requêtes pour un budget de {budget}")
+            if repetees:
+                raise RequetesRepetees(f"{request.path} : " + ' ; '.join(str(groupe) for groupe in repetees))
+        return response
@@ -0,0 +1,70 @@
+# apps/core/queryplans.py
+
+"""
+Plans d'exécution SQLite (EXPLAIN QUERY PLAN) des requêtes chaudes
+
+capturer() enregistre le SQL et les paramètres réellement exécutés ;
+expliquer() en donne le plan ; defauts() relève ce qui trahit un plan
+dégradé sur les tables surveillées :
+- parcours complet d'une table (SCAN sans index) ;
+- tri dans un B-tree temporaire (ORDER BY, GROUP BY ou DISTINCT que
+  l'ordre d'un index ne couvre pas ; le tri des groupes d'un agrégat
+  lu dans l'ordre d'un index est admis).
+Un parcours d'index dans son ordre (SCAN ... USING INDEX) est accepté : il
+s'arrête au LIMIT, ou ne lit que l'index quand celui-ci est couvrant.
+"""
+
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.db import connection
+
+
+@dataclass
+class Requete:
+    sql: str
+    params: tuple
+
+
+@contextmanager
+def capturer(using=connection):
+    """Liste des SELECT exécutés dans le bloc, paramètres compris"""
+    requetes = []
+
+    def enregistrer(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            requetes.append(Requete(sql, tuple(params or ())))
+        return execute(sql, params, many, context)
+
+    with using.execute_wrapper(enregistrer):
+        yield requetes
+
+
+def tables(sql):
+    """Tables lues par la requête (FROM et JOIN)"""
+    return set(re.findall(r'(?:FROM|JOIN)\s+"(\w+)"', sql))
+
+
+def expliquer(requete, using=connection):
+    """Lignes du plan (colonne `detail` d'EXPLAIN QUERY PLAN)"""
+    with using.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {requete.sql}', requete.params)
+        return [ligne[-1] for ligne in cursor.fetchall()]
+
+
+def defauts(requete, plan, surveillees):
+    """Étapes du plan qui parcourent ou trient une table surveillée sans index"""
+    # Agrégat lu dans l'ordre d'un index : seul le tri des groupes (un par
+    # valeur, non par ligne) passe par un B-tree temporaire, ce qui est admis
+    groupes_indexes = ' GROUP BY ' in requete.sql and 'USE TEMP B-TREE FOR GROUP BY' not in plan
+    trouves = []
+    for etape in plan:
+        if etape.startswith('USE TEMP B-TREE'):
+            if not (groupes_indexes and etape.endswith('ORDER BY')):
+                trouves.append(etape)
+            continue
+        parcours = re.match(r'SCAN (\w+)', etape)
+        if parcours and parcours.group(1) in surveillees and ' USING ' not in etape:
+            trouves.append(etape)
+    return trouves
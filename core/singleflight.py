@@ -0,0 +1,176 @@
+# apps/core/singleflight.py
+
+"""
+Recalcul unique des valeurs en cache (single flight)
+
+Quand une valeur en cache très demandée expire (page du catalogue,
+compteurs de facettes, totaux), tous les workers la recalculeraient en même
+temps. get_or_compute(cle, calculer, timeout) l'évite :
+- la valeur est gardée STALE secondes de plus que `timeout`, avec sa date
+  d'expiration et la durée de son dernier calcul ;
+- un seul processus recalcule, celui qui obtient le verrou (cache.add,
+  atomique entre processus avec le cache partagé de core/cache.py) ; les
+  autres servent la valeur expirée, ou, si elle est absente, attendent au
+  plus WAIT secondes qu'elle apparaisse avant de calculer eux-mêmes ; ils
+  n'attendent plus dès que le verrou est libéré sans valeur ;
+- rafraîchissement anticipé probabiliste (XFetch) : avant l'expiration, une
+  requête recalcule avec une probabilité qui croît à l'approche de
+  l'échéance et avec la durée du calcul (BETA ; 0 pour désactiver), de
+  sorte qu'en général la valeur est renouvelée avant d'expirer.
+
+Avec arriere_plan=True (stale-while-revalidate), le processus qui obtient le
+verrou sert lui aussi la valeur expirée et la recalcule dans un thread : seul
+le tout premier calcul, sans valeur à servir, se fait pendant la requête.
+
+Une valeur calculée None n'est pas mise en cache (ni une page non
+partageable, voir core/pagecache.py) : chaque appel la calcule.
+
+Configuration (settings.SINGLE_FLIGHT) :
+    {'CACHE': 'default', 'STALE': 60, 'LOCK_TIMEOUT': 30, 'WAIT': 2.0, 'BETA': 1.0}
+"""
+
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+
+DEFAUTS = {
+    'CACHE': 'default',
+    'STALE': 60,
+    'LOCK_TIMEOUT': 30,
+    'WAIT': 2.0,
+    'BETA': 1.0,
+}
+
+logger = logging.getLogger(__name__)
+
+# Intervalle (secondes) entre deux lectures pendant l'attente d'un autre processus
+INTERVALLE = 0.05
+
+
+def reglages():
+    return {**DEFAUTS, **getattr(settings, 'SINGLE_FLIGHT', {})}
+
+
+def _a_rafraichir(expire_le, duree, beta):
+    """XFetch : expirée, ou tirée au sort pour un recalcul anticipé"""
+    if expire_le is None:
+        return False
+    return time.time() - duree * beta * math.log(1.0 - random.random()) >= expire_le
+
+
+def _verrouiller(cache, cle, timeout):
+    jeton = uuid.uuid4().hex
+    return jeton if cache.add(f'{cle}:verrou', jeton, timeout) else None
+
+
+def _liberer(cache, cle, jeton):
+    # Ne pas retirer le verrou d'un autre processus si le nôtre a expiré entre-temps
+    if cache.get(f'{cle}:verrou') == jeton:
+        cache.delete(f'{cle}:verrou')
+
+
+def _attendre(cache, cle, delai):
+    """
+    Entrée calculée par un autre processus ; None dès que son verrou est
+    libéré sans valeur (non mise en cache), ou après `delai` secondes.
+    """
+    fin = time.monotonic() + delai
+    while time.monotonic() < fin:
+        time.sleep(INTERVALLE)
+        # Verrou lu avant la valeur : celle-ci est écrite avant la libération
+        verrou = cache.get(f'{cle}:verrou')
+        entree = cache.get(cle)
+        if entree is not None:
+            return entree
+        if verrou is None:
+            return None
+    return None
+
+
+def _calculer(cache, cle, calculer, timeout, stale, jeton):
+    try:
+        debut = time.monotonic()
+        valeur = calculer()
+        duree = time.monotonic() - debut
+        if valeur is not None:
+            if timeout is None:
+                cache.set(cle, (valeur, None, duree), None)
+            else:
+                cache.set(cle, (valeur, time.time() + timeout, duree), timeout + stale)
+        return valeur
+    finally:
+        if jeton is not None:
+            _liberer(cache, cle, jeton)
+
+
+def _recalculer_en_arriere_plan(*args):
+    try:
+        _calculer(*args)
+    except Exception:
+        logger.exception("Recalcul en arrière-plan de %s", args[1])
+    finally:
+        # Connexions ouvertes par ce thread : fermées avec lui
+        connections.close_all()
+
+
+def get_or_compute(cle, calculer, timeout, *, using=None, stale=None, beta=None, wait=None, arriere_plan=False):
+    """
+    Valeur en cache de `cle`, calculée par `calculer()` par un seul processus à la fois.
+    timeout : durée de validité en secondes (None : n'expire pas) ; using, stale,
+    beta, wait : alias du cache et réglages remplaçant ceux de SINGLE_FLIGHT ;
+    arriere_plan : recalculer une valeur expirée dans un thread, l'ancienne étant servie.
+    """
+    config = reglages()
+    cache = caches[using or config['CACHE']]
+    stale = config['STALE'] if stale is None else stale
+    beta = config['BETA'] if beta is None else beta
+    wait = config['WAIT'] if wait is None else wait
+
+    entree = cache.get(cle)
+    if entree is not None:
+        valeur, expire_le, duree = entree
+        if not _a_rafraichir(expire_le, duree, beta):
+            return valeur
+        # Expirée ou recalcul anticipé : les autres processus servent l'ancienne valeur
+        jeton = _verrouiller(cache, cle, config['LOCK_TIMEOUT'])
+        if jeton is None:
+            return valeur
+        if arriere_plan:
+            threading.Thread(
+                target=_recalculer_en_arriere_plan,
+                args=(cache, cle, calculer, timeout, stale, jeton),
+                daemon=True,
+            ).start()
+            return valeur
+        return _calculer(cache, cle, calculer, timeout, stale, jeton)
+
+    jeton = _verrouiller(cache, cle, config['LOCK_TIMEOUT'])
+    if jeton is None:
+        entree = _attendre(cache, cle, wait)
+        if entree is not None:
+            return entree[0]
+        # Calcul trop long ou non mis en cache : calcul sans verrou
+    return _calculer(cache, cle, calculer, timeout, stale, jeton)
+
+
+def memoiser(cle, timeout, **options):
+    """
+    get_or_compute() autour d'une fonction ; `cle(*args, **kwargs)` donne la clé
+    de cache de chaque appel.
+    """
+    def decorateur(fonction):
+        @wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            return get_or_compute(cle(*args, **kwargs), lambda: fonction(*args, **kwargs), timeout, **options)
+        return enveloppe
+
+    return decorateur
@@ -0,0 +1,327 @@
+# apps/core/storage.py
+
+"""
+Stockage adressé par contenu (sujets, corrigés, rapports, livres)
+
+Chaque fichier envoyé est haché (SHA-256) pendant son écriture sur disque,
+puis rangé sous son empreinte :
+
+    MEDIA_ROOT/cas/ab/cd/abcd...<64 hex>.pdf
+
+Le même PDF envoyé deux fois n'est stocké qu'une fois, et son nom ne
+change jamais tant que son contenu ne change pas : il peut être servi avec
+l'empreinte comme ETag fort et un Cache-Control immuable.
+
+Comptage des références : la table StoredBlob recense les blobs ;
+suivre_references(modele, champs) branche les signaux qui tiennent à jour
+`references` et le champ d'empreinte du modèle. Un blob créé mais jamais
+référencé (envoi abandonné) reste à 0 et sera supprimé par
+`collect_blobs` après un délai de grâce, compté depuis son dernier envoi.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils.deconstruct import deconstructible
+
+
+PREFIXE = 'cas'
+
+NOM_RE = re.compile(rf'^{PREFIXE}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(\.[a-z0-9]+)?$')
+
+
+def empreinte_de(name):
+    """Empreinte SHA-256 contenue dans un nom de blob, ou '' pour un autre fichier"""
+    match = NOM_RE.match(name or '')
+    return match.group(1) if match else ''
+
+
+def nom_blob(sha256, nom_original=''):
+    extension = Path(nom_original).suffix.lower()
+    if not re.fullmatch(r'\.[a-z0-9]+', extension):
+        extension = ''
+    return f'{PREFIXE}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage qui range chaque fichier sous l'empreinte de son contenu"""
+
+    def _save(self, name, content):
+        # Écriture dans un fichier temporaire du même disque, en hachant au passage
+        temporaires = Path(self.path(PREFIXE)) / 'tmp'
+        temporaires.mkdir(parents=True, exist_ok=True)
+        sha = hashlib.sha256()
+        taille = 0
+        descripteur, temporaire = tempfile.mkstemp(dir=temporaires)
+        try:
+            with os.fdopen(descripteur, 'wb') as sortie:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for bloc in content.chunks():
+                    sha.update(bloc)
+                    sortie.write(bloc)
+                    taille += len(bloc)
+
+            sha256 = sha.hexdigest()
+            final = nom_blob(sha256, name)
+            # Ligne d'abord, délai de grâce renouvelé : collecter() ne supprime
+            # plus ce blob, ou a fini de le faire et le fichier sera réécrit
+            enregistrer_blob(final, sha256, taille)
+            chemin = Path(self.path(final))
+            if chemin.exists():
+                os.unlink(temporaire)  # Déjà stocké : dédoublonné
+            else:
+                chemin.parent.mkdir(parents=True, exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporaire, self.file_permissions_mode)
+                os.replace(temporaire, chemin)
+        except BaseException:
+            if os.path.exists(temporaire):
+                os.unlink(temporaire)
+            raise
+        return final
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif dépend du contenu : pas de suffixe aléatoire
+        return name
+
+
+def enregistrer_blob(name, sha256, taille):
+    """Crée la ligne du blob, ou renouvelle sa date de création (un seul INSERT ... ON CONFLICT)"""
+    from django.utils import timezone
+
+    from .models import StoredBlob
+
+    StoredBlob.objects.bulk_create(
+        [StoredBlob(name=name, sha256=sha256, taille=taille, created_at=timezone.now())],
+        update_conflicts=True, unique_fields=['name'], update_fields=['created_at'],
+    )
+
+
+@lru_cache(maxsize=None)
+def cas_storage():
+    """Instance partagée, à passer en `storage=` des FileField"""
+    return ContentAddressedStorage()
+
+
+# ==================== RÉFÉRENCES ====================
+
+# [(modèle, {champ fichier: champ empreinte})] suivis par suivre_references()
+CHAMPS_SUIVIS = []
+
+
+def referencer(noms, delta):
+    """Ajoute `delta` au compteur de chaque blob nommé (autant de fois qu'il apparaît)"""
+    from .models import StoredBlob
+
+    occurrences = Counter(nom for nom in noms if empreinte_de(nom))
+    lots = defaultdict(list)
+    for nom, n in occurrences.items():
+        lots[n * delta].append(nom)
+    for increment, lot in lots.items():
+        StoredBlob.objects.filter(name__in=lot).update(references=F('references') + increment)
+
+
+def _noms(instance, champs):
+    return {champ: getattr(instance, champ).name or '' for champ in champs}
+
+
+def suivre_references(modele, champs):
+    """
+    Tient à jour les références et les empreintes des champs fichier d'un modèle.
+    `champs` : {champ fichier: champ empreinte}, ex: {'fichier_sujet': 'empreinte_sujet'}
+
+    Les noms d'avant la modification sont ceux chargés de la base : le
+    modèle les garde dans `_etat_charge` (from_db), mis à jour après chaque
+    sauvegarde. Faute de quoi (instance construite à la main, champs
+    différés), la ligne est relue.
+    """
+    if (modele, champs) in CHAMPS_SUIVIS:
+        return
+    CHAMPS_SUIVIS.append((modele, champs))
+
+    def avant(sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        for champ, champ_empreinte in champs.items():
+            fichier = getattr(instance, champ)
+            # Enregistrer le fichier maintenant (FileField.pre_save le ferait
+            # plus tard) pour connaître son nom définitif
+            if fichier and not fichier._committed:
+                fichier.save(fichier.name, fichier.file, save=False)
+            setattr(instance, champ_empreinte, empreinte_de(fichier.name))
+        instance._blobs_avant = {}
+        if instance.pk:
+            etat = getattr(instance, '_etat_charge', {})
+            if all(champ in etat for champ in champs):
+                instance._blobs_avant = {champ: etat[champ] for champ in champs}
+            else:
+                instance._blobs_avant = modele.objects.filter(pk=instance.pk).values(*champs).first() or {}
+
+    def apres(sender, instance, raw=False, **kwargs):
+        if raw:
+            return
+        avant = getattr(instance, '_blobs_avant', {})
+        apres = _noms(instance, champs)
+        with transaction.atomic():
+            referencer([avant.get(c) for c in champs if avant.get(c) != apres[c]], -1)
+            referencer([apres[c] for c in champs if avant.get(c) != apres[c]], 1)
+        # État de référence du prochain save()
+        etat = getattr(instance, '_etat_charge', None)
+        if etat is None:
+            etat = instance._etat_charge = {}
+        etat.update(apres)
+
+    def suppression(sender, instance, **kwargs):
+        referencer(_noms(instance, champs).values(), -1)
+
+    uid = f'cas:{modele._meta.label_lower}'
+    pre_save.connect(avant, sender=modele, weak=False, dispatch_uid=uid)
+    post_save.connect(apres, sender=modele, weak=False, dispatch_uid=uid)
+    post_delete.connect(suppression, sender=modele, weak=False, dispatch_uid=uid)
+
+
+def compter_references():
+    """Références réelles de chaque blob, d'après les champs suivis"""
+    comptes = Counter()
+    for modele, champs in CHAMPS_SUIVIS:
+        for noms in modele._default_manager.values_list(*champs).iterator():
+            comptes.update(nom for nom in noms if empreinte_de(nom))
+    return comptes
+
+
+# ==================== MAINTENANCE ====================
+
+def hacher(fichier):
+    """(empreinte SHA-256, taille) d'un fichier ouvert, lu par blocs"""
+    sha = hashlib.sha256()
+    taille = 0
+    for bloc in fichier.chunks():
+        sha.update(bloc)
+        taille += len(bloc)
+    return sha.hexdigest(), taille
+
+
+def dedoublonner(dry_run=False, journal=None):
+    """
+    Migre les fichiers existants (chemins par date) vers le stockage par
+    contenu : chaque fichier est haché, rangé une seule fois sous son
+    empreinte, les lignes qui le désignent sont mises à jour puis l'ancien
+    fichier est supprimé.
+    Retourne {'fichiers', 'doublons', 'octets_economises', 'manquants'}.
+    """
+    journal = journal or (lambda message: None)
+    bilan = {'fichiers': 0, 'doublons': 0, 'octets_economises': 0, 'manquants': 0}
+    vus = set()  # Blobs déjà présents ou créés pendant ce passage (simulation comprise)
+
+    for modele, champs in CHAMPS_SUIVIS:
+        for champ, champ_empreinte in champs.items():
+            storage = modele._meta.get_field(champ).storage
+            lignes = defaultdict(list)
+            anciens = (
+                modele._default_manager.exclude(**{f'{champ}__isnull': True})
+                .exclude(**{champ: ''})
+                .exclude(**{f'{champ}__startswith': f'{PREFIXE}/'})
+                .values_list('pk', champ)
+            )
+            for pk, nom in anciens.iterator():
+                lignes[nom].append(pk)
+
+            for ancien, pks in lignes.items():
+                if not storage.exists(ancien):
+                    bilan['manquants'] += 1
+                    journal(f"Fichier manquant : {ancien} ({modele._meta.label} {pks})")
+                    continue
+                with storage.open(ancien, 'rb') as fichier:
+                    sha256, taille = hacher(fichier)
+                    nouveau = nom_blob(sha256, ancien)
+                    doublon = nouveau in vus or storage.exists(nouveau)
+                    if not dry_run:
+                        if doublon:
+                            enregistrer_blob(nouveau, sha256, taille)
+                        else:
+                            nouveau = storage.save(ancien, fichier)
+                vus.add(nouveau)
+                bilan['fichiers'] += 1
+                if doublon:
+                    bilan['doublons'] += 1
+                    bilan['octets_economises'] += taille
+                if dry_run:
+                    continue
+
+                with transaction.atomic():
+                    modele._default_manager.filter(pk__in=pks).update(
+                        **{champ: nouveau, champ_empreinte: sha256}
+                    )
+                    referencer([nouveau] * len(pks), 1)
+                storage.delete(ancien)
+
+            # Fichiers déjà adressés par contenu mais sans empreinte enregistrée
+            if not dry_run:
+                sans_empreinte = (
+                    modele._default_manager.filter(**{f'{champ}__startswith': f'{PREFIXE}/', champ_empreinte: ''})
+                    .values_list('pk', champ)
+                )
+                for pk, nom in sans_empreinte.iterator():
+                    modele._default_manager.filter(pk=pk).update(**{champ_empreinte: empreinte_de(nom)})
+
+    return bilan
+
+
+def collecter(grace, dry_run=False, recompter=False):
+    """
+    Supprime les blobs sans référence créés il y a plus de `grace` (timedelta).
+    Les références réelles sont recomptées depuis les champs suivis avant
+    toute suppression ; avec `recompter`, les compteurs faux sont corrigés.
+    Retourne {'supprimes', 'octets', 'corriges'}.
+    """
+    from django.utils import timezone
+
+    from .models import StoredBlob
+
+    bilan = {'supprimes': 0, 'octets': 0, 'corriges': 0}
+    reelles = compter_references()
+
+    if recompter:
+        for blob in StoredBlob.objects.only('name', 'references').iterator():
+            if blob.references != reelles.get(blob.name, 0):
+                bilan['corriges'] += 1
+                if not dry_run:
+                    StoredBlob.objects.filter(pk=blob.pk).update(references=reelles.get(blob.name, 0))
+
+    limite = timezone.now() - grace
+    storage = cas_storage()
+    candidats = StoredBlob.objects.filter(references__lte=0, created_at__lt=limite)
+    for blob in list(candidats.only('pk', 'name', 'taille')):
+        if reelles.get(blob.name):
+            continue  # Compteur désynchronisé : le blob est encore utilisé
+        if not dry_run:
+            with transaction.atomic():
+                # Conditions revérifiées par la suppression même : une référence ou
+                # un envoi arrivés depuis le recomptage gardent le blob
+                if not candidats.filter(pk=blob.pk).delete()[0]:
+                    continue
+                # Fichier supprimé avant le commit : un envoi concurrent du même
+                # contenu attend la fin de la transaction, puis réécrit le fichier
+                storage.delete(blob.name)
+        bilan['supprimes'] += 1
+        bilan['octets'] += blob.taille
+
+    # Fichiers temporaires abandonnés (envoi interrompu)
+    temporaires = Path(storage.path(PREFIXE)) / 'tmp'
+    if not dry_run and temporaires.is_dir():
+        for chemin in temporaires.iterdir():
+            if chemin.stat().st_mtime < limite.timestamp():
+                chemin.unlink(missing_ok=True)
+
+    return bilan
@@ -1,3 +1,913 @@
-from django.test import TestCase
+# apps/core/tests.py
 
-# Create your tests here.
+import base64
+import hashlib
+import html
+import io
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.template import TemplateDoesNotExist
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, resolve, reverse
+from django.utils import timezone
+
+from accounts.models import UserActivity
+from dashboard.models import Download
+from epreuves import taxonomy
+from epreuves.models import Epreuve, EpreuveListing, Favori, Telechargement
+from livres.models import Avis, Categorie, Lecture, Livre
+
+from . import counters, delivery, files, pagecache, queryplans, singleflight, storage
+from .cache import SQLiteCache
+from .counters import CounterBuffer, MemoryStore, SpoolStore
+from .files import FichierStocke
+from .models import StoredBlob
+from .outils_tests import CACHES_TESTS, DonneesScolaires, vider_caches
+from .pagination import CursorPaginator
+
+
+def jeton(data):
+    """Curseur tel que le produirait (ou le forgerait) un client"""
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+
+
+# ==================== PAGINATION PAR CURSEUR ====================
+
+@override_settings(CACHES=CACHES_TESTS)
+class CursorPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Ordre (ordre, nom, id) avec des égalités sur `ordre`
+        Categorie.objects.bulk_create([
+            Categorie(nom=f'Catégorie {i:02d}', slug=f'categorie-{i}', ordre=i % 3) for i in range(30)
+        ])
+        cls.attendus = list(Categorie.objects.values_list('pk', flat=True))
+
+    def paginer(self, cursor=None):
+        return CursorPaginator(Categorie.objects.all(), 12).get_page(cursor)
+
+    def test_pages_suivantes_et_precedentes(self):
+        vus = []
+        page = self.paginer()
+        pages = [page]
+        vus += [c.pk for c in page]
+        while page.has_next():
+            page = self.paginer(page.next_cursor)
+            pages.append(page)
+            vus += [c.pk for c in page]
+        self.assertEqual(vus, self.attendus)
+        self.assertEqual([len(p) for p in pages], [12, 12, 6])
+
+        precedente = self.paginer(pages[-1].previous_cursor)
+        self.assertEqual([c.pk for c in precedente], [c.pk for c in pages[1]])
+        self.assertTrue(precedente.has_previous())
+
+    def test_total(self):
+        self.assertEqual(CursorPaginator(Categorie.objects.all(), 12).count, 30)
+
+    def test_curseur_invalide_donne_la_premiere_page(self):
+        premiere = [c.pk for c in self.paginer()]
+        for curseur in (
+            'pas-du-base64!',
+            jeton(['liste', 'et', 'non', 'objet']),
+            jeton({'v': [1, 'Catégorie'], 'r': 0}),  # Longueur différente de l'ordre
+            jeton({'v': ['abc', 'Catégorie', 'abc'], 'r': 0}),
+            jeton({'v': [None, None, None], 'r': 0}),
+            jeton({'v': [{}, [], 1], 'r': 0}),
+            jeton({'v': 'abc', 'r': 0}),
+        ):
+            with self.subTest(curseur=curseur):
+                page = self.paginer(curseur)
+                self.assertEqual([c.pk for c in page], premiere)
+                self.assertFalse(page.has_previous())
+
+
+# ==================== FICHIERS : PLAGES ET REQUÊTES CONDITIONNELLES ====================
+
+class ServirFichierTests(SimpleTestCase):
+
+    CONTENU = bytes(range(256)) * 4
+
+    def setUp(self):
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier, ignore_errors=True)
+        self.stockage = FileSystemStorage(location=dossier)
+        self.stockage.save('sujet.pdf', ContentFile(self.CONTENU))
+        self.stockage.save('vide.pdf', ContentFile(b''))
+        self.fichier = FichierStocke('sujet.pdf', self.stockage)
+
+    def servir(self, fichier=None, **entetes):
+        request = RequestFactory().get('/', headers=entetes)
+        return files.servir_fichier(request, fichier or self.fichier, filename='sujet.pdf')
+
+    def corps(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_parse_range(self):
+        self.assertEqual(files.parse_range('bytes=0-99', 1024), [(0, 99)])
+        self.assertEqual(files.parse_range('bytes=-100', 1024), [(924, 1023)])
+        self.assertEqual(files.parse_range('bytes=1000-', 1024), [(1000, 1023)])
+        self.assertEqual(files.parse_range('bytes=0-1,10-20', 1024), [(0, 1), (10, 20)])
+        self.assertEqual(files.parse_range('bytes=2000-', 1024), [])
+        self.assertIsNone(files.parse_range('bytes=5-1', 1024))
+        self.assertIsNone(files.parse_range('lignes=0-1', 1024))
+        self.assertIsNone(files.parse_range('bytes=' + ','.join(['0-1'] * 17), 1024))
+
+    def test_fichier_vide(self):
+        """Aucune plage, suffixe compris, n'est satisfiable sur un fichier vide"""
+        for entete in ('bytes=-5', 'bytes=0-', 'bytes=0-0'):
+            with self.subTest(entete=entete):
+                self.assertEqual(files.parse_range(entete, 0), [])
+                response = self.servir(FichierStocke('vide.pdf', self.stockage), range=entete)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    def test_plage_simple(self):
+        response = self.servir(range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(self.corps(response), self.CONTENU[10:20])
+
+    def test_plage_non_satisfiable(self):
+        response = self.servir(range='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_plages_multiples(self):
+        response = self.servir(range='bytes=0-3,-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        frontiere = response['Content-Type'].split('boundary=')[1].encode()
+        corps = self.corps(response)
+        self.assertEqual(len(corps), int(response['Content-Length']))
+        parties = corps.split(b'--' + frontiere)
+        self.assertEqual(parties[-1], b'--\r\n')
+        self.assertIn(b'Content-Range: bytes 0-3/1024\r\n\r\n' + self.CONTENU[:4], parties[1])
+        self.assertIn(b'Content-Range: bytes 1020-1023/1024\r\n\r\n' + self.CONTENU[-4:], parties[2])
+
+    def test_if_range(self):
+        etag = self.servir()['ETag']
+        response = self.servir(range='bytes=0-9', if_range=etag)
+        self.assertEqual(response.status_code, 206)
+        # Validateur périmé : le fichier entier
+        response = self.servir(range='bytes=0-9', if_range='"autre"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENU)
+
+    def test_if_none_match(self):
+        etag = self.servir()['ETag']
+        response = self.servir(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.servir(if_none_match='"autre"').status_code, 200)
+
+
+# ==================== LIVRAISON DES FICHIERS ====================
+
+@override_settings(CACHES=CACHES_TESTS)
+class LivraisonTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        reglage = override_settings(MEDIA_ROOT=media)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+        self.fichier = FichierStocke(default_storage.save('sujets/bac 2024.pdf', ContentFile(b'%PDF-1.4 sujet')))
+
+    def configurer(self, backend, **options):
+        """FILE_DELIVERY le temps du test (get_backend() est mis en cache)"""
+        reglage = override_settings(FILE_DELIVERY={'BACKEND': f'core.delivery.{backend}', 'OPTIONS': options})
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+        delivery.get_backend.cache_clear()
+        self.addCleanup(delivery.get_backend.cache_clear)
+
+    def test_signature(self):
+        expire = int(time.time()) + 60
+        signature = delivery.signer('sujets/a.pdf', expire, 'a.pdf')
+        self.assertTrue(delivery.verifier_signature('sujets/a.pdf', expire, 'a.pdf', signature))
+        self.assertTrue(delivery.verifier_signature('sujets/a.pdf', str(expire), 'a.pdf', signature))
+        self.assertFalse(delivery.verifier_signature('sujets/b.pdf', expire, 'a.pdf', signature))
+        self.assertFalse(delivery.verifier_signature('sujets/a.pdf', expire, 'b.pdf', signature))
+        self.assertFalse(delivery.verifier_signature('sujets/a.pdf', expire + 1, 'a.pdf', signature))
+        self.assertFalse(delivery.verifier_signature('sujets/a.pdf', 'demain', 'a.pdf', signature))
+        self.assertFalse(delivery.verifier_signature('sujets/a.pdf', expire, 'a.pdf', None))
+
+    def test_signature_expiree(self):
+        expire = int(time.time()) - 1
+        signature = delivery.signer('sujets/a.pdf', expire)
+        self.assertFalse(delivery.verifier_signature('sujets/a.pdf', expire, '', signature))
+
+    def test_url_signee(self):
+        self.configurer('SignedURLBackend', TTL=60, BASE_URL='/fichiers/')
+        response = delivery.servir(RequestFactory().get('/'), self.fichier, filename='bac.pdf')
+        self.assertEqual(response.status_code, 302)
+        url = response['Location']
+        self.assertTrue(url.startswith('/fichiers/sujets/bac%202024.pdf?'))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 sujet')
+        self.assertIn('filename="bac.pdf"', response['Content-Disposition'])
+
+        # Nom changé : signature invalide
+        self.assertEqual(self.client.get(url.replace('bac.pdf', 'autre.pdf')).status_code, 403)
+        # Au-delà du TTL
+        with mock.patch('core.delivery.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_x_accel_redirect(self):
+        self.configurer('XAccelRedirectBackend', LOCATION='/protected/')
+        response = delivery.servir(
+            RequestFactory().get('/'), self.fichier, filename='bac.pdf', empreinte='a' * 64,
+        )
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/sujets/bac%202024.pdf')
+        self.assertNotIn('Content-Type', response)
+        self.assertEqual(response.content, b'')
+        self.assertIn('attachment; filename="bac.pdf"', response['Content-Disposition'])
+        self.assertEqual(response['Cache-Control'], delivery.CACHE_IMMUABLE)
+
+    def test_x_sendfile(self):
+        self.configurer('XSendfileBackend')
+        response = delivery.servir(RequestFactory().get('/'), self.fichier, content_type='application/pdf')
+        self.assertEqual(response['X-Sendfile'], self.fichier.path)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response.content, b'')
+
+
+# ==================== STOCKAGE PAR CONTENU ====================
+
+@override_settings(CACHES=CACHES_TESTS)
+class StockageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categorie = Categorie.objects.create(nom='Romans', slug='romans')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        reglage = override_settings(MEDIA_ROOT=media)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+        self.stockage = storage.cas_storage()
+
+    def references(self, nom):
+        return StoredBlob.objects.get(name=nom).references
+
+    def creer_livre(self, contenu):
+        return Livre.objects.create(
+            titre='Livre', auteur='Auteur', description='', categorie=self.categorie,
+            fichier_pdf=ContentFile(contenu, name='livre.pdf'),
+        )
+
+    def test_dedoublonnage(self):
+        premier = self.stockage.save('sujets/a.pdf', ContentFile(b'%PDF-1.4 contenu identique'))
+        second = self.stockage.save('autres/b.pdf', ContentFile(b'%PDF-1.4 contenu identique'))
+        self.assertEqual(premier, second)
+        self.assertEqual(storage.empreinte_de(premier), hashlib.sha256(b'%PDF-1.4 contenu identique').hexdigest())
+        self.assertEqual(StoredBlob.objects.count(), 1)
+        self.assertEqual(len(list(Path(self.stockage.path(storage.PREFIXE)).rglob('*.pdf'))), 1)
+
+    def test_references(self):
+        livre = self.creer_livre(b'%PDF-1.4 v1')
+        ancien = livre.fichier_pdf.name
+        self.assertEqual(self.references(ancien), 1)
+        self.assertEqual(livre.empreinte_pdf, storage.empreinte_de(ancien))
+
+        livre = Livre.objects.get(pk=livre.pk)
+        livre.fichier_pdf = ContentFile(b'%PDF-1.4 v2', name='livre.pdf')
+        with CaptureQueriesContext(connection) as requetes:
+            livre.save()
+        # Noms d'avant lus au chargement (from_db), pas relus
+        self.assertFalse([r['sql'] for r in requetes if r['sql'].startswith('SELECT') and 'fichier_pdf' in r['sql']])
+        nouveau = livre.fichier_pdf.name
+        self.assertEqual((self.references(ancien), self.references(nouveau)), (0, 1))
+
+        # Nouvelle sauvegarde de la même instance : rien ne bouge
+        livre.titre = 'Livre (2e édition)'
+        livre.save()
+        self.assertEqual((self.references(ancien), self.references(nouveau)), (0, 1))
+
+        livre.delete()
+        self.assertEqual(self.references(nouveau), 0)
+
+    def test_collecte(self):
+        utilise = self.creer_livre(b'%PDF-1.4 utilise').fichier_pdf.name
+        orphelin = self.stockage.save('orphelin.pdf', ContentFile(b'%PDF-1.4 orphelin'))
+        recent = self.stockage.save('recent.pdf', ContentFile(b'%PDF-1.4 recent'))
+        StoredBlob.objects.exclude(name=recent).update(created_at=timezone.now() - timedelta(days=2))
+
+        bilan = storage.collecter(timedelta(days=1))
+        self.assertEqual(bilan['supprimes'], 1)
+        self.assertFalse(StoredBlob.objects.filter(name=orphelin).exists())
+        self.assertFalse(self.stockage.exists(orphelin))
+        for nom in (utilise, recent):
+            self.assertTrue(self.stockage.exists(nom))
+
+    def test_collecte_reference_concurrente(self):
+        """Blob référencé entre le recomptage et la suppression : gardé"""
+        nom = self.stockage.save('sujet.pdf', ContentFile(b'%PDF-1.4 sujet'))
+        StoredBlob.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        class Recomptage(Counter):
+            """Références recomptées ; le blob est référencé juste après, avant sa suppression"""
+
+            def get(self, cle, defaut=None):
+                storage.referencer([cle], 1)
+                return super().get(cle, defaut)
+
+        with mock.patch.object(storage, 'compter_references', Recomptage):
+            self.assertEqual(storage.collecter(timedelta(days=1))['supprimes'], 0)
+        self.assertTrue(self.stockage.exists(nom))
+
+    def test_nouvel_envoi_renouvelle_le_delai(self):
+        nom = self.stockage.save('sujet.pdf', ContentFile(b'%PDF-1.4 sujet'))
+        StoredBlob.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.stockage.save('copie.pdf', ContentFile(b'%PDF-1.4 sujet'))
+        self.assertEqual(storage.collecter(timedelta(days=1))['supprimes'], 0)
+        self.assertTrue(self.stockage.exists(nom))
+
+
+# ==================== COMPTEURS À ÉCRITURE DIFFÉRÉE ====================
+
+class CounterBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        categorie = Categorie.objects.create(nom='Romans', slug='romans')
+        cls.livre = Livre.objects.create(titre='Livre', slug='livre', auteur='Auteur', description='', categorie=categorie)
+        cls.cle = ('livres.livre', str(cls.livre.pk), 'nombre_lectures')
+
+    def test_flush_groupe_les_increments(self):
+        tampon = CounterBuffer(MemoryStore(), interval=3600)
+        for _ in range(3):
+            tampon.incr(self.livre, 'nombre_lectures')
+        self.assertEqual(tampon.flush(), 1)
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nombre_lectures, 3)
+        self.assertEqual(tampon.store.drain(), {})
+
+    def test_erreur_pendant_une_requete(self):
+        """Vidage déclenché par incr() : erreur journalisée, requête épargnée, incréments gardés"""
+        tampon = CounterBuffer(MemoryStore(), interval=0)
+        with mock.patch.object(QuerySet, 'update', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('core.counters', 'ERROR'):
+            tampon.incr(self.livre, 'nombre_lectures', 2)
+            tampon._vidage.join()
+        self.assertEqual(tampon.store.drain(), {self.cle: 2})
+
+    def test_erreur_du_vidage_explicite(self):
+        tampon = CounterBuffer(MemoryStore(), interval=3600)
+        tampon.incr(self.livre, 'nombre_lectures', 2)
+        with mock.patch.object(QuerySet, 'update', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                tampon.flush()
+        self.assertEqual(tampon.store.drain(), {self.cle: 2})
+
+    def test_arret_attend_le_vidage_en_cours(self):
+        """À l'arrêt, le vidage attend le thread qui tient le verrou au lieu d'abandonner"""
+        tampon = CounterBuffer(MemoryStore(), interval=3600)
+        tampon.incr(self.livre, 'nombre_lectures', 2)
+        tampon._lock.acquire()
+        threading.Timer(0.2, tampon._lock.release).start()
+        self.assertEqual(tampon.flush(), 0)
+        self.assertEqual(tampon.flush(attente=5), 1)
+        self.livre.refresh_from_db()
+        self.assertEqual(self.livre.nombre_lectures, 2)
+
+
+class SpoolStoreTests(TestCase):
+
+    def setUp(self):
+        self.dossier = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+
+    def test_vidage_interrompu_repris(self):
+        """Fichier .flush d'un processus disparu : remis en attente au démarrage"""
+        termine = subprocess.Popen(['true'])
+        termine.wait()
+        (self.dossier / f'123.{termine.pid}.{"0" * 32}.flush').write_text('livres.livre 1 nombre_lectures 3\n')
+        # Vidage en cours dans un processus vivant : laissé à ce processus
+        (self.dossier / f'124.{os.getpid()}.{"1" * 32}.flush').write_text('livres.livre 1 nombre_lectures 5\n')
+        store = SpoolStore(self.dossier)
+        store.add(('livres.livre', '1', 'nombre_lectures'), 1)
+        self.assertEqual(store.drain(), {('livres.livre', '1', 'nombre_lectures'): 4})
+
+    def test_flush_counters(self):
+        categorie = Categorie.objects.create(nom='Romans', slug='romans')
+        livre = Livre.objects.create(titre='Livre', slug='livre', auteur='Auteur', description='', categorie=categorie)
+        with mock.patch.object(counters, '_tampon', CounterBuffer(SpoolStore(self.dossier), interval=3600)):
+            counters.incrementer(livre, 'nombre_lectures', 3)
+            call_command('flush_counters', stdout=io.StringIO())
+        livre.refresh_from_db()
+        self.assertEqual(livre.nombre_lectures, 3)
+
+    def test_flush_counters_refuse_la_memoire(self):
+        """Le tampon 'memory' d'un worker est invisible depuis la commande"""
+        with mock.patch.object(counters, '_tampon', CounterBuffer(MemoryStore(), interval=3600)):
+            with self.assertRaises(CommandError):
+                call_command('flush_counters', stdout=io.StringIO())
+
+
+# ==================== CACHE SQLITE ====================
+
+class SQLiteCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier, ignore_errors=True)
+        self.cache = SQLiteCache(os.path.join(dossier, 'cache.sqlite3'), {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2, 'CULL_EVERY': 5, 'L1_MAX_ENTRIES': 0},
+        })
+        self.comptages = []
+        self.cache._connexion().set_trace_callback(
+            lambda sql: self.comptages.append(sql) if 'COUNT(*)' in sql else None
+        )
+
+    def nombre(self):
+        return self.cache._connexion().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def test_comptage_echantillonne(self):
+        """Le nombre d'entrées n'est compté qu'une écriture sur CULL_EVERY"""
+        for i in range(20):
+            self.cache.set(f'cle-{i}', i)
+        self.assertEqual(len(self.comptages), 4)
+
+    def test_elagage(self):
+        for i in range(35):
+            self.cache.set(f'cle-{i}', i)
+            # Dépassement de MAX_ENTRIES borné par CULL_EVERY
+            self.assertLessEqual(self.nombre(), 10 + 5)
+        # Les moins récemment écrites (ou lues) partent d'abord
+        self.assertIsNone(self.cache.get('cle-0'))
+        self.assertEqual(self.cache.get('cle-34'), 34)
+
+    def test_add_compte_comme_une_ecriture(self):
+        for i in range(15):
+            self.assertTrue(self.cache.add(f'cle-{i}', i))
+        self.assertEqual(len(self.comptages), 3)
+        self.assertFalse(self.cache.add('cle-14', 0))
+        self.assertEqual(len(self.comptages), 3)
+
+
+# ==================== CACHE DES PAGES ====================
+
+@pagecache.cache_partage()
+def page(request):
+    return HttpResponse('page')
+
+
+VUE = f'{__name__}.page'
+
+
+@override_settings(CACHES=CACHES_TESTS)
+class PageCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        vider_caches()
+        for nom, valeur in (('_releve', Counter()), ('_dernier_report', time.monotonic())):
+            reglage = mock.patch.object(pagecache, nom, valeur)
+            reglage.start()
+            self.addCleanup(reglage.stop)
+
+    def servir(self, n):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        return [page(request)['X-Cache'] for _ in range(n)]
+
+    def stockees(self):
+        cache = caches['default']
+        return tuple(cache.get(f'{pagecache.PREFIXE}:stats:{VUE}:{resultat}') for resultat in ('hit', 'miss'))
+
+    @override_settings(PAGE_CACHE={'STATS_INTERVAL': 3600})
+    def test_comptage_dans_le_processus(self):
+        self.assertEqual(self.servir(3), ['MISS', 'HIT', 'HIT'])
+        # Aucune écriture dans le cache partagé avant la fin de l'intervalle
+        self.assertEqual(self.stockees(), (None, None))
+        self.assertEqual(pagecache.statistiques([VUE]), {VUE: (2, 1)})
+        self.assertEqual(self.stockees(), (2, 1))
+
+        self.servir(2)
+        self.assertEqual(pagecache.statistiques([VUE]), {VUE: (4, 1)})
+
+    @override_settings(PAGE_CACHE={'STATS_INTERVAL': 0})
+    def test_report_a_chaque_intervalle(self):
+        self.servir(2)
+        self.assertEqual(self.stockees(), (1, 1))
+
+
+# ==================== RECALCUL UNIQUE (SINGLE FLIGHT) ====================
+
+@override_settings(CACHES=CACHES_TESTS)
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        vider_caches()
+
+    def concurrents(self, valeur):
+        """Deux appels simultanés ; le second arrive pendant le calcul du premier"""
+        commence, termine = threading.Event(), threading.Event()
+        calculs = []
+
+        def calculer():
+            calculs.append(threading.current_thread().name)
+            if len(calculs) == 1:
+                commence.set()
+                termine.wait(5)
+            return valeur
+
+        resultats = {}
+
+        def appeler():
+            debut = time.monotonic()
+            resultat = singleflight.get_or_compute('cle', calculer, 60, wait=5)
+            resultats[threading.current_thread().name] = (resultat, time.monotonic() - debut)
+
+        premier = threading.Thread(target=appeler, name='premier')
+        premier.start()
+        commence.wait(5)
+        second = threading.Thread(target=appeler, name='second')
+        second.start()
+        time.sleep(0.2)
+        termine.set()
+        for thread in (premier, second):
+            thread.join()
+        return calculs, resultats
+
+    def test_valeur_partagee(self):
+        calculs, resultats = self.concurrents('page')
+        self.assertEqual(calculs, ['premier'])
+        self.assertEqual(resultats['second'][0], 'page')
+
+    def test_valeur_non_mise_en_cache(self):
+        """Verrou libéré sans valeur : l'autre appel calcule aussitôt, sans attendre WAIT"""
+        calculs, resultats = self.concurrents(None)
+        self.assertEqual(calculs, ['premier', 'second'])
+        self.assertEqual(resultats['second'][0], None)
+        self.assertLess(resultats['second'][1], 2)
+
+
+# ==================== PLANS D'EXÉCUTION ====================
+
+# Tables dont aucune requête ne doit parcourir toute la table ni trier sans index
+# (les tables de référence, quelques dizaines de lignes lues en entier, n'en sont pas)
+SURVEILLEES = {
+    EpreuveListing._meta.db_table,
+    Livre._meta.db_table,
+    Download._meta.db_table,
+}
+
+ANNEES = [f"{annee}-{annee + 1}" for annee in range(2015, 2026)]
+
+
+def combinaisons(filtres):
+    """Toutes les combinaisons de paramètres (None : paramètre absent)"""
+    noms = list(filtres)
+    for choix in itertools.product(*(filtres[nom] for nom in noms)):
+        yield {nom: valeur for nom, valeur in zip(noms, choix) if valeur is not None}
+
+
+@override_settings(CACHES=CACHES_TESTS)
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN : base SQLite uniquement")
+class PlansRequetesTests(DonneesScolaires, TestCase):
+    """
+    Chaque combinaison de filtres de la liste des épreuves, de la bibliothèque
+    et du dashboard reste servie par un index (EXPLAIN QUERY PLAN) : ni parcours
+    complet de table, ni tri dans un B-tree temporaire. Vérifié sans
+    statistiques (base jamais analysée), puis après ANALYZE.
+    """
+
+    EPREUVES = 1000
+    LIVRES = 300
+    TELECHARGEMENTS = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        hasard = random.Random(0)
+        cls.creer_referentiel()
+        registre = taxonomy.registre()
+        classes = registre.liste('classe')
+        matieres = registre.liste('matiere')
+        periodes = [periode for periode in registre.liste('periode') if periode.code in ('s1', 's2')]
+        series = registre.liste('serie')
+
+        lignes = []
+        for pk in range(1, cls.EPREUVES + 1):
+            classe = hasard.choice(classes)
+            matiere = hasard.choice(matieres)
+            periode = hasard.choice(periodes)
+            serie = hasard.choice(series) if series and classe.niveau.has_serie else None
+            type_epreuve = hasard.choice(Epreuve.TYPE_EPREUVE_CHOICES)[0]
+            lignes.append(EpreuveListing(
+                id=pk, slug=f'plan-{pk}', titre=f'Épreuve {pk}',
+                annee_scolaire=hasard.choice(ANNEES), type_epreuve=type_epreuve,
+                is_examen=type_epreuve in Epreuve.TYPES_EXAMEN_FINAL,
+                is_premium=hasard.random() < 0.3, is_active=hasard.random() < 0.95,
+                niveau_id=classe.niveau_id, classe_id=classe.pk, classe_nom=classe.nom,
+                serie_id=serie.pk if serie else None, serie_code=serie.code if serie else '',
+                matiere_id=matiere.pk, matiere_nom=matiere.nom, matiere_couleur=matiere.couleur,
+                periode_id=periode.pk, periode_code=periode.code, periode_nom=periode.nom,
+            ))
+        EpreuveListing.objects.bulk_create(lignes, batch_size=1000)
+
+        categories = Categorie.objects.bulk_create([
+            Categorie(nom=f'Catégorie {i}', slug=f'plan-{i}') for i in range(12)
+        ])
+        Livre.objects.bulk_create([
+            Livre(
+                titre=f'Livre {i}', slug=f'plan-{i}', auteur='Auteur', description='',
+                categorie=hasard.choice(categories),
+                format_disponible=hasard.choice(Livre.FORMAT_CHOICES)[0],
+                is_active=hasard.random() < 0.95,
+            )
+            for i in range(cls.LIVRES)
+        ], batch_size=1000)
+
+        User = get_user_model()
+        lecteurs = [User.objects.create_user(email=f'plan-{i}@example.invalid', password=None) for i in range(20)]
+        Download.objects.bulk_create([
+            Download(
+                user=hasard.choice(lecteurs), epreuve_id=ligne.id, epreuve_title=ligne.titre,
+                matiere=ligne.matiere_nom, classe=ligne.classe_nom,
+                annee=int(ligne.annee_scolaire[:4]), is_free=hasard.random() < 0.2,
+            )
+            for ligne in (hasard.choice(lignes) for _ in range(cls.TELECHARGEMENTS))
+        ], batch_size=1000)
+
+        cls.lecteur = lecteurs[0]
+        cls.classe = hasard.choice([c for c in classes if c.niveau.has_serie] or classes)
+        cls.matiere, cls.periode, cls.serie, cls.categorie = matieres[0], periodes[0], series[0], categories[0]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.lecteur)
+
+    def verifier(self, url, filtres=None):
+        """Plans des requêtes de toutes les combinaisons, avant puis après ANALYZE"""
+        defaillances = {}
+        for phase in ('sans statistiques', 'après ANALYZE'):
+            if phase == 'après ANALYZE':
+                # Annulé avec la transaction du test
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            vider_caches()
+            vus = set()
+            for params in combinaisons(filtres or {}):
+                for requete in self.requetes(url, params):
+                    if requete.sql in vus or not queryplans.tables(requete.sql) & SURVEILLEES:
+                        continue
+                    vus.add(requete.sql)
+                    defauts = queryplans.defauts(requete, queryplans.expliquer(requete), SURVEILLEES)
+                    if defauts:
+                        defaillances[requete.sql] = (phase, params, defauts)
+        self.assertFalse(defaillances, '\n'.join(
+            f"[{phase}] {params} : {sql}\n  -> " + '\n  -> '.join(defauts)
+            for sql, (phase, params, defauts) in defaillances.items()
+        ))
+
+    def requetes(self, url, params):
+        """Requêtes de la première page, puis de la page suivante (curseur) s'il y en a une"""
+        with queryplans.capturer() as requetes:
+            reponse = self.client.get(url, params)
+        self.assertEqual(reponse.status_code, 200, f"{url} {params}")
+        suivante = re.search(r'[?&]curseur=([^"&]+)', reponse.content.decode())
+        if suivante:
+            with queryplans.capturer() as page_suivante:
+                self.client.get(url, {**params, 'curseur': html.unescape(suivante.group(1))})
+            requetes += page_suivante
+        return requetes
+
+    def test_liste_epreuves(self):
+        self.verifier(reverse('epreuves:liste'), {
+            'classe': [None, self.classe.pk],
+            'matiere': [None, self.matiere.pk],
+            'periode': [None, self.periode.pk, 'exam'],
+            'serie': [None, self.serie.pk],
+            'type_epreuve': [None, 'composition_1'],
+            # Absent : année en cours ; vide : toutes les années
+            'annee_scolaire': [None, '', ANNEES[-2]],
+        })
+
+    def test_bibliotheque(self):
+        self.verifier(reverse('livres:bibliotheque'), {
+            'categorie': [None, self.categorie.slug],
+            'format': [None, 'pdf'],
+        })
+
+    def test_dashboard(self):
+        self.verifier(reverse('dashboard:home'))
+
+    def test_dashboard_epreuves(self):
+        self.verifier(reverse('dashboard:epreuves'), {
+            'classe': ['', self.classe.nom],
+            'matiere': [None, self.matiere.nom],
+            'annee': [None, ANNEES[-2][:4]],
+            'type': [None, 'devoir', 'bepc', 'bac'],
+        })
+
+    def test_dashboard_telechargements(self):
+        self.verifier(reverse('dashboard:downloads'))
+
+
+# ==================== BUDGETS DE REQUÊTES ====================
+
+# Lignes créées par liste : au-delà d'une page et du seuil de N+1
+NOMBRE = 15
+
+PDF = b'%PDF-1.4\n' + b'0' * 2048
+
+
+@override_settings(CACHES=CACHES_TESTS, QUERY_BUDGET={'ENABLED': True, 'RAISE': False, 'REPETITIONS': 5})
+class BudgetsRequetesTests(DonneesScolaires, TestCase):
+    """
+    Chaque vue respecte son budget déclaré (@budget_requetes), mesuré à froid
+    (caches vidés) par QueryBudgetMiddleware, et n'exécute aucun N+1 ; les
+    listes de l'admin n'ont pas de budget mais aucun N+1 non plus.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creer_referentiel()
+        registre = taxonomy.registre()
+        classes = registre.liste('classe')
+        matieres = registre.liste('matiere')
+        periodes = registre.liste('periode')
+
+        User = get_user_model()
+        cls.identifiants = {'username': 'budget@example.invalid', 'password': 'Budget-2024'}
+        cls.user = User.objects.create_user(email=cls.identifiants['username'], password=cls.identifiants['password'])
+        autres = [User.objects.create_user(email=f'budget-{i}@example.invalid', password=None) for i in range(NOMBRE)]
+        cls.sortant = autres[0]
+        cls.administrateur = User.objects.create_superuser(email='budget-admin@example.invalid', password=None)
+
+        epreuves = []
+        for i in range(NOMBRE):
+            classe = classes[i % len(classes)]
+            epreuve = Epreuve(
+                titre=f'Budget {i}', slug=f'budget-{i}',
+                niveau_id=classe.niveau_id, classe_id=classe.pk,
+                matiere_id=matieres[i % len(matieres)].pk, periode_id=periodes[i % len(periodes)].pk,
+                annee_scolaire='2024-2025', type_epreuve='composition_1',
+            )
+            epreuve.fichier_sujet.save(f'sujet-{i}.pdf', ContentFile(PDF + bytes([i])), save=False)
+            epreuve.fichier_corrige.save(f'corrige-{i}.pdf', ContentFile(PDF + bytes([i, i])), save=False)
+            epreuve.save()
+            epreuves.append(epreuve)
+
+        categorie = Categorie.objects.create(nom='Budget', slug='budget')
+        livres = []
+        for i in range(NOMBRE):
+            livre = Livre(
+                titre=f'Budget {i}', slug=f'budget-{i}', auteur='Auteur',
+                description='', categorie=categorie, is_premium=False,
+            )
+            livre.fichier_pdf.save(f'livre-{i}.pdf', ContentFile(PDF + bytes([i, i, i])), save=False)
+            livre.save()
+            livres.append(livre)
+
+        for autre in autres:
+            Avis.objects.create(user=autre, livre=livres[0], note=4, commentaire='Bien', is_approuve=True)
+            Telechargement.objects.create(user=autre, epreuve=epreuves[0])
+        for epreuve in epreuves:
+            # epreuves[1] reste à télécharger : enregistrement et statistiques mesurés
+            if epreuve is not epreuves[1]:
+                Telechargement.objects.create(user=cls.user, epreuve=epreuve)
+            Favori.objects.create(user=cls.user, epreuve=epreuve)
+            Download.objects.create(
+                user=cls.user, epreuve_id=epreuve.pk, epreuve_title=epreuve.titre,
+                matiere=str(epreuve.matiere_id), classe=str(epreuve.classe_id), annee=2024,
+            )
+            UserActivity.objects.create(user=cls.user, action='download_epreuve')
+        Lecture.objects.create(user=cls.user, livre=livres[0])
+
+        cls.epreuve, cls.lot, cls.page = epreuves[1], epreuves[0], epreuves[:12]
+        cls.livre = livres[0]
+
+    def setUp(self):
+        super().setUp()
+        # Clients créés sous QUERY_BUDGET['ENABLED'] : le middleware de relevé est chargé
+        self.anonyme = Client()
+        self.connecte = Client()
+        self.connecte.force_login(self.user)
+
+    def verifier(self, pages):
+        """Chaque page (client, méthode, URL, données) dans son budget et sans N+1"""
+        for client, methode, url, donnees in pages:
+            with self.subTest(methode=methode.upper(), url=url):
+                vider_caches()
+                try:
+                    response = getattr(client, methode)(url, donnees)
+                except (TemplateDoesNotExist, NoReverseMatch) as erreur:
+                    # Gabarit absent ou cassé : la page ne s'affiche pas, son budget ne se mesure pas
+                    self.skipTest(f"{type(erreur).__name__} : {erreur}")
+                self.assertLess(response.status_code, 400)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+
+                self.assertFalse(response.has_header('X-N-Plus-Un'), response.get('X-N-Plus-Un'))
+                if url.startswith(reverse('admin:index')):
+                    continue
+                budget = getattr(resolve(url).func, 'budget_requetes', None)
+                self.assertIsNotNone(budget, "aucun budget déclaré (@budget_requetes)")
+                self.assertLessEqual(int(response['X-Requetes']), budget)
+
+    def test_epreuves(self):
+        epreuve = {'slug': self.epreuve.slug}
+        self.verifier([
+            (self.anonyme, 'get', reverse('epreuves:liste'), {'annee_scolaire': ''}),
+            (self.connecte, 'get', reverse('epreuves:liste'), {'annee_scolaire': ''}),
+            (self.connecte, 'get', reverse('epreuves:detail', kwargs=epreuve), {}),
+            (self.connecte, 'get', reverse('epreuves:telecharger', kwargs=epreuve), {}),
+            (self.connecte, 'get', reverse('epreuves:telecharger_corrige', kwargs=epreuve), {}),
+            (self.connecte, 'get', reverse('epreuves:lot'), {
+                'annee_scolaire': self.lot.annee_scolaire, 'classe': self.lot.classe_id,
+            }),
+            (self.connecte, 'post', reverse('epreuves:favori', kwargs=epreuve), {}),
+            (self.connecte, 'get', reverse('epreuves:personnalisation'), {
+                'ids': ','.join(str(epreuve.pk) for epreuve in self.page),
+            }),
+        ])
+
+    def test_livres(self):
+        livre = {'slug': self.livre.slug}
+        self.verifier([
+            (self.anonyme, 'get', reverse('livres:bibliotheque'), {}),
+            (self.connecte, 'get', reverse('livres:bibliotheque'), {}),
+            (self.connecte, 'get', reverse('livres:detail', kwargs=livre), {}),
+            (self.connecte, 'get', reverse('livres:lecture', kwargs=livre), {}),
+            (self.connecte, 'get', reverse('livres:telecharger', kwargs=livre), {}),
+            (self.connecte, 'post', reverse('livres:progression', kwargs=livre), {'page': 3, 'pourcentage': 10}),
+            (self.connecte, 'post', reverse('livres:avis', kwargs=livre), {'note': 5, 'commentaire': 'Très bien'}),
+        ])
+
+    def test_dashboard(self):
+        self.verifier([
+            (self.connecte, 'get', reverse('dashboard:home'), {}),
+            (self.connecte, 'get', reverse('dashboard:epreuves'), {'classe': ''}),
+            (self.connecte, 'get', reverse('dashboard:downloads'), {}),
+            (self.connecte, 'get', reverse('dashboard:abonnement'), {}),
+            (self.connecte, 'get', reverse('dashboard:profile'), {}),
+        ])
+
+    def test_accounts(self):
+        sortant = Client()
+        sortant.force_login(self.sortant)
+        self.verifier([
+            (self.anonyme, 'get', reverse('accounts:login'), {}),
+            (self.anonyme, 'get', reverse('accounts:register'), {}),
+            (Client(), 'post', reverse('accounts:register'), {
+                'fullname': 'Budget Inscrit', 'email': 'budget-inscrit@example.invalid',
+                'phone': '+229012345678', 'niveau': 'lycee', 'classe': '2nde',
+                'terms': 'on', 'password1': 'Inscrit-2024', 'password2': 'Inscrit-2024',
+            }),
+            (Client(), 'post', reverse('accounts:login'), self.identifiants),
+            (sortant, 'get', reverse('accounts:logout'), {}),
+            (self.connecte, 'get', reverse('accounts:profile'), {}),
+            (self.connecte, 'get', reverse('accounts:preferences'), {}),
+            (self.connecte, 'post', reverse('accounts:profile_update'), {'first_name': 'Budget'}),
+            (self.connecte, 'get', reverse('accounts:resend_verification'), {}),
+        ])
+
+    def test_api(self):
+        self.verifier([
+            (self.anonyme, 'get', reverse('api:statistiques_site'), {}),
+        ])
+
+    def test_admin(self):
+        administrateur = Client()
+        administrateur.force_login(self.administrateur)
+        self.verifier([
+            (administrateur, 'get', reverse(f'admin:{modele._meta.app_label}_{modele._meta.model_name}_changelist'), {})
+            for modele in admin.site._registry
+            if modele._meta.app_label in ('epreuves', 'livres', 'dashboard', 'accounts')
+        ])
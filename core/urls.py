@@ -6,4 +6,6 @@ app_name= 'core'
 urlpatterns = [
     path('', views.accueil,name='accueil'),
     
+    # Fichiers servis par URL signée (SignedURLBackend, sans nginx)
+    path('fichiers/<path:chemin>', views.fichier_signe, name='fichier_signe'),
 ]
@@ -1,6 +1,32 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponseForbidden
 from django.shortcuts import render, redirect
 
+from dashboard import sitestats
+
+from .delivery import verifier_signature
+from .files import FichierStocke, servir_fichier
+from .pagecache import cache_partage
+from .storage import empreinte_de
+
+@cache_partage()
 def accueil(request):
     if request.user.is_authenticated:
         return redirect('dashboard:home')
-    return render(request, 'core/base.html')
\ No newline at end of file
+    return render(request, 'core/base.html', {'stats_site': sitestats.totaux()})
+
+
+def fichier_signe(request, chemin):
+    """
+    Sert un fichier via une URL signée (SignedURLBackend).
+    Remplace en local le serveur statique qui vérifie la signature en production.
+    """
+    nom = request.GET.get('nom', '')
+    if not verifier_signature(chemin, request.GET.get('expire'), nom, request.GET.get('signature')):
+        return HttpResponseForbidden("Lien expiré ou invalide")
+    try:
+        return servir_fichier(
+            request, FichierStocke(chemin), filename=nom or None, empreinte=empreinte_de(chemin) or None
+        )
+    except (FileNotFoundError, SuspiciousFileOperation):
+        raise Http404("Fichier non trouvé")
@@ -0,0 +1,154 @@
+# apps/core/zipstream.py
+
+"""
+Écriture d'archives ZIP en flux (générateur)
+
+L'archive est produite morceau par morceau pendant l'envoi de la réponse :
+ni fichier temporaire, ni archive complète en mémoire (un bloc de lecture
+à la fois). Chaque membre est écrit avec un descripteur de données (bit 3)
+puisque son CRC n'est connu qu'après lecture ; le répertoire central est
+émis à la fin.
+
+    archive = ZipStream()
+    archive.ajouter('maths/sujet.pdf', epreuve.fichier_sujet, taille=..., modifie=...)
+    StreamingHttpResponse(archive, content_type='application/zip')
+
+Méthodes : ZIP_STORED (PDF déjà compressés, taille de l'archive connue
+d'avance) ou ZIP_DEFLATED. Pas de ZIP64 : archive et membres < 4 Gio.
+"""
+
+import struct
+import time
+import zlib
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+
+TAILLE_BLOC = 64 * 1024
+LIMITE = 0xFFFFFFFF
+
+# Bit 3 : CRC et tailles dans le descripteur ; bit 11 : noms en UTF-8
+DRAPEAUX = 0x08 | 0x800
+VERSION = 20
+
+ENTETE_LOCAL = struct.Struct('<4s2H3H3L2H')
+DESCRIPTEUR = struct.Struct('<4s3L')
+ENTETE_CENTRAL = struct.Struct('<4s6H3L5H2L')
+FIN_CENTRAL = struct.Struct('<4s4H2LH')
+
+
+def _date_dos(horodatage):
+    annee, mois, jour, heure, minute, seconde = time.localtime(horodatage)[:6]
+    annee = max(annee, 1980)
+    return (heure << 11) | (minute << 5) | (seconde // 2), ((annee - 1980) << 9) | (mois << 5) | jour
+
+
+class _Membre:
+    def __init__(self, nom, fichier, taille, modifie, methode):
+        self.nom = nom.encode('utf-8')
+        self.fichier = fichier
+        self.taille = taille
+        self.heure, self.date = _date_dos(modifie if modifie is not None else time.time())
+        self.methode = methode
+        self.crc = 0
+        self.taille_compressee = 0
+        self.taille_reelle = 0
+        self.position = 0
+
+
+class ZipStream:
+    """Archive ZIP itérable : chaque itération produit un morceau de l'archive"""
+
+    def __init__(self, methode=ZIP_STORED, niveau=6):
+        self.methode = methode
+        self.niveau = niveau
+        self._membres = []
+
+    def ajouter(self, nom, fichier, taille=None, modifie=None, methode=None):
+        """
+        Ajoute un membre. `fichier` : objet avec open('rb') (FieldFile,
+        FichierStocke) ou fonction sans argument renvoyant un flux binaire ;
+        il n'est ouvert qu'au moment de son écriture.
+        """
+        self._membres.append(_Membre(
+            nom, fichier, taille, modifie, self.methode if methode is None else methode
+        ))
+
+    def __len__(self):
+        return len(self._membres)
+
+    def taille(self):
+        """Taille exacte de l'archive si tous les membres sont stockés et de taille connue, sinon None"""
+        total = 0
+        for membre in self._membres:
+            if membre.methode != ZIP_STORED or membre.taille is None:
+                return None
+            total += ENTETE_LOCAL.size + len(membre.nom) + membre.taille + DESCRIPTEUR.size
+            total += ENTETE_CENTRAL.size + len(membre.nom)
+        return total + FIN_CENTRAL.size
+
+    # -------------------- Écriture --------------------
+
+    def _ouvrir(self, membre):
+        if hasattr(membre.fichier, 'open'):
+            return membre.fichier.open('rb')
+        return membre.fichier()
+
+    def _donnees(self, membre):
+        """Contenu du membre (compressé au besoin), en calculant CRC et tailles"""
+        compresseur = None
+        if membre.methode == ZIP_DEFLATED:
+            compresseur = zlib.compressobj(self.niveau, zlib.DEFLATED, -15)
+        with self._ouvrir(membre) as flux:
+            while True:
+                bloc = flux.read(TAILLE_BLOC)
+                if not bloc:
+                    break
+                membre.crc = zlib.crc32(bloc, membre.crc)
+                membre.taille_reelle += len(bloc)
+                if compresseur:
+                    bloc = compresseur.compress(bloc)
+                if bloc:
+                    membre.taille_compressee += len(bloc)
+                    yield bloc
+        if compresseur:
+            reste = compresseur.flush()
+            membre.taille_compressee += len(reste)
+            yield reste
+
+    def __iter__(self):
+        position = 0
+        for membre in self._membres:
+            membre.position = position
+            entete = ENTETE_LOCAL.pack(
+                b'PK\x03\x04', VERSION, DRAPEAUX, membre.methode,
+                membre.heure, membre.date, 0, 0, 0, len(membre.nom), 0,
+            ) + membre.nom
+            yield entete
+            position += len(entete)
+
+            for bloc in self._donnees(membre):
+                position += len(bloc)
+                yield bloc
+
+            if max(membre.taille_compressee, membre.taille_reelle, position) > LIMITE:
+                raise ValueError("Archive trop volumineuse (ZIP64 non pris en charge)")
+            descripteur = DESCRIPTEUR.pack(
+                b'PK\x07\x08', membre.crc, membre.taille_compressee, membre.taille_reelle
+            )
+            yield descripteur
+            position += len(descripteur)
+
+        debut_central = position
+        central = []
+        for membre in self._membres:
+            central.append(ENTETE_CENTRAL.pack(
+                b'PK\x01\x02', VERSION, VERSION, DRAPEAUX, membre.methode,
+                membre.heure, membre.date, membre.crc, membre.taille_compressee,
+                membre.taille_reelle, len(membre.nom), 0, 0, 0, 0, 0, membre.position,
+            ) + membre.nom)
+        central = b''.join(central)
+        yield central
+        yield FIN_CENTRAL.pack(
+            b'PK\x05\x06', 0, 0, len(self._membres), len(self._membres),
+            len(central), debut_central, 0,
+        )
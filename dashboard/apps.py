@@ -6,4 +6,5 @@ class DashboardConfig(AppConfig):
     name = 'dashboard'
     verbose_name = 'Tableau de bord'
 
-   
\ No newline at end of file
+    def ready(self):
+        from . import signals  # noqa: F401
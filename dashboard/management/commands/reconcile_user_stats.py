@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import stats as statistiques
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les statistiques de téléchargement des utilisateurs (UserStats, "
+        "compteurs par matière) depuis l'historique des téléchargements"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', action='append', help="Limiter à cet utilisateur (répétable)")
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['email']:
+            user_ids = list(get_user_model().objects.filter(email__in=options['email']).values_list('pk', flat=True))
+            if len(user_ids) != len(set(options['email'])):
+                raise CommandError("Utilisateur inconnu parmi : " + ', '.join(options['email']))
+        corrigees = statistiques.reconstruire(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"{corrigees} statistique(s) utilisateur créée(s) ou corrigée(s)."))
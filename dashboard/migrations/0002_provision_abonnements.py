@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:39
+
+from django.conf import settings
+from django.db import migrations
+
+
+def provisionner_abonnements(apps, schema_editor):
+    """Abonnement gratuit pour les comptes créés avant la création à l'inscription"""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Abonnement = apps.get_model('dashboard', 'Abonnement')
+    sans_abonnement = User.objects.filter(abonnement__isnull=True).values_list('id', flat=True)
+    Abonnement.objects.bulk_create(
+        [
+            Abonnement(user_id=user_id, plan='gratuit', telechargements_inclus=3)
+            for user_id in sans_abonnement.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(provisionner_abonnements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_provision_abonnements'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='download',
+            index=models.Index(fields=['user', '-downloaded_at'], name='dashboard_dl_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='download',
+            index=models.Index(fields=['user', 'matiere'], name='dashboard_dl_user_matiere_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='download',
+            index=models.Index(fields=['user', 'annee'], name='dashboard_dl_user_annee_idx'),
+        ),
+    ]
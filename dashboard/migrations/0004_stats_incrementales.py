@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_index_historique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='current_month',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='favorite_matiere_downloads',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='UserMatiereStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('matiere', models.CharField(max_length=50)),
+                ('downloads', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_matieres', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Statistiques par matière',
+                'verbose_name_plural': 'Statistiques par matière',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usermatierestats',
+            constraint=models.UniqueConstraint(fields=('user', 'matiere'), name='dashboard_stats_user_matiere_uniq'),
+        ),
+    ]
@@ -2,6 +2,7 @@
 
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 
 User = get_user_model()
@@ -26,24 +27,63 @@ class Download(models.Model):
         ordering = ['-downloaded_at']
         verbose_name = 'Téléchargement'
         verbose_name_plural = 'Téléchargements'
+        # Historique et statistiques d'un utilisateur : dans l'ordre, sans tri
+        indexes = [
+            models.Index(fields=['user', '-downloaded_at'], name='dashboard_dl_user_date_idx'),
+            models.Index(fields=['user', 'matiere'], name='dashboard_dl_user_matiere_idx'),
+            models.Index(fields=['user', 'annee'], name='dashboard_dl_user_annee_idx'),
+        ]
 
 
 class UserStats(models.Model):
-    """Statistiques agrégées par utilisateur (pour performance)"""
+    """
+    Statistiques agrégées par utilisateur (pour performance)
+
+    Tenues à jour à chaque téléchargement par dashboard.stats.enregistrer(),
+    en UPDATE atomiques ; `reconcile_user_stats` les recalcule depuis l'historique.
+    """
     user = models.OneToOneField(
         User,
         on_delete=models.CASCADE,
         related_name='stats'
     )
     total_downloads = models.PositiveIntegerField(default=0)
+    # Compteur du mois `current_month` (1er du mois) ; remis à zéro au premier téléchargement d'un autre mois
     downloads_this_month = models.PositiveIntegerField(default=0)
+    current_month = models.DateField(null=True, blank=True)
     last_download_date = models.DateTimeField(null=True, blank=True)
     favorite_matiere = models.CharField(max_length=50, blank=True)
+    favorite_matiere_downloads = models.PositiveIntegerField(default=0)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = 'Statistiques utilisateur'
         verbose_name_plural = 'Statistiques utilisateurs'
+    
+    @property
+    def this_month(self):
+        """Téléchargements du mois en cours (0 si le dernier date d'un mois précédent)"""
+        if self.current_month != timezone.localdate().replace(day=1):
+            return 0
+        return self.downloads_this_month
+
+
+class UserMatiereStats(models.Model):
+    """Téléchargements d'un utilisateur par matière (matière favorite)"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats_matieres'
+    )
+    matiere = models.CharField(max_length=50)
+    downloads = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Statistiques par matière'
+        verbose_name_plural = 'Statistiques par matière'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'matiere'], name='dashboard_stats_user_matiere_uniq'),
+        ]
 
 
 class Abonnement(models.Model):
@@ -0,0 +1,26 @@
+# apps/dashboard/signals.py
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import subscription
+from .models import Abonnement
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def provisionner_abonnement(sender, instance, created=False, raw=False, **kwargs):
+    """Chaque compte reçoit son abonnement gratuit à l'inscription"""
+    if created and not raw:
+        subscription.provisionner(instance)
+
+
+@receiver(post_save, sender=Abonnement)
+@receiver(post_delete, sender=Abonnement)
+def invalider_abonnement(sender, instance, **kwargs):
+    """Retire l'abonnement du cache une fois la modification validée"""
+    transaction.on_commit(lambda: subscription.invalider(instance.user_id))
@@ -0,0 +1,61 @@
+# apps/dashboard/sitestats.py
+
+"""
+Statistiques globales du site (tableau de bord, page d'accueil, API)
+
+totaux() renvoie les totaux depuis le cache partagé. Toutes les TIMEOUT
+secondes, une requête (une seule, tous workers confondus) lance leur
+recalcul dans un thread et sert en attendant les totaux précédents
+(stale-while-revalidate, voir core/singleflight.py) : aucune page n'attend
+les COUNT. Seul le tout premier appel, cache vide, les calcule sur place.
+
+Configuration (settings.SITE_STATS) : {'TIMEOUT': 300, 'STALE': 86400}
+"""
+
+import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from core import singleflight
+from epreuves.models import EpreuveListing, Telechargement
+from livres.models import Livre
+
+
+DEFAUTS = {
+    'TIMEOUT': 300,
+    'STALE': 86400,
+}
+
+CLE = 'dashboard:statistiques_site'
+
+
+def reglages():
+    return {**DEFAUTS, **getattr(settings, 'SITE_STATS', {})}
+
+
+def calculer():
+    """Totaux recalculés depuis la base"""
+    minuit = timezone.make_aware(datetime.datetime.combine(timezone.localdate(), datetime.time.min))
+    # Chaque total est lu dans un index partiel, sans parcourir la table
+    epreuves = EpreuveListing.objects.filter(is_active=True)
+    return {
+        'epreuves': epreuves.count(),
+        'corriges': epreuves.filter(has_corrige=True).count(),
+        'utilisateurs': get_user_model().objects.filter(is_active=True).count(),
+        'livres': Livre.objects.filter(is_active=True).count(),
+        'telechargements_aujourdhui': Telechargement.objects.filter(date_telechargement__gte=minuit).count(),
+        'calcule_le': timezone.now(),
+    }
+
+
+def totaux():
+    """
+    {'epreuves', 'corriges', 'utilisateurs', 'livres', 'telechargements_aujourdhui',
+    'calcule_le'} : au plus TIMEOUT secondes de retard, hors recalcul en cours
+    """
+    config = reglages()
+    return singleflight.get_or_compute(
+        CLE, calculer, config['TIMEOUT'], stale=config['STALE'], arriere_plan=True,
+    )
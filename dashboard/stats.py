@@ -0,0 +1,189 @@
+# apps/dashboard/stats.py
+
+"""
+Statistiques de téléchargement par utilisateur, tenues à jour au fil de l'eau
+
+Chaque téléchargement enregistré (epreuves.quota.consommer) passe par
+enregistrer(), dans la transaction du décompte du quota :
+1. INSERT des lignes d'historique (Download) ;
+2. INSERT ... ON CONFLICT DO UPDATE SET downloads = downloads + n des
+   compteurs par matière (UserMatiereStats), RETURNING les nouveaux totaux ;
+3. un seul UPDATE de UserStats : total, compteur du mois (remis à n si le
+   mois a changé), date du dernier téléchargement et matière favorite (celle
+   dont le compteur dépasse favorite_matiere_downloads).
+Aucune lecture suivie d'une écriture : les téléchargements concurrents
+d'un même utilisateur ne perdent aucun incrément.
+
+Le tableau de bord lit une seule ligne (charger()). reconstruire(), appelé
+par `reconcile_user_stats`, recalcule tout depuis l'historique.
+"""
+
+import datetime
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Count, F, Max, PositiveIntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import Download, UserMatiereStats, UserStats
+
+
+def mois_courant():
+    """1er jour du mois en cours (fuseau du site)"""
+    return timezone.localdate().replace(day=1)
+
+
+def charger(user):
+    """Statistiques de `user`, sans jamais les écrire (ligne vide si absente)"""
+    stats = UserStats.objects.filter(user_id=user.pk).first()
+    return stats if stats is not None else UserStats(user_id=user.pk)
+
+
+# ==================== ENREGISTREMENT ====================
+
+def _compter_matieres(user_id, par_matiere):
+    """Ajoute les téléchargements par matière. Retourne {matiere: nouveau total}."""
+    meta = UserMatiereStats._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    user, matiere, downloads = (qn(meta.get_field(nom).column) for nom in ('user', 'matiere', 'downloads'))
+    lignes = []
+    for nom, nombre in par_matiere.items():
+        lignes.extend((user_id, nom, nombre))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({user}, {matiere}, {downloads}) "
+            f"VALUES {', '.join(['(%s, %s, %s)'] * len(par_matiere))} "
+            f"ON CONFLICT ({user}, {matiere}) DO UPDATE SET {downloads} = {table}.{downloads} + excluded.{downloads} "
+            f"RETURNING {matiere}, {downloads}",
+            lignes,
+        )
+        return dict(cursor.fetchall())
+
+
+def enregistrer(user_id, telechargements):
+    """
+    Historise `telechargements` (instances de Download non enregistrées,
+    d'un même utilisateur) et met à jour ses statistiques.
+    """
+    if not telechargements:
+        return
+    maintenant = timezone.now()
+    mois = mois_courant()
+    n = len(telechargements)
+    par_matiere = {}
+    for telechargement in telechargements:
+        telechargement.user_id = user_id
+        telechargement.downloaded_at = maintenant
+        par_matiere[telechargement.matiere] = par_matiere.get(telechargement.matiere, 0) + 1
+
+    with transaction.atomic():
+        Download.objects.bulk_create(telechargements)
+        # Matière du lot dont le total est le plus élevé : favorite si elle dépasse l'actuelle
+        favorite, total = max(_compter_matieres(user_id, par_matiere).items(), key=lambda item: item[1])
+        mise_a_jour = {
+            'total_downloads': F('total_downloads') + n,
+            'downloads_this_month': Case(
+                When(current_month=mois, then=F('downloads_this_month') + n),
+                default=Value(n),
+                output_field=PositiveIntegerField(),
+            ),
+            'current_month': mois,
+            'last_download_date': maintenant,
+            'favorite_matiere': Case(
+                When(favorite_matiere_downloads__lt=total, then=Value(favorite)),
+                default=F('favorite_matiere'),
+            ),
+            'favorite_matiere_downloads': Case(
+                When(favorite_matiere_downloads__lt=total, then=Value(total)),
+                default=F('favorite_matiere_downloads'),
+                output_field=PositiveIntegerField(),
+            ),
+            'updated_at': maintenant,
+        }
+        if UserStats.objects.filter(user_id=user_id).update(**mise_a_jour):
+            return
+        # Premier téléchargement : la ligne est créée (ou l'a été entre-temps par un autre)
+        try:
+            with transaction.atomic():
+                UserStats.objects.create(
+                    user_id=user_id, total_downloads=n, downloads_this_month=n, current_month=mois,
+                    last_download_date=maintenant, favorite_matiere=favorite, favorite_matiere_downloads=total,
+                )
+        except IntegrityError:
+            UserStats.objects.filter(user_id=user_id).update(**mise_a_jour)
+
+
+# ==================== RECONSTRUCTION ====================
+
+CHAMPS = (
+    'total_downloads', 'downloads_this_month', 'current_month', 'last_download_date',
+    'favorite_matiere', 'favorite_matiere_downloads',
+)
+
+
+def _agreger(historique, mois, debut_mois):
+    """
+    Depuis l'historique : compteurs par matière [(user_id, matiere, nombre)]
+    et valeurs attendues de CHAMPS, par utilisateur.
+    """
+    par_matiere = list(historique.values_list('user_id', 'matiere').annotate(nombre=Count('id')))
+    favorites = {}
+    for user_id, matiere, nombre in sorted(par_matiere, key=lambda ligne: (ligne[0], -ligne[2], ligne[1])):
+        favorites.setdefault(user_id, (matiere, nombre))
+    attendues = {
+        ligne['user_id']: (
+            ligne['total'], ligne['ce_mois'], mois, ligne['dernier'], *favorites[ligne['user_id']]
+        )
+        for ligne in historique.values('user_id').annotate(
+            total=Count('id'),
+            ce_mois=Count('id', filter=Q(downloaded_at__gte=debut_mois)),
+            dernier=Max('downloaded_at'),
+        )
+    }
+    return par_matiere, attendues
+
+
+def reconstruire(user_ids=None):
+    """
+    Recalcule les statistiques depuis l'historique (Download), pour tous les
+    utilisateurs ou ceux de `user_ids`. Retourne le nombre de lignes UserStats
+    créées ou corrigées.
+    """
+    mois = mois_courant()
+    debut_mois = timezone.make_aware(datetime.datetime.combine(mois, datetime.time.min))
+    historique = Download.objects.order_by()
+    stats = UserStats.objects.all()
+    compteurs = UserMatiereStats.objects.all()
+    if user_ids is not None:
+        historique = historique.filter(user_id__in=user_ids)
+        stats = stats.filter(user_id__in=user_ids)
+        compteurs = compteurs.filter(user_id__in=user_ids)
+    vide = (0, 0, None, None, '', 0)
+
+    maintenant = timezone.now()
+    with transaction.atomic():
+        # Écriture avant toute lecture : elle prend le verrou d'écriture de la
+        # base, un téléchargement enregistré entre-temps (enregistrer()) attend
+        # la fin de la reconstruction au lieu d'être lu trop tôt puis écrasé
+        compteurs.delete()
+        par_matiere, attendues = _agreger(historique, mois, debut_mois)
+
+        a_modifier = []
+        for stat in stats:
+            valeurs = attendues.pop(stat.user_id, vide)
+            if tuple(getattr(stat, champ) for champ in CHAMPS) != valeurs:
+                for champ, valeur in zip(CHAMPS, valeurs):
+                    setattr(stat, champ, valeur)
+                stat.updated_at = maintenant
+                a_modifier.append(stat)
+        a_creer = [
+            UserStats(user_id=user_id, **dict(zip(CHAMPS, valeurs)))
+            for user_id, valeurs in attendues.items()
+        ]
+        UserStats.objects.bulk_update(a_modifier, CHAMPS + ('updated_at',), batch_size=500)
+        UserStats.objects.bulk_create(a_creer, batch_size=500)
+        UserMatiereStats.objects.bulk_create(
+            [UserMatiereStats(user_id=user_id, matiere=matiere, downloads=nombre) for user_id, matiere, nombre in par_matiere],
+            batch_size=500,
+        )
+    return len(a_modifier) + len(a_creer)
@@ -0,0 +1,125 @@
+# apps/dashboard/subscription.py
+
+"""
+Abonnement de l'utilisateur courant, chargé une seule fois par requête
+
+SubscriptionMiddleware ajoute `request.subscription`, objet paresseux :
+l'Abonnement n'est lu qu'au premier accès, depuis le cache partagé si
+possible (clé par utilisateur, invalidée par les signaux de Abonnement).
+Aucune écriture en lecture : l'Abonnement est créé à l'inscription
+(signal post_save de User) ; pour un compte qui n'en aurait pas encore,
+un abonnement gratuit par défaut, non enregistré, est utilisé.
+
+    request.subscription.plan                 'gratuit', 'mensuel', 'annuel' (None si anonyme)
+    request.subscription.is_premium
+    request.subscription.downloads_remaining
+    request.subscription.can_download
+
+Les autres attributs (get_plan_display, date_fin, is_valid...) sont ceux
+de l'Abonnement : l'objet peut remplacer `abonnement` dans les gabarits.
+
+Vues asynchrones : `await subscription.acharger(user)` (cache et ORM
+asynchrones). Le middleware fonctionne sous WSGI comme sous ASGI.
+
+Configuration : settings.SUBSCRIPTION_CACHE_TIMEOUT (secondes, 300 par défaut).
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .models import Abonnement
+
+
+PLANS_PREMIUM = ('mensuel', 'annuel')
+
+# Valeurs de création, les mêmes partout
+DEFAUTS = {'plan': 'gratuit', 'telechargements_inclus': 3}
+
+
+def _cle(user_id):
+    return f'dashboard:abonnement:{user_id}'
+
+
+class Subscription:
+    """Vue en lecture seule de l'abonnement d'un utilisateur"""
+
+    def __init__(self, abonnement=None):
+        self.abonnement = abonnement
+        if abonnement is None:
+            # Visiteur anonyme
+            self.plan = None
+            self.is_premium = False
+            self.downloads_remaining = 0
+            self.can_download = False
+            return
+        self.plan = abonnement.plan
+        self.is_premium = abonnement.plan in PLANS_PREMIUM
+        self.downloads_remaining = abonnement.telechargements_restant()
+        self.can_download = self.is_premium or self.downloads_remaining > 0
+
+    def __getattr__(self, nom):
+        # Appelé seulement pour les attributs absents : délégués à l'Abonnement
+        abonnement = self.__dict__.get('abonnement')
+        if abonnement is None:
+            raise AttributeError(nom)
+        return getattr(abonnement, nom)
+
+    def __bool__(self):
+        return self.abonnement is not None
+
+
+def charger(user):
+    """Abonnement de `user` (cache partagé, puis base), sans jamais l'écrire"""
+    if not user.is_authenticated:
+        return Subscription()
+    cle = _cle(user.pk)
+    abonnement = cache.get(cle)
+    if abonnement is None:
+        abonnement = Abonnement.objects.filter(user_id=user.pk).first()
+        if abonnement is None:
+            abonnement = Abonnement(user_id=user.pk, **DEFAUTS)
+        cache.set(cle, abonnement, getattr(settings, 'SUBSCRIPTION_CACHE_TIMEOUT', 300))
+    return Subscription(abonnement)
+
+
+async def acharger(user):
+    """charger() pour les vues asynchrones"""
+    if not user.is_authenticated:
+        return Subscription()
+    cle = _cle(user.pk)
+    abonnement = await cache.aget(cle)
+    if abonnement is None:
+        abonnement = await Abonnement.objects.filter(user_id=user.pk).afirst()
+        if abonnement is None:
+            abonnement = Abonnement(user_id=user.pk, **DEFAUTS)
+        await cache.aset(cle, abonnement, getattr(settings, 'SUBSCRIPTION_CACHE_TIMEOUT', 300))
+    return Subscription(abonnement)
+
+
+def provisionner(user):
+    """Crée l'Abonnement gratuit s'il n'existe pas (inscription, première écriture)"""
+    abonnement, _ = Abonnement.objects.get_or_create(user=user, defaults=DEFAUTS)
+    return abonnement
+
+
+def invalider(user_id):
+    cache.delete(_cle(user_id))
+
+
+class SubscriptionMiddleware:
+    """Ajoute request.subscription (chargé au premier accès)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.subscription = SimpleLazyObject(lambda: charger(request.user))
+        # Sous ASGI, get_response renvoie une coroutine, attendue par l'appelant
+        return self.get_response(request)
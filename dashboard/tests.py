@@ -1,3 +1,238 @@
-from django.test import TestCase
+# apps/dashboard/tests.py
 
-# Create your tests here.
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import singleflight
+from core.outils_tests import CACHES_TESTS, DonneesScolaires, creer_utilisateur, vider_caches
+
+from . import sitestats, stats
+from .models import Download, UserMatiereStats, UserStats
+
+
+# ==================== LISTE DES ÉPREUVES ====================
+
+@override_settings(CACHES=CACHES_TESTS)
+class EpreuvesListTests(DonneesScolaires, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creer_referentiel()
+        cls.creer_epreuve('Devoir de maths', cls.classes[0], cls.matieres[0])
+        cls.creer_epreuve('Devoir de français', cls.classes[1], cls.matieres[1])
+        cls.user = creer_utilisateur('eleve@example.com')
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def lister(self, **params):
+        response = self.client.get(reverse('dashboard:epreuves'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def titres(self, context):
+        return sorted(epreuve.titre for epreuve in context['epreuves'])
+
+    def test_filtres(self):
+        context = self.lister(classe=self.classes[0].nom)
+        self.assertEqual(self.titres(context), ['Devoir de maths'])
+        self.assertEqual(context['selected_classe'], self.classes[0].nom)
+
+        context = self.lister(matiere=self.matieres[1].nom)
+        self.assertEqual(self.titres(context), ['Devoir de français'])
+        self.assertEqual(context['selected_matiere'], self.matieres[1].nom)
+
+    def test_selection_inconnue_ignoree(self):
+        context = self.lister(classe='Licence 3', matiere='Latin')
+        self.assertEqual(self.titres(context), ['Devoir de français', 'Devoir de maths'])
+        self.assertEqual((context['selected_classe'], context['selected_matiere']), ('', ''))
+
+    def test_classe_du_profil(self):
+        self.user.class_level = self.classes[1].nom
+        self.user.save(update_fields=['class_level'])
+        self.assertEqual(self.titres(self.lister()), ['Devoir de français'])
+
+        # Saisie libre, sans classe correspondante : liste complète
+        self.user.class_level = 'Terminale D'
+        self.user.save(update_fields=['class_level'])
+        context = self.lister()
+        self.assertEqual(self.titres(context), ['Devoir de français', 'Devoir de maths'])
+        self.assertEqual(context['selected_classe'], '')
+
+
+# ==================== STATISTIQUES DE TÉLÉCHARGEMENT ====================
+
+def historique(matiere, epreuve_id=1):
+    """Ligne d'historique non enregistrée, comme epreuves.quota la prépare"""
+    return Download(epreuve_id=epreuve_id, epreuve_title='Devoir', matiere=matiere, classe='6ème', annee=2024)
+
+
+class StatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = creer_utilisateur('eleve@example.com')
+
+    def telecharger(self, *matieres):
+        stats.enregistrer(self.user.pk, [historique(matiere) for matiere in matieres])
+
+    def compteurs(self):
+        return dict(UserMatiereStats.objects.filter(user=self.user).values_list('matiere', 'downloads'))
+
+    def test_enregistrement(self):
+        self.telecharger('Maths', 'Maths', 'SVT')
+        self.telecharger('SVT')
+        stat = stats.charger(self.user)
+        self.assertEqual((stat.total_downloads, stat.downloads_this_month), (4, 4))
+        self.assertEqual(stat.current_month, stats.mois_courant())
+        self.assertEqual((stat.favorite_matiere, stat.favorite_matiere_downloads), ('Maths', 2))
+        self.assertEqual(self.compteurs(), {'Maths': 2, 'SVT': 2})
+        self.assertEqual(Download.objects.filter(user=self.user).count(), 4)
+
+    def test_changement_de_mois(self):
+        self.telecharger('Maths', 'Maths')
+        mois_precedent = (stats.mois_courant() - timedelta(days=1)).replace(day=1)
+        UserStats.objects.filter(user=self.user).update(current_month=mois_precedent)
+        self.telecharger('Maths')
+        stat = stats.charger(self.user)
+        self.assertEqual((stat.total_downloads, stat.downloads_this_month), (3, 1))
+        self.assertEqual(stat.current_month, stats.mois_courant())
+
+    def test_egalite_de_la_matiere_favorite(self):
+        """À égalité, la matière favorite ne change pas ; elle change dès qu'une autre la dépasse"""
+        self.telecharger('Maths', 'Maths')
+        self.telecharger('SVT', 'SVT')
+        stat = stats.charger(self.user)
+        self.assertEqual((stat.favorite_matiere, stat.favorite_matiere_downloads), ('Maths', 2))
+        self.telecharger('SVT')
+        stat = stats.charger(self.user)
+        self.assertEqual((stat.favorite_matiere, stat.favorite_matiere_downloads), ('SVT', 3))
+
+    def test_premier_telechargement_concurrent(self):
+        """Ligne UserStats créée par une autre requête entre l'UPDATE et l'INSERT"""
+        self.telecharger('Maths')
+        update = QuerySet.update
+        appels = []
+
+        def update_avant_creation(queryset, **valeurs):
+            appels.append(queryset.model)
+            if queryset.model is UserStats and appels.count(UserStats) == 1:
+                return 0  # Ligne pas encore visible
+            return update(queryset, **valeurs)
+
+        with mock.patch.object(QuerySet, 'update', update_avant_creation):
+            self.telecharger('SVT')
+        stat = stats.charger(self.user)
+        self.assertEqual((stat.total_downloads, stat.downloads_this_month), (2, 2))
+        self.assertEqual(self.compteurs(), {'Maths': 1, 'SVT': 1})
+
+    def test_reconstruire(self):
+        self.telecharger('Maths', 'Maths', 'SVT')
+        # Un téléchargement du mois précédent
+        Download.objects.filter(user=self.user, matiere='SVT').update(downloaded_at=timezone.now() - timedelta(days=40))
+        # Statistiques faussées, et celles d'un utilisateur sans historique
+        UserStats.objects.filter(user=self.user).update(total_downloads=10, favorite_matiere='SVT')
+        UserMatiereStats.objects.filter(user=self.user, matiere='Maths').delete()
+        autre = creer_utilisateur('autre@example.com')
+        UserStats.objects.create(user=autre, total_downloads=5)
+
+        self.assertEqual(stats.reconstruire(), 2)
+        stat = stats.charger(self.user)
+        self.assertEqual((stat.total_downloads, stat.downloads_this_month), (3, 2))
+        self.assertEqual((stat.favorite_matiere, stat.favorite_matiere_downloads), ('Maths', 2))
+        self.assertEqual(self.compteurs(), {'Maths': 2, 'SVT': 1})
+        self.assertEqual(stats.charger(autre).total_downloads, 0)
+        # Déjà à jour : rien à corriger
+        self.assertEqual(stats.reconstruire([self.user.pk]), 0)
+
+
+class ReconstructionConcurrenteTests(TransactionTestCase):
+    """Téléchargement enregistré, sur une autre connexion, pendant la reconstruction"""
+
+    def test_telechargement_pendant_la_reconstruction(self):
+        user = creer_utilisateur('eleve@example.com')
+        stats.enregistrer(user.pk, [historique('Maths')])
+
+        def telecharger():
+            try:
+                stats.enregistrer(user.pk, [historique('Maths', 2)])
+            finally:
+                connections.close_all()
+
+        agreger = stats._agreger
+        concurrent = threading.Thread(target=telecharger)
+
+        def agreger_puis_telecharger(*args):
+            resultat = agreger(*args)
+            concurrent.start()
+            concurrent.join(0.5)
+            return resultat
+
+        with mock.patch.object(stats, '_agreger', agreger_puis_telecharger):
+            stats.reconstruire()
+        concurrent.join()
+
+        stat = stats.charger(user)
+        self.assertEqual(stat.total_downloads, 2)
+        self.assertEqual(
+            dict(UserMatiereStats.objects.filter(user=user).values_list('matiere', 'downloads')), {'Maths': 2},
+        )
+
+
+# ==================== STATISTIQUES DU SITE ====================
+
+@override_settings(CACHES=CACHES_TESTS)
+class SiteStatsTests(TransactionTestCase):
+    """Le recalcul en arrière-plan lit la base sur sa propre connexion"""
+
+    def setUp(self):
+        vider_caches()
+
+    def test_totaux_perimes_servis_pendant_le_recalcul(self):
+        creer_utilisateur('premier@example.com')
+        premiers = sitestats.totaux()
+        self.assertEqual(premiers['utilisateurs'], 1)
+        creer_utilisateur('second@example.com')
+        self.assertEqual(sitestats.totaux(), premiers)
+
+        # Totaux expirés
+        cache = caches['default']
+        valeur, _, duree = cache.get(sitestats.CLE)
+        cache.set(sitestats.CLE, (valeur, time.time() - 1, duree), None)
+
+        Thread = threading.Thread
+        recalculs = []
+
+        def thread(*args, **kwargs):
+            recalculs.append(Thread(*args, **kwargs))
+            return recalculs[-1]
+
+        autorise = threading.Event()
+        calculer = sitestats.calculer
+
+        def calculer_quand_autorise():
+            autorise.wait(5)
+            return calculer()
+
+        with mock.patch.object(singleflight.threading, 'Thread', thread), \
+                mock.patch.object(sitestats, 'calculer', calculer_quand_autorise):
+            # Servis sans attendre ; un seul recalcul, lancé par le premier appel
+            self.assertEqual(sitestats.totaux(), premiers)
+            self.assertEqual(sitestats.totaux(), premiers)
+            autorise.set()
+            self.assertEqual(len(recalculs), 1)
+            recalculs[0].join()
+
+        nouveaux = sitestats.totaux()
+        self.assertEqual(nouveaux['utilisateurs'], 2)
+        self.assertGreater(nouveaux['calcule_le'], premiers['calcule_le'])
@@ -6,123 +6,75 @@ from django.contrib import messages
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import Download, UserStats, Abonnement
+from . import sitestats, stats as statistiques
+from .models import Download
+from core.decorators import budget_requetes
+from core.pagination import CursorPaginator
+from epreuves import search as recherche, taxonomy
+from epreuves.models import EpreuveListing, Telechargement
 
 
-from django.core.paginator import Paginator
 from django.db.models import Q, Count
 
 
 
-def get_or_create_abonnement(user):
-    """Récupérer ou créer l'abonnement de l'utilisateur"""
-    abonnement, created = Abonnement.objects.get_or_create(
-        user=user,
-        defaults={
-            'plan': 'gratuit',
-            'telechargements_inclus': 3
-        }
-    )
-    return abonnement
-
-
-def get_or_create_stats(user):
-    """Récupérer ou créer les stats de l'utilisateur"""
-    stats, created = UserStats.objects.get_or_create(
-        user=user,
-        defaults={
-            'total_downloads': 0,
-            'downloads_this_month': 0
-        }
-    )
-    return stats
-
-
 @login_required
+@budget_requetes(10)
 def dashboard_home(request):
     """Page d'accueil du dashboard avec statistiques réelles"""
     user = request.user
     
-    # Récupérer ou créer l'abonnement
-    abonnement = get_or_create_abonnement(user)
-    
-    # Récupérer ou créer les stats
-    stats = get_or_create_stats(user)
+    # Abonnement (chargé une fois par requête, sans écriture)
+    abonnement = request.subscription
     
-    # Calculer les stats réelles
-    total_downloads = Download.objects.filter(user=user).count()
+    # Stats personnelles : une seule ligne, tenue à jour à chaque téléchargement
+    stats = statistiques.charger(user)
     
-    # Téléchargements ce mois
-    debut_mois = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    downloads_this_month = Download.objects.filter(
-        user=user,
-        downloaded_at__gte=debut_mois
-    ).count()
-    
-    # Téléchargements gratuits utilisés (tous les temps pour le plan gratuit)
-    free_downloads_used = Download.objects.filter(
-        user=user,
-        is_free=True
-    ).count()
-    
-    # Calculer les téléchargements restants
-    if abonnement.plan == 'gratuit':
-        downloads_remaining = max(0, 3 - free_downloads_used)
-    else:
-        downloads_remaining = abonnement.telechargements_restant()
+    # Téléchargements gratuits : compteur du quota de l'abonnement
+    free_downloads_used = abonnement.telechargements_utilises
+    free_downloads_total = abonnement.telechargements_inclus
+    downloads_remaining = abonnement.telechargements_restant()
     
     # Derniers téléchargements (5 derniers)
-    recent_downloads = Download.objects.filter(user=user)[:5]
-    
-    # Matière favorite (la plus téléchargée)
-    favorite_matiere = None
-    if total_downloads > 0:
-        matieres = Download.objects.filter(user=user).values('matiere').annotate(
-            count=models.Count('matiere')
-        ).order_by('-count').first()
-        if matieres:
-            favorite_matiere = matieres['matiere']
+    recent_downloads = Telechargement.objects.filter(user=user).select_related(
+        'epreuve__matiere', 'epreuve__classe'
+    ).order_by('-date_telechargement')[:5]
     
-    # Mettre à jour les stats
-    stats.total_downloads = total_downloads
-    stats.downloads_this_month = downloads_this_month
-    stats.favorite_matiere = favorite_matiere or ''
-    stats.save()
-    
-    # Stats globales du site (à mettre en cache plus tard)
-    from django.db.models import Count
-    from accounts.models import User  # ou get_user_model()
-    
-    total_epreuves = 2500  # À remplacer par le vrai compte quand l'app epreuves existe
-    total_corriges = 1800  # Idem
+    # Stats globales du site (cache partagé, recalculées en arrière-plan)
+    site = sitestats.totaux()
     
     context = {
         'user': user,
+        'stats': stats,
         
         # Stats personnelles (dynamiques)
-        'downloads_count': total_downloads,
-        'downloads_this_month': downloads_this_month,
+        'downloads_count': stats.total_downloads,
+        'downloads_this_month': stats.this_month,
         'downloads_remaining': downloads_remaining,
         'free_downloads_used': free_downloads_used,
-        'free_downloads_total': 3,
+        'free_downloads_total': free_downloads_total,
         
         # Abonnement
         'abonnement': abonnement,
         'plan_name': abonnement.get_plan_display(),
         'plan_code': abonnement.plan,
-        'is_premium': abonnement.plan in ['mensuel', 'annuel'],
+        'is_premium': abonnement.is_premium,
         
         # Stats globales
-        'epreuves_available': total_epreuves,
-        'corriges_available': total_corriges,
-        'total_users': User.objects.filter(is_active=True).count(),
+        'epreuves_available': site['epreuves'],
+        'corriges_available': site['corriges'],
+        'total_users': site['utilisateurs'],
+        'stats_site': site,
         
         # Activité récente
         'recent_downloads': recent_downloads,
-        'favorite_matiere': favorite_matiere,
+        'favorite_matiere': stats.favorite_matiere or None,
         
         # Progression
-        'usage_percentage': min(100, int((free_downloads_used / 3) * 100)) if abonnement.plan == 'gratuit' else 0,
+        'usage_percentage': (
+            min(100, int(free_downloads_used * 100 / free_downloads_total))
+            if abonnement.plan == 'gratuit' and free_downloads_total else 0
+        ),
     }
     
     return render(request, 'dashboard/home.html', context)
@@ -172,10 +124,11 @@ def dashboard_home(request):
 
 
 @login_required
+@budget_requetes(5)
 def abonnement_view(request):
     """Gestion de l'abonnement avec comparaison des plans"""
     user = request.user
-    abonnement = get_or_create_abonnement(user)
+    abonnement = request.subscription
     
     # Calculer l'économie annuelle
     plans_comparison = [
@@ -219,11 +172,12 @@ def abonnement_view(request):
 
 
 @login_required
+@budget_requetes(8)
 def profile_view(request):
     """Profil utilisateur avec stats personnelles"""
     user = request.user
-    stats = get_or_create_stats(user)
-    abonnement = get_or_create_abonnement(user)
+    stats = statistiques.charger(user)
+    abonnement = request.subscription
     
     # Calculer l'ancienneté
     member_since = user.date_joined
@@ -274,15 +228,29 @@ def calculate_profile_completion(user):
 # dashboard/views.py (ajouter ces imports et fonctions)
 
 
+# Filtre « Type » du dashboard -> types d'épreuve
+TYPES = {
+    'devoir': Q(is_examen=False),
+    'bepc': Q(type_epreuve='bepc'),
+    # bac_1, bac_2, bac_blanc : examens (index), puis préfixe vérifié en parcourant
+    # l'index. Pas de IN, qui ferait perdre l'ordre de l'index
+    'bac': Q(is_examen=True, type_epreuve__startswith='bac'),
+}
+
+
 @login_required
+@budget_requetes(15)
 def epreuves_list(request):
     """Liste des épreuves avec filtres et recherche"""
     user = request.user
-    abonnement = get_or_create_abonnement(user)
-    
-    # Listes pour les filtres (à remplacer par des requêtes réelles)
-    classes_list = ['6ème', '5ème', '4ème', '3ème', '2nde', '1ère', 'Terminale']
-    matieres_list = ['Mathématiques', 'Physique-Chimie', 'SVT', 'Français', 'Anglais', 'Histoire-Géographie', 'Philosophie']
+    abonnement = request.subscription
+    
+    # Listes pour les filtres (registre du système scolaire, sans requête)
+    taxonomie = taxonomy.registre()
+    classes_ids = {classe.nom: classe.pk for classe in taxonomie.liste('classe')}
+    matieres_ids = {matiere.nom: matiere.pk for matiere in taxonomie.liste('matiere') if matiere.is_active}
+    classes_list = list(classes_ids)
+    matieres_list = list(matieres_ids)
     annees_list = list(range(2024, 2014, -1))
     
     # Filtres depuis l'URL
@@ -292,21 +260,38 @@ def epreuves_list(request):
     selected_type = request.GET.get('type', '')
     search_query = request.GET.get('q', '')
     
-    # Simulation d'épreuves (à remplacer par requête réelle)
-    # Epreuve.objects.filter(...)
-    epreuves = []  # Remplacer par tes vraies épreuves
-    
-    # Pagination
-    paginator = Paginator(epreuves, 12)
-    page = request.GET.get('page')
-    epreuves = paginator.get_page(page)
+    # Projection EpreuveListing : filtres et tri sur une seule table.
+    # Classe et matière filtrées par id, comme la liste publique (mêmes index) ;
+    # un nom inconnu (paramètre forgé, class_level saisi librement) est ignoré
+    epreuves = EpreuveListing.objects.filter(is_active=True)
+    classe_id = classes_ids.get(selected_classe)
+    if classe_id:
+        epreuves = epreuves.filter(classe_id=classe_id)
+    else:
+        selected_classe = ''
+    matiere_id = matieres_ids.get(selected_matiere)
+    if matiere_id:
+        epreuves = epreuves.filter(matiere_id=matiere_id)
+    else:
+        selected_matiere = ''
+    if selected_annee.isdigit():
+        # Égalité (et non LIKE 'AAAA-%') : servie par les index de la liste
+        epreuves = epreuves.filter(annee_scolaire=f"{selected_annee}-{int(selected_annee) + 1}")
+    if selected_type in TYPES:
+        epreuves = epreuves.filter(TYPES[selected_type])
+    if search_query:
+        epreuves = recherche.filtrer(epreuves, search_query)
+    
+    # Pagination par curseur (pas d'OFFSET, total mis en cache)
+    paginator = CursorPaginator(epreuves, 12)
+    epreuves = paginator.get_page(request.GET.get('curseur'))
     
     context = {
         'user': user,
         'abonnement': abonnement,
-        'is_premium': abonnement.plan in ['mensuel', 'annuel'],
-        'can_download': abonnement.telechargements_restant() > 0 or abonnement.plan != 'gratuit',
-        'downloads_remaining': abonnement.telechargements_restant(),
+        'is_premium': abonnement.is_premium,
+        'can_download': abonnement.can_download,
+        'downloads_remaining': abonnement.downloads_remaining,
         
         # Filtres
         'classes_list': classes_list,
@@ -320,13 +305,14 @@ def epreuves_list(request):
         
         # Résultats
         'epreuves': epreuves,
-        'epreuves_count': len(epreuves),
+        'epreuves_count': paginator.count,
     }
     
     return render(request, 'dashboard/epreuves.html', context)
 
 
 @login_required
+@budget_requetes(10)
 def downloads_history(request):
     """Historique des téléchargements"""
     user = request.user
@@ -344,7 +330,7 @@ def downloads_history(request):
     downloads_this_month = downloads_list.filter(downloaded_at__gte=debut_mois).count()
     
     # Listes pour filtres
-    matieres_list = downloads_list.values_list('matiere', flat=True).distinct()
+    matieres_list = downloads_list.values_list('matiere', flat=True).order_by('matiere').distinct()
     annees_list = downloads_list.values_list('annee', flat=True).distinct().order_by('-annee')
     
     # Grouper par mois pour l'affichage
@@ -356,9 +342,9 @@ def downloads_history(request):
         downloads_by_month[month_key].append(download)
     
     # Abonnement
-    abonnement = get_or_create_abonnement(user)
-    is_premium = abonnement.plan in ['mensuel', 'annuel']
-    downloads_remaining = abonnement.telechargements_restant() if not is_premium else float('inf')
+    abonnement = request.subscription
+    is_premium = abonnement.is_premium
+    downloads_remaining = abonnement.downloads_remaining if not is_premium else float('inf')
     
     context = {
         'user': user,
@@ -0,0 +1,191 @@
+# apps/epreuves/bundles.py
+
+"""
+Lots d'épreuves téléchargeables en une archive ZIP
+
+Un lot regroupe les épreuves actives d'une classe et/ou d'une matière pour
+une année scolaire (éventuellement une série), avec leurs corrigés.
+L'archive est produite en flux par core.zipstream (membres stockés : les
+PDF sont déjà compressés, la taille est annoncée d'avance).
+
+Comptabilité : les épreuves du lot que l'utilisateur n'a pas encore
+téléchargées sont décomptées de son quota par epreuves.quota, en une
+seule transaction ; si le quota ne suffit pas pour tout le lot, rien
+n'est enregistré.
+
+Cache disque (settings.BUNDLE_CACHE, désactivé par défaut) : un lot demandé
+au moins MIN_REQUESTS fois est écrit sous MEDIA_ROOT/<LOCATION>/ pendant
+son premier envoi, puis servi par le backend de livraison (Range, ETag).
+Le nom du fichier contient l'empreinte du contenu (noms des membres, blobs,
+dates de modification) : modifier, ajouter ou retirer une épreuve change
+l'empreinte, et l'ancienne archive du même lot est supprimée à la
+prochaine écriture.
+"""
+
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.text import get_valid_filename
+
+from core.files import FichierStocke
+from core.zipstream import ZipStream
+
+from . import taxonomy
+from .models import Epreuve
+
+
+MAX_EPREUVES = 100
+
+CRITERES = ('classe', 'matiere', 'serie')
+
+DEFAUTS_CACHE = {'ENABLED': False, 'LOCATION': 'lots', 'MIN_REQUESTS': 3}
+
+
+def _config():
+    return {**DEFAUTS_CACHE, **getattr(settings, 'BUNDLE_CACHE', {})}
+
+
+# ==================== COMPOSITION ====================
+
+class Lot:
+    """Épreuves d'un lot et leurs fichiers, prêts à être archivés"""
+
+    def __init__(self, annee_scolaire, classe=None, matiere=None, serie=None,
+                 corriges=True, premium=False):
+        self.criteres = {'classe': classe, 'matiere': matiere, 'serie': serie}
+        self.annee_scolaire = annee_scolaire
+        self.corriges = corriges
+        self.premium = premium
+
+        epreuves = Epreuve.objects.filter(is_active=True, annee_scolaire=annee_scolaire)
+        for critere, pk in self.criteres.items():
+            if pk:
+                epreuves = epreuves.filter(**{f'{critere}_id': pk})
+        if not premium:
+            epreuves = epreuves.filter(is_premium=False)
+        self.epreuves = list(
+            epreuves.only(
+                'pk', 'slug', 'titre', 'annee_scolaire', 'classe_id', 'matiere_id', 'serie_id', 'periode_id',
+                'niveau_id', 'fichier_sujet', 'fichier_corrige', 'updated_at',
+            ).order_by('matiere_id', 'type_epreuve', 'pk')[:MAX_EPREUVES]
+        )
+        taxonomy.attacher(self.epreuves)
+        self.membres = self._membres()
+
+    def _membres(self):
+        """[(nom dans l'archive, fichier, taille, date de modification)], fichiers absents exclus"""
+        membres = []
+        for epreuve in self.epreuves:
+            dossier = get_valid_filename(epreuve.matiere.nom)
+            fichiers = [(f'{dossier}/{epreuve.slug}.pdf', epreuve.fichier_sujet)]
+            if self.corriges and epreuve.fichier_corrige:
+                fichiers.append((f'{dossier}/{epreuve.slug}_corrige.pdf', epreuve.fichier_corrige))
+            for nom, fichier in fichiers:
+                try:
+                    taille = fichier.size
+                except (OSError, ValueError):
+                    continue
+                membres.append((nom, fichier, taille, epreuve.updated_at.timestamp()))
+        return membres
+
+    def __bool__(self):
+        return bool(self.membres)
+
+    def ids_corriges(self):
+        """Épreuves dont le corrigé fait partie de l'archive"""
+        if not self.corriges:
+            return set()
+        return {epreuve.pk for epreuve in self.epreuves if epreuve.fichier_corrige}
+
+    def nom_archive(self):
+        registre = taxonomy.registre()
+        parties = ['epreuves']
+        for critere in CRITERES:
+            objet = registre.par_id(critere, self.criteres[critere])
+            if objet is not None:
+                parties.append(objet.nom)
+        parties.append(self.annee_scolaire)
+        return get_valid_filename('_'.join(parties)) + '.zip'
+
+    def archive(self):
+        archive = ZipStream()
+        for nom, fichier, taille, modifie in self.membres:
+            archive.ajouter(nom, fichier, taille=taille, modifie=modifie)
+        return archive
+
+    # -------------------- Empreintes --------------------
+
+    def cle(self):
+        """Identifie le lot demandé (critères), indépendamment de son contenu"""
+        brut = repr((sorted(self.criteres.items()), self.annee_scolaire, self.corriges, self.premium))
+        return hashlib.sha256(brut.encode()).hexdigest()[:16]
+
+    def empreinte(self):
+        """Empreinte du contenu de l'archive : change avec n'importe quel membre"""
+        sha = hashlib.sha256()
+        for nom, fichier, taille, modifie in self.membres:
+            sha.update(f'{nom}\0{fichier.name}\0{taille}\0{modifie}\n'.encode())
+        return sha.hexdigest()
+
+
+# ==================== CACHE DISQUE ====================
+
+def _populaire(lot):
+    """Compte une demande du lot ; vrai à partir de MIN_REQUESTS demandes"""
+    cle = f'epreuves:lot:demandes:{lot.cle()}'
+    cache.add(cle, 0, 24 * 3600)
+    try:
+        demandes = cache.incr(cle)
+    except ValueError:
+        return False
+    return demandes >= _config()['MIN_REQUESTS']
+
+
+def _nom_cache(lot):
+    return f"{_config()['LOCATION']}/{lot.cle()}-{lot.empreinte()}.zip"
+
+
+def en_cache(lot):
+    """Archive du lot déjà écrite sur disque (FichierStocke), ou None"""
+    if not _config()['ENABLED']:
+        return None
+    nom = _nom_cache(lot)
+    if not (Path(settings.MEDIA_ROOT) / nom).is_file():
+        return None
+    return FichierStocke(nom)
+
+
+def _enregistrer(morceaux, lot):
+    """Transmet les morceaux de l'archive en les écrivant dans le cache disque"""
+    final = Path(settings.MEDIA_ROOT) / _nom_cache(lot)
+    final.parent.mkdir(parents=True, exist_ok=True)
+    temporaire = final.with_name(f'.{final.name}.{uuid.uuid4().hex}')
+    try:
+        with open(temporaire, 'wb') as sortie:
+            for morceau in morceaux:
+                sortie.write(morceau)
+                yield morceau
+        os.replace(temporaire, final)
+        # Versions précédentes du même lot
+        for ancien in final.parent.glob(f'{lot.cle()}-*.zip'):
+            if ancien != final:
+                ancien.unlink(missing_ok=True)
+    finally:
+        # Envoi interrompu : l'archive incomplète n'est pas gardée
+        temporaire.unlink(missing_ok=True)
+
+
+def flux(lot):
+    """
+    Morceaux de l'archive du lot, écrits au passage dans le cache disque
+    si celui-ci est activé et le lot assez demandé
+    """
+    morceaux = iter(lot.archive())
+    if _config()['ENABLED'] and _populaire(lot):
+        return _enregistrer(morceaux, lot)
+    return morceaux
+
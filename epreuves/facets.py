@@ -0,0 +1,145 @@
+# apps/epreuves/facets.py
+
+"""
+Compteurs de facettes pour la barre de filtres de la liste des épreuves
+
+La table CompteurFacette contient le nombre d'épreuves actives par
+(annee_scolaire, classe, matiere, periode, serie, type_epreuve).
+Elle est mise à jour de façon incrémentale par les signaux de Epreuve ;
+l'affichage de "Mathématiques (42)" ne lit donc jamais la table des épreuves :
+une seule requête indexée sur les compteurs de l'année suffit pour
+calculer toutes les facettes. Le résultat est mis en cache par filtres
+jusqu'à la prochaine modification d'une épreuve (version 'epreuves' de
+core/pagecache.py), recalculé par un seul worker à la fois.
+"""
+
+import hashlib
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, F
+
+from core import pagecache, singleflight
+
+from .models import CompteurFacette, Epreuve
+
+
+CHAMPS_CLE = ('annee_scolaire', 'classe_id', 'matiere_id', 'periode_id', 'serie_id', 'type_epreuve')
+
+# Facettes affichées, dans l'ordre de la clé
+FACETTES = ('classe', 'matiere', 'periode', 'serie', 'type_epreuve')
+
+
+def cle(epreuve):
+    """Clé de facette d'une épreuve"""
+    return tuple(getattr(epreuve, champ) for champ in CHAMPS_CLE)
+
+
+def _incrementer(filtres, delta):
+    """
+    INSERT ... ON CONFLICT DO UPDATE : crée le compteur ou l'augmente en une
+    seule instruction. Deux premières épreuves concurrentes d'une même clé
+    ne créent pas deux lignes (contraintes uniques de CompteurFacette).
+    """
+    meta = CompteurFacette._meta
+    qn = connection.ops.quote_name
+    table = qn(meta.db_table)
+    colonnes = {champ: qn(meta.get_field(champ).column) for champ in CHAMPS_CLE}
+    nombre = qn(meta.get_field('nombre').column)
+    # Cible du conflit : la contrainte partielle (avec ou sans série) de la clé
+    if filtres['serie_id'] is None:
+        cible = [colonne for champ, colonne in colonnes.items() if champ != 'serie_id']
+        condition = f"{colonnes['serie_id']} IS NULL"
+    else:
+        cible = list(colonnes.values())
+        condition = f"{colonnes['serie_id']} IS NOT NULL"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(colonnes.values())}, {nombre}) "
+            f"VALUES ({', '.join(['%s'] * (len(colonnes) + 1))}) "
+            f"ON CONFLICT ({', '.join(cible)}) WHERE {condition} "
+            f"DO UPDATE SET {nombre} = {table}.{nombre} + excluded.{nombre}",
+            [*(filtres[champ] for champ in CHAMPS_CLE), delta],
+        )
+
+
+def ajuster(cle_facette, delta):
+    """Ajoute `delta` au compteur de la combinaison donnée"""
+    filtres = dict(zip(CHAMPS_CLE, cle_facette))
+    if delta > 0:
+        _incrementer(filtres, delta)
+    elif delta < 0:
+        # Ne jamais passer sous zéro si la table est désynchronisée
+        CompteurFacette.objects.filter(**filtres, nombre__gte=-delta).update(nombre=F('nombre') + delta)
+
+
+def reconstruire():
+    """Recalcule toute la table depuis les épreuves actives"""
+    groupes = list(
+        Epreuve.objects.filter(is_active=True)
+        .order_by()
+        .values(*CHAMPS_CLE)
+        .annotate(nombre=Count('id'))
+    )
+    with transaction.atomic():
+        CompteurFacette.objects.all().delete()
+        CompteurFacette.objects.bulk_create(
+            [CompteurFacette(**groupe) for groupe in groupes], batch_size=1000
+        )
+    return len(groupes)
+
+
+def _correspond(ligne, filtres, sauf):
+    """La ligne de compteur respecte-t-elle les filtres (hors facette `sauf`) ?"""
+    for facette in FACETTES:
+        valeur = filtres.get(facette)
+        if facette == sauf or not valeur:
+            continue
+        if facette == 'periode' and valeur == 'exam':
+            if ligne['type_epreuve'] not in Epreuve.TYPES_EXAMEN_FINAL:
+                return False
+        elif str(ligne[facette]) != str(valeur):
+            return False
+    return True
+
+
+# Secondes ; les modifications des épreuves changent la clé avant
+DUREE_CACHE = 3600
+
+
+def _cle_compteurs(filtres):
+    valeurs = '|'.join(f"{facette}={filtres.get(facette) or ''}" for facette in ('annee_scolaire',) + FACETTES)
+    empreinte = hashlib.md5(valeurs.encode(), usedforsecurity=False).hexdigest()
+    return f"facettes:{pagecache.versions(['epreuves'])[0]}:{empreinte}"
+
+
+@singleflight.memoiser(_cle_compteurs, DUREE_CACHE)
+def compter(filtres):
+    """
+    Compte les épreuves par valeur de chaque facette sous les filtres courants.
+
+    `filtres` : dict avec annee_scolaire, classe, matiere, periode (id ou 'exam'),
+    serie et type_epreuve (valeurs GET, vides si non filtrées).
+    Chaque facette est comptée avec tous les filtres sauf le sien, pour que
+    les autres choix restent visibles. La recherche texte n'est pas prise en compte.
+
+    Retourne {facette: {valeur: nombre}} ; la facette 'periode' contient aussi 'exam'.
+    """
+    compteurs = CompteurFacette.objects.filter(nombre__gt=0)
+    if filtres.get('annee_scolaire'):
+        compteurs = compteurs.filter(annee_scolaire=filtres['annee_scolaire'])
+
+    lignes = [
+        dict(zip(FACETTES + ('nombre',), ligne))
+        for ligne in compteurs.values_list(*CHAMPS_CLE[1:], 'nombre')
+    ]
+
+    resultats = {facette: defaultdict(int) for facette in FACETTES}
+    for ligne in lignes:
+        for facette in FACETTES:
+            if _correspond(ligne, filtres, sauf=facette):
+                resultats[facette][ligne[facette]] += ligne['nombre']
+                if facette == 'periode' and ligne['type_epreuve'] in Epreuve.TYPES_EXAMEN_FINAL:
+                    resultats['periode']['exam'] += ligne['nombre']
+
+    return {facette: dict(valeurs) for facette, valeurs in resultats.items()}
@@ -0,0 +1,324 @@
+# apps/epreuves/importation.py
+
+"""
+Import en masse d'épreuves depuis un manifeste (CSV ou JSON) et un
+répertoire de fichiers (sujets, corrigés, rapports)
+
+Colonnes du manifeste (codes du système scolaire, pas des ids) :
+    classe, matiere, periode, annee_scolaire, type_epreuve, sujet   (obligatoires)
+    serie, niveau, titre, session, duree, coefficient, bareme, corrige,
+    rapport, description, instructions, nombre_pages, date_epreuve, is_premium
+
+`sujet`, `corrige` et `rapport` sont des chemins relatifs au répertoire.
+
+Déroulement, par lots de `taille_lot` lignes :
+1. validation et résolution des codes dans le registre (aucune requête) ;
+2. allocation des slugs contre l'ensemble des slugs existants, chargé
+   une seule fois ;
+3. taille des sujets et copie des fichiers dans le stockage, dans un pool
+   de threads ;
+4. bulk_create et indexation plein texte dans une transaction, puis
+   écriture du point de reprise (nombre de lignes traitées).
+
+Le point de reprise note aussi, avant la transaction, les slugs du lot en
+cours : après un arrêt entre la validation et l'écriture du point de
+reprise, ces slugs retrouvés en base montrent que le lot est déjà importé,
+il n'est pas créé une seconde fois.
+
+Les compteurs de facettes sont recalculés à la fin. bulk_create
+n'envoyant pas de signaux, c'est ici que l'index, la projection de la
+liste et les références des fichiers (core.storage) sont mis à jour.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+from django.core.files import File
+from django.db import transaction
+
+from core import pagecache
+from core.storage import empreinte_de, referencer
+
+from . import facets, listing, search, taxonomy
+from .models import Epreuve
+
+
+OBLIGATOIRES = ('classe', 'matiere', 'periode', 'annee_scolaire', 'type_epreuve', 'sujet')
+
+# Colonne du manifeste -> champ fichier de Epreuve, champ empreinte
+FICHIERS = (
+    ('sujet', 'fichier_sujet', 'empreinte_sujet'),
+    ('corrige', 'fichier_corrige', 'empreinte_corrige'),
+    ('rapport', 'fichier_rapport', 'empreinte_rapport'),
+)
+
+TEXTES = ('titre', 'duree', 'description', 'instructions')
+ENTIERS = ('coefficient', 'bareme', 'nombre_pages')
+
+ANNEE_RE = re.compile(r'^\d{4}-\d{4}$')
+VRAI = ('1', 'true', 'oui', 'vrai', 'yes', 'x')
+
+
+class LigneInvalide(ValueError):
+    pass
+
+
+def lire_manifeste(chemin):
+    """Lignes du manifeste (liste de dicts), selon l'extension .csv ou .json"""
+    chemin = Path(chemin)
+    if chemin.suffix.lower() == '.json':
+        with open(chemin, encoding='utf-8') as fichier:
+            donnees = json.load(fichier)
+        if isinstance(donnees, dict):
+            donnees = donnees.get('epreuves', [])
+        return [dict(ligne) for ligne in donnees]
+    with open(chemin, encoding='utf-8-sig', newline='') as fichier:
+        return list(csv.DictReader(fichier))
+
+
+def empreinte(chemin):
+    """SHA-256 du manifeste : un point de reprise ne vaut que pour ce fichier"""
+    sha = hashlib.sha256()
+    with open(chemin, 'rb') as fichier:
+        for bloc in iter(lambda: fichier.read(1024 * 1024), b''):
+            sha.update(bloc)
+    return sha.hexdigest()
+
+
+# ==================== VALIDATION ====================
+
+def _texte(ligne, cle):
+    valeur = ligne.get(cle)
+    return '' if valeur is None else str(valeur).strip()
+
+
+def _code(registre, nom, code, obligatoire=True):
+    if not code:
+        if obligatoire:
+            raise LigneInvalide(f"{nom} manquant(e)")
+        return None
+    objet = registre.par_code(nom, code)
+    if objet is None:
+        raise LigneInvalide(f"{nom} inconnu(e) : {code!r}")
+    return objet
+
+
+def preparer(ligne, registre):
+    """
+    Valeurs des champs de l'épreuve pour une ligne du manifeste, et chemins
+    source de ses fichiers. Lève LigneInvalide.
+    """
+    for cle in OBLIGATOIRES:
+        if not _texte(ligne, cle):
+            raise LigneInvalide(f"colonne {cle!r} vide")
+
+    classe = _code(registre, 'classe', _texte(ligne, 'classe'))
+    niveau = _code(registre, 'niveau', _texte(ligne, 'niveau'), obligatoire=False)
+    valeurs = {
+        'classe_id': classe.pk,
+        'niveau_id': niveau.pk if niveau else classe.niveau_id,
+        'matiere_id': _code(registre, 'matiere', _texte(ligne, 'matiere')).pk,
+        'periode_id': _code(registre, 'periode', _texte(ligne, 'periode')).pk,
+        'serie_id': None,
+    }
+    serie = _code(registre, 'serie', _texte(ligne, 'serie'), obligatoire=False)
+    if serie:
+        valeurs['serie_id'] = serie.pk
+
+    annee = _texte(ligne, 'annee_scolaire')
+    if not ANNEE_RE.match(annee):
+        raise LigneInvalide(f"annee_scolaire invalide : {annee!r} (format 2023-2024)")
+    valeurs['annee_scolaire'] = annee
+
+    type_epreuve = _texte(ligne, 'type_epreuve')
+    if type_epreuve not in dict(Epreuve.TYPE_EPREUVE_CHOICES):
+        raise LigneInvalide(f"type_epreuve inconnu : {type_epreuve!r}")
+    valeurs['type_epreuve'] = type_epreuve
+
+    session = _texte(ligne, 'session') or 'normale'
+    if session not in dict(Epreuve.SESSION_CHOICES):
+        raise LigneInvalide(f"session inconnue : {session!r}")
+    valeurs['session'] = session
+
+    for cle in TEXTES:
+        valeurs[cle] = _texte(ligne, cle)
+    for cle in ENTIERS:
+        texte = _texte(ligne, cle)
+        if texte:
+            try:
+                valeurs[cle] = int(texte)
+            except ValueError:
+                raise LigneInvalide(f"{cle} n'est pas un entier : {texte!r}")
+    date_epreuve = _texte(ligne, 'date_epreuve')
+    if date_epreuve:
+        try:
+            valeurs['date_epreuve'] = date.fromisoformat(date_epreuve)
+        except ValueError:
+            raise LigneInvalide(f"date_epreuve invalide : {date_epreuve!r}")
+    valeurs['is_premium'] = _texte(ligne, 'is_premium').lower() in VRAI
+
+    sources = {champ: _texte(ligne, cle) for cle, champ, _ in FICHIERS if _texte(ligne, cle)}
+    return valeurs, sources
+
+
+# ==================== FICHIERS (POOL DE THREADS) ====================
+
+def _transferer(sources, repertoire, dry_run):
+    """
+    Vérifie les fichiers source, calcule la taille du sujet (Ko) et, hors
+    simulation, les copie dans le stockage de leur champ.
+    Retourne ({champ: nom stocké}, taille_fichier). Lève LigneInvalide.
+    """
+    chemins = {}
+    for champ, relatif in sources.items():
+        chemin = Path(repertoire) / relatif
+        if not chemin.is_file():
+            raise LigneInvalide(f"fichier introuvable : {relatif}")
+        chemins[champ] = chemin
+
+    taille = os.stat(chemins['fichier_sujet']).st_size // 1024
+    if dry_run:
+        return {champ: str(chemin) for champ, chemin in chemins.items()}, taille
+
+    noms = {}
+    for champ, chemin in chemins.items():
+        field = Epreuve._meta.get_field(champ)
+        with open(chemin, 'rb') as fichier:
+            noms[champ] = field.storage.save(
+                field.generate_filename(None, chemin.name), File(fichier, name=chemin.name)
+            )
+    return noms, taille
+
+
+# ==================== IMPORT ====================
+
+class Importation:
+    """Import d'un manifeste, reprenable après interruption"""
+
+    def __init__(self, manifeste, repertoire=None, taille_lot=500, workers=8,
+                 point_reprise=None, dry_run=False, journal=None):
+        self.manifeste = Path(manifeste)
+        self.repertoire = Path(repertoire) if repertoire else self.manifeste.parent
+        self.taille_lot = taille_lot
+        self.workers = workers
+        self.point_reprise = Path(point_reprise) if point_reprise else self.manifeste.with_name(
+            self.manifeste.name + '.checkpoint'
+        )
+        self.dry_run = dry_run
+        self.journal = journal or (lambda message: None)
+
+        self.crees = 0
+        self.erreurs = []  # (numéro de ligne, message)
+
+    # -------------------- Point de reprise --------------------
+
+    def _lire_reprise(self, empreinte_manifeste):
+        """Nombre de lignes déjà traitées lors d'un précédent import"""
+        if self.dry_run or not self.point_reprise.exists():
+            return 0
+        with open(self.point_reprise, encoding='utf-8') as fichier:
+            etat = json.load(fichier)
+        if etat.get('empreinte') != empreinte_manifeste:
+            raise ValueError(
+                f"Le point de reprise {self.point_reprise} correspond à un autre manifeste."
+            )
+        en_cours = etat.get('en_cours')
+        if en_cours and Epreuve.objects.filter(slug__in=en_cours['slugs']).count() == len(en_cours['slugs']):
+            # Lot validé en base, arrêt avant son point de reprise
+            self.crees += len(en_cours['slugs'])
+            return en_cours['fin']
+        return etat['lignes']
+
+    def _ecrire_reprise(self, empreinte_manifeste, lignes, en_cours=None):
+        if self.dry_run:
+            return
+        etat = {'empreinte': empreinte_manifeste, 'lignes': lignes, 'crees': self.crees}
+        if en_cours:
+            etat['en_cours'] = en_cours
+        temporaire = self.point_reprise.with_name(self.point_reprise.name + '.tmp')
+        with open(temporaire, 'w', encoding='utf-8') as fichier:
+            json.dump(etat, fichier)
+        os.replace(temporaire, self.point_reprise)
+
+    # -------------------- Traitement --------------------
+
+    def executer(self):
+        """Importe le manifeste. Retourne le nombre d'épreuves créées."""
+        lignes = lire_manifeste(self.manifeste)
+        empreinte_manifeste = empreinte(self.manifeste)
+        debut = self._lire_reprise(empreinte_manifeste)
+        if debut:
+            self.journal(f"Reprise après la ligne {debut} sur {len(lignes)}.")
+
+        registre = taxonomy.registre()
+        slugs = set(Epreuve.objects.values_list('slug', flat=True))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for position in range(debut, len(lignes), self.taille_lot):
+                lot = lignes[position:position + self.taille_lot]
+                epreuves = self._preparer_lot(lot, position, registre, slugs, pool)
+                if epreuves and not self.dry_run:
+                    self._ecrire_reprise(empreinte_manifeste, position, en_cours={
+                        'fin': position + len(lot), 'slugs': [epreuve.slug for epreuve in epreuves],
+                    })
+                    self._enregistrer(epreuves)
+                self.crees += len(epreuves)
+                self._ecrire_reprise(empreinte_manifeste, position + len(lot))
+                self.journal(f"{position + len(lot)}/{len(lignes)} lignes traitées.")
+
+        if not self.dry_run and self.crees:
+            facets.reconstruire()
+            pagecache.invalider('epreuves')
+        return self.crees
+
+    def _preparer_lot(self, lot, position, registre, slugs, pool):
+        """Épreuves (non enregistrées) des lignes valides du lot, fichiers copiés"""
+        # Numéro de ligne affiché : en-tête CSV = ligne 1
+        decalage = 2 if self.manifeste.suffix.lower() != '.json' else 1
+
+        preparees = []
+        for index, ligne in enumerate(lot):
+            numero = position + index + decalage
+            try:
+                preparees.append((numero, *preparer(ligne, registre)))
+            except LigneInvalide as erreur:
+                self.erreurs.append((numero, str(erreur)))
+
+        transferts = pool.map(
+            lambda prepa: self._transferer(prepa[2]), preparees
+        )
+
+        epreuves = []
+        for (numero, valeurs, _), resultat in zip(preparees, transferts):
+            if isinstance(resultat, LigneInvalide):
+                self.erreurs.append((numero, str(resultat)))
+                continue
+            noms, taille = resultat
+            epreuve = Epreuve(taille_fichier=taille, **valeurs, **noms)
+            for _, champ, champ_empreinte in FICHIERS:
+                setattr(epreuve, champ_empreinte, empreinte_de(noms.get(champ)))
+            taxonomy.attacher([epreuve])
+            epreuve.slug = Epreuve.allouer_slug(epreuve.base_slug(), slugs)
+            epreuves.append(epreuve)
+        return epreuves
+
+    def _enregistrer(self, epreuves):
+        with transaction.atomic():
+            Epreuve.objects.bulk_create(epreuves, batch_size=self.taille_lot)
+            search.indexer([epreuve.pk for epreuve in epreuves])
+            listing.enregistrer(epreuves)
+            referencer(
+                [getattr(epreuve, champ).name for epreuve in epreuves for _, champ, _ in FICHIERS], 1
+            )
+
+    def _transferer(self, sources):
+        try:
+            return _transferer(sources, self.repertoire, self.dry_run)
+        except LigneInvalide as erreur:
+            return erreur
@@ -0,0 +1,125 @@
+# apps/epreuves/listing.py
+
+"""
+Projection EpreuveListing : la liste des épreuves sans jointure
+
+Chaque épreuve a une ligne (même id) portant ses noms affichés (matière,
+classe, période, série) et ses clés de tri. La liste filtre et trie sur
+une seule table, par des index qui couvrent filtre et tri.
+
+Mise à jour :
+- sauvegarde / suppression d'une épreuve : signaux (epreuves/signals.py) ;
+- renommage d'une matière, classe, période ou série : un UPDATE des lignes
+  concernées (renommer) ;
+- imports en masse (bulk_create) : enregistrer(epreuves) ;
+- compteur de téléchargements : reflété par core.counters à chaque vidage.
+updated_at change avec le contenu de la carte (sauf le compteur) : il sert
+de clé au fragment de la carte mis en cache par liste.html.
+`rebuild_listing` reconstruit toute la table.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from core import counters
+
+from . import taxonomy
+from .models import Epreuve, EpreuveListing
+
+
+TAILLE_LOT = 1000
+LONGUEUR_RESUME = EpreuveListing._meta.get_field('resume').max_length
+
+# Champs recopiés tels quels de Epreuve
+CHAMPS = (
+    'slug', 'titre', 'annee_scolaire', 'type_epreuve', 'is_premium', 'is_active',
+    'niveau_id', 'classe_id', 'serie_id', 'matiere_id', 'periode_id',
+    'duree', 'nombre_pages', 'taille_fichier', 'nombre_telechargements',
+)
+
+# Noms dénormalisés : relation -> {champ de la projection: attribut de l'objet lié}
+NOMS = {
+    'matiere': {'matiere_nom': 'nom', 'matiere_couleur': 'couleur', 'matiere_icon': 'icon'},
+    'classe': {'classe_nom': 'nom'},
+    'periode': {'periode_code': 'code', 'periode_nom': 'nom'},
+    'serie': {'serie_code': 'code'},
+}
+
+CHAMPS_MIS_A_JOUR = [
+    champ.name for champ in EpreuveListing._meta.concrete_fields if not champ.primary_key
+]
+
+counters.refleter('epreuves.epreuve', 'nombre_telechargements', 'epreuves.epreuvelisting')
+
+
+def ligne(epreuve, registre=None):
+    """Ligne de la projection pour `epreuve` (noms lus dans le registre, sans requête)"""
+    registre = registre or taxonomy.registre()
+    valeurs = {champ: getattr(epreuve, champ) for champ in CHAMPS}
+    valeurs['resume'] = (epreuve.description or '')[:LONGUEUR_RESUME]
+    valeurs['is_examen'] = epreuve.type_epreuve in Epreuve.TYPES_EXAMEN_FINAL
+    valeurs['has_corrige'] = bool(epreuve.fichier_corrige)
+    for lien, champs in NOMS.items():
+        pk = getattr(epreuve, f'{lien}_id')
+        # Objet créé dans la transaction en cours : pas encore dans le registre
+        objet = (registre.par_id(lien, pk) or getattr(epreuve, lien)) if pk else None
+        for champ, attribut in champs.items():
+            valeurs[champ] = getattr(objet, attribut) if objet else ''
+    return EpreuveListing(id=epreuve.pk, **valeurs)
+
+
+def enregistrer(epreuves):
+    """Crée ou met à jour les lignes des épreuves données (un INSERT ... ON CONFLICT)"""
+    registre = taxonomy.registre()
+    EpreuveListing.objects.bulk_create(
+        [ligne(epreuve, registre) for epreuve in epreuves],
+        batch_size=TAILLE_LOT,
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=CHAMPS_MIS_A_JOUR,
+    )
+
+
+def synchroniser(ids):
+    """Recalcule les lignes des épreuves `ids` (et retire celles qui n'existent plus)"""
+    ids = list(ids)
+    for debut in range(0, len(ids), TAILLE_LOT):
+        lot = ids[debut:debut + TAILLE_LOT]
+        epreuves = list(Epreuve.objects.filter(pk__in=lot).defer('enonce', 'instructions').order_by())
+        with transaction.atomic():
+            enregistrer(epreuves)
+            trouves = {epreuve.pk for epreuve in epreuves}
+            disparus = [pk for pk in lot if pk not in trouves]
+            if disparus:
+                EpreuveListing.objects.filter(pk__in=disparus).delete()
+
+
+def supprimer(ids):
+    EpreuveListing.objects.filter(pk__in=list(ids)).delete()
+
+
+def renommer(objet):
+    """Recopie les noms d'une matière, classe, période ou série dans ses lignes"""
+    lien = objet._meta.model_name
+    EpreuveListing.objects.filter(**{f'{lien}_id': objet.pk}).update(
+        updated_at=timezone.now(),
+        **{champ: getattr(objet, attribut) for champ, attribut in NOMS[lien].items()},
+    )
+
+
+def reconstruire():
+    """Vide et reconstruit toute la projection. Retourne le nombre de lignes."""
+    total = 0
+    with transaction.atomic():
+        EpreuveListing.objects.all().delete()
+        lot = []
+        for epreuve in Epreuve.objects.defer('enonce', 'instructions').order_by().iterator(chunk_size=TAILLE_LOT):
+            lot.append(epreuve)
+            if len(lot) >= TAILLE_LOT:
+                enregistrer(lot)
+                total += len(lot)
+                lot = []
+        if lot:
+            enregistrer(lot)
+            total += len(lot)
+    return total
@@ -0,0 +1,36 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from epreuves import recommendations
+
+
+class Command(BaseCommand):
+    help = "Calcule les épreuves similaires (co-téléchargements et favoris communs)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tranche', type=int, default=1000,
+            help="Nombre d'utilisateurs lus par tranche (défaut : 1000)",
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Processus de calcul (défaut : nombre de CPU, 1 = sans pool)",
+        )
+        parser.add_argument(
+            '--voisins', type=int, default=recommendations.NB_VOISINS,
+            help="Voisins conservés par épreuve",
+        )
+        parser.add_argument(
+            '--min-commun', type=float, default=1,
+            help="Co-occurrence pondérée minimale pour retenir une paire",
+        )
+
+    def handle(self, *args, **options):
+        total = recommendations.reconstruire(
+            taille_tranche=options['tranche'],
+            workers=options['workers'],
+            nb_voisins=options['voisins'],
+            min_commun=options['min_commun'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{total} voisin(s) enregistré(s)."))
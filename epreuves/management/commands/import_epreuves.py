@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from epreuves.importation import Importation
+
+
+class Command(BaseCommand):
+    help = "Importe des épreuves en masse depuis un manifeste CSV/JSON et un répertoire de PDF"
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifeste', help="Fichier .csv ou .json décrivant les épreuves")
+        parser.add_argument(
+            '--fichiers',
+            help="Répertoire des sujets, corrigés et rapports (défaut : celui du manifeste)",
+        )
+        parser.add_argument('--lot', type=int, default=500, help="Épreuves par lot (défaut : 500)")
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help="Threads pour la taille et la copie des fichiers (défaut : 8)",
+        )
+        parser.add_argument(
+            '--reprise',
+            help="Fichier de point de reprise (défaut : <manifeste>.checkpoint)",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Valide le manifeste et les fichiers sans rien écrire",
+        )
+
+    def handle(self, *args, **options):
+        importation = Importation(
+            options['manifeste'],
+            repertoire=options['fichiers'],
+            taille_lot=options['lot'],
+            workers=options['workers'],
+            point_reprise=options['reprise'],
+            dry_run=options['dry_run'],
+            journal=self.stdout.write,
+        )
+        try:
+            crees = importation.executer()
+        except (OSError, ValueError) as erreur:
+            raise CommandError(str(erreur))
+
+        for numero, message in importation.erreurs:
+            self.stderr.write(f"Ligne {numero} : {message}")
+
+        verbe = "à créer" if options['dry_run'] else "créée(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{crees} épreuve(s) {verbe}, {len(importation.erreurs)} ligne(s) rejetée(s)."
+        ))
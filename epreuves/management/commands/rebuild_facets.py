@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core import pagecache
+from epreuves import facets
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs de facettes de la liste des épreuves"
+
+    def handle(self, *args, **options):
+        total = facets.reconstruire()
+        # Compteurs et pages en cache : nouvelle version
+        pagecache.invalider('epreuves')
+        self.stdout.write(self.style.SUCCESS(f"{total} combinaison(s) de filtres comptée(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from epreuves import listing
+
+
+class Command(BaseCommand):
+    help = "Reconstruit la projection EpreuveListing (liste des épreuves sans jointure)"
+
+    def handle(self, *args, **options):
+        total = listing.reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"{total} épreuve(s) projetée(s)."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from epreuves import search
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte (FTS5) des épreuves"
+
+    def handle(self, *args, **options):
+        if not search.est_disponible():
+            raise CommandError("La recherche plein texte nécessite SQLite (FTS5).")
+
+        with transaction.atomic():
+            total = search.reconstruire()
+
+        self.stdout.write(self.style.SUCCESS(f"{total} épreuve(s) indexée(s)."))
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+def creer_table_recherche(apps, schema_editor):
+    """Crée et remplit la table FTS5 (SQLite uniquement)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from epreuves.search import TABLE_RECHERCHE, preparer_document
+
+    Epreuve = apps.get_model('epreuves', 'Epreuve')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE_RECHERCHE} "
+            "USING fts5(titre, description, matiere, classe, tokenize='unicode61', prefix='2 3')"
+        )
+        rows = Epreuve.objects.order_by().values_list(
+            'id', 'titre', 'description', 'matiere__nom', 'classe__nom'
+        )
+        cursor.executemany(
+            f"INSERT INTO {TABLE_RECHERCHE} (rowid, titre, description, matiere, classe) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [preparer_document(row) for row in rows]
+        )
+
+
+def supprimer_table_recherche(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from epreuves.search import TABLE_RECHERCHE
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE_RECHERCHE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epreuves', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_table_recherche, supprimer_table_recherche),
+    ]
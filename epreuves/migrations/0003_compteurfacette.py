@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remplir_compteurs(apps, schema_editor):
+    Epreuve = apps.get_model('epreuves', 'Epreuve')
+    CompteurFacette = apps.get_model('epreuves', 'CompteurFacette')
+    champs = ['annee_scolaire', 'classe_id', 'matiere_id', 'periode_id', 'serie_id', 'type_epreuve']
+    groupes = (
+        Epreuve.objects.filter(is_active=True)
+        .order_by()
+        .values(*champs)
+        .annotate(nombre=Count('id'))
+    )
+    CompteurFacette.objects.bulk_create(
+        [CompteurFacette(**groupe) for groupe in groupes], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epreuves', '0002_recherche_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurFacette',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee_scolaire', models.CharField(max_length=9)),
+                ('type_epreuve', models.CharField(max_length=20)),
+                ('nombre', models.PositiveIntegerField(default=0)),
+                ('classe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.classe')),
+                ('matiere', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.matiere')),
+                ('periode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.periode')),
+                ('serie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.serie')),
+            ],
+            options={
+                'verbose_name': 'Compteur de facette',
+                'indexes': [models.Index(fields=['annee_scolaire', 'classe', 'matiere', 'periode', 'serie', 'type_epreuve'], name='epreuves_facette_cle_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('serie__isnull', False)), fields=('annee_scolaire', 'classe', 'matiere', 'periode', 'serie', 'type_epreuve'), name='epreuves_facette_cle_uniq'), models.UniqueConstraint(condition=models.Q(('serie__isnull', True)), fields=('annee_scolaire', 'classe', 'matiere', 'periode', 'type_epreuve'), name='epreuves_facette_cle_sans_serie_uniq')],
+            },
+        ),
+        migrations.RunPython(remplir_compteurs, migrations.RunPython.noop),
+    ]
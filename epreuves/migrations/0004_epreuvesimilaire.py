@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epreuves', '0003_compteurfacette'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EpreuveSimilaire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rang', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('epreuve', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='voisines', to='epreuves.epreuve')),
+                ('voisine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similaire_de', to='epreuves.epreuve')),
+            ],
+            options={
+                'verbose_name': 'Épreuve similaire',
+                'verbose_name_plural': 'Épreuves similaires',
+                'ordering': ['epreuve', 'rang'],
+                'unique_together': {('epreuve', 'rang')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:43
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epreuves', '0004_epreuvesimilaire'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='epreuve',
+            name='empreinte_corrige',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='epreuve',
+            name='empreinte_rapport',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='epreuve',
+            name='empreinte_sujet',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='epreuve',
+            name='fichier_corrige',
+            field=models.FileField(blank=True, null=True, storage=core.storage.cas_storage, upload_to='epreuves/corriges/%Y/%m/', verbose_name='Corrigé type'),
+        ),
+        migrations.AlterField(
+            model_name='epreuve',
+            name='fichier_rapport',
+            field=models.FileField(blank=True, null=True, storage=core.storage.cas_storage, upload_to='epreuves/rapports/%Y/%m/', verbose_name="Rapport de l'épreuve (pour examens officiels)"),
+        ),
+        migrations.AlterField(
+            model_name='epreuve',
+            name='fichier_sujet',
+            field=models.FileField(storage=core.storage.cas_storage, upload_to='epreuves/sujets/%Y/%m/'),
+        ),
+    ]
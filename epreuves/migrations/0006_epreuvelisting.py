@@ -0,0 +1,51 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epreuves', '0005_empreintes_fichiers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EpreuveListing',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('slug', models.SlugField()),
+                ('titre', models.CharField(max_length=200)),
+                ('resume', models.CharField(blank=True, max_length=300)),
+                ('annee_scolaire', models.CharField(max_length=9)),
+                ('type_epreuve', models.CharField(choices=[('composition_1', '1ère Composition'), ('composition_2', '2ème Composition'), ('evaluation_1', '1ère Évaluation'), ('evaluation_2', '2ème Évaluation'), ('evaluation_3', '3ème Évaluation'), ('ceped', 'CEPED'), ('cepd', 'CEPD'), ('bepc', 'BEPC'), ('bac_1', 'Baccalauréat 1er Tour'), ('bac_2', 'Baccalauréat 2ème Tour'), ('bac_blanc', 'Bac Blanc'), ('concours', "Concours d'entrée"), ('examen_entree', "Examen d'entrée")], max_length=20)),
+                ('is_examen', models.BooleanField(default=False)),
+                ('is_premium', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=True)),
+                ('has_corrige', models.BooleanField(default=False)),
+                ('classe_nom', models.CharField(max_length=30)),
+                ('serie_code', models.CharField(blank=True, max_length=5)),
+                ('matiere_nom', models.CharField(max_length=100)),
+                ('matiere_couleur', models.CharField(max_length=7)),
+                ('matiere_icon', models.CharField(blank=True, max_length=10)),
+                ('periode_code', models.CharField(max_length=5)),
+                ('periode_nom', models.CharField(max_length=30)),
+                ('duree', models.CharField(blank=True, max_length=20)),
+                ('nombre_pages', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('taille_fichier', models.PositiveIntegerField(blank=True, null=True)),
+                ('nombre_telechargements', models.PositiveIntegerField(default=0)),
+                ('classe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.classe')),
+                ('matiere', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.matiere')),
+                ('niveau', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.niveau')),
+                ('periode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.periode')),
+                ('serie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='epreuves.serie')),
+            ],
+            options={
+                'verbose_name': 'Épreuve (liste)',
+                'verbose_name_plural': 'Épreuves (liste)',
+                'ordering': ['-annee_scolaire', 'periode_code', 'matiere_nom'],
+                'indexes': [models.Index(fields=['is_active', 'annee_scolaire', 'periode_code', 'matiere_nom', 'id'], name='epreuves_listing_annee_idx'), models.Index(fields=['is_active', 'annee_scolaire', 'classe', 'periode_code', 'matiere_nom', 'id'], name='epreuves_listing_classe_idx'), models.Index(fields=['is_active', 'annee_scolaire', 'matiere', 'periode_code', 'matiere_nom', 'id'], name='epreuves_listing_matiere_idx'), models.Index(fields=['is_active', 'annee_scolaire', 'classe', 'matiere', 'periode_code', 'matiere_nom', 'id'], name='epreuves_listing_cl_mat_idx'), models.Index(fields=['is_active', 'annee_scolaire', 'is_examen', 'periode_code', 'matiere_nom', 'id'], name='epreuves_listing_examen_idx')],
+            },
+        ),
+    ]
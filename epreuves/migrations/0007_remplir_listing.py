@@ -0,0 +1,55 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:02
+
+from django.db import migrations
+
+
+TYPES_EXAMEN_FINAL = ['ceped', 'bepc', 'bac_1', 'bac_2', 'bac_blanc']
+
+
+def remplir_listing(apps, schema_editor):
+    """Projection initiale des épreuves existantes (ensuite : signaux et `rebuild_listing`)"""
+    Epreuve = apps.get_model('epreuves', 'Epreuve')
+    EpreuveListing = apps.get_model('epreuves', 'EpreuveListing')
+    epreuves = Epreuve.objects.select_related('classe', 'serie', 'matiere', 'periode').order_by()
+    lignes = []
+    for epreuve in epreuves.iterator(chunk_size=1000):
+        lignes.append(EpreuveListing(
+            id=epreuve.pk,
+            slug=epreuve.slug,
+            titre=epreuve.titre,
+            resume=(epreuve.description or '')[:300],
+            annee_scolaire=epreuve.annee_scolaire,
+            type_epreuve=epreuve.type_epreuve,
+            is_examen=epreuve.type_epreuve in TYPES_EXAMEN_FINAL,
+            is_premium=epreuve.is_premium,
+            is_active=epreuve.is_active,
+            has_corrige=bool(epreuve.fichier_corrige),
+            niveau_id=epreuve.niveau_id,
+            classe_id=epreuve.classe_id,
+            serie_id=epreuve.serie_id,
+            matiere_id=epreuve.matiere_id,
+            periode_id=epreuve.periode_id,
+            classe_nom=epreuve.classe.nom,
+            serie_code=epreuve.serie.code if epreuve.serie_id else '',
+            matiere_nom=epreuve.matiere.nom,
+            matiere_couleur=epreuve.matiere.couleur,
+            matiere_icon=epreuve.matiere.icon,
+            periode_code=epreuve.periode.code,
+            periode_nom=epreuve.periode.nom,
+            duree=epreuve.duree,
+            nombre_pages=epreuve.nombre_pages,
+            taille_fichier=epreuve.taille_fichier,
+            nombre_telechargements=epreuve.nombre_telechargements,
+        ))
+    EpreuveListing.objects.bulk_create(lignes, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epreuves', '0006_epreuvelisting'),
+    ]
+
+    operations = [
+        migrations.RunPython(remplir_listing, migrations.RunPython.noop),
+    ]
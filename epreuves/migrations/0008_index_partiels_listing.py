@@ -0,0 +1,87 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epreuves', '0007_remplir_listing'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='epreuvelisting',
+            name='epreuves_listing_annee_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='epreuvelisting',
+            name='epreuves_listing_classe_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='epreuvelisting',
+            name='epreuves_listing_matiere_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='epreuvelisting',
+            name='epreuves_listing_cl_mat_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='epreuvelisting',
+            name='epreuves_listing_examen_idx',
+        ),
+        migrations.AlterField(
+            model_name='epreuvelisting',
+            name='classe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.classe'),
+        ),
+        migrations.AlterField(
+            model_name='epreuvelisting',
+            name='matiere',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.matiere'),
+        ),
+        migrations.AlterField(
+            model_name='epreuvelisting',
+            name='niveau',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.niveau'),
+        ),
+        migrations.AlterField(
+            model_name='epreuvelisting',
+            name='periode',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='epreuves.periode'),
+        ),
+        migrations.AlterField(
+            model_name='epreuvelisting',
+            name='serie',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='epreuves.serie'),
+        ),
+        migrations.AddIndex(
+            model_name='epreuvelisting',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-annee_scolaire', 'periode_code', 'matiere_nom', 'id', 'is_active'], name='epreuves_listing_annee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='epreuvelisting',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['classe', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id'], name='epreuves_listing_classe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='epreuvelisting',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['matiere', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id'], name='epreuves_listing_matiere_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='epreuvelisting',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['periode', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id'], name='epreuves_listing_periode_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='epreuvelisting',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['serie', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id'], name='epreuves_listing_serie_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='epreuvelisting',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['type_epreuve', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id'], name='epreuves_listing_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='epreuvelisting',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['is_examen', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id', 'type_epreuve', 'is_active'], name='epreuves_listing_examen_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epreuves', '0008_index_partiels_listing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='epreuvelisting',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epreuves', '0009_listing_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='epreuvelisting',
+            index=models.Index(condition=models.Q(('has_corrige', True), ('is_active', True)), fields=['id', 'has_corrige', 'is_active'], name='epreuves_listing_corrige_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='telechargement',
+            index=models.Index(fields=['date_telechargement'], name='epreuves_telech_date_idx'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.urls import reverse
 from django.utils.text import slugify
 
+from core.storage import cas_storage
+
 User = get_user_model()
 
 class SystemeScolaire(models.Model):
@@ -66,7 +69,9 @@ class Classe(models.Model):
         ordering = ['niveau__ordre', 'numero_classe']
     
     def __str__(self):
-        return f"{self.nom} ({self.niveau.nom})"
+        from .taxonomy import par_id
+        niveau = par_id('niveau', self.niveau_id) or self.niveau
+        return f"{self.nom} ({niveau.nom})"
 
 
 class Serie(models.Model):
@@ -165,6 +170,9 @@ class Epreuve(models.Model):
         ('examen_entree', 'Examen d\'entrée'),
     ]
     
+    # Types regroupés sous le filtre "Examen Final" de la liste
+    TYPES_EXAMEN_FINAL = ['ceped', 'bepc', 'bac_1', 'bac_2', 'bac_blanc']
+    
     # Session
     SESSION_CHOICES = [
         ('normale', 'Session Normale'),
@@ -198,19 +206,26 @@ class Epreuve(models.Model):
     coefficient = models.PositiveSmallIntegerField(null=True, blank=True)
     bareme = models.PositiveSmallIntegerField(default=20, help_text="Barème sur 20 ou 400")
     
-    # Fichiers
-    fichier_sujet = models.FileField(upload_to='epreuves/sujets/%Y/%m/')
+    # Fichiers (stockés une fois par contenu, voir core/storage.py)
+    fichier_sujet = models.FileField(upload_to='epreuves/sujets/%Y/%m/', storage=cas_storage)
     fichier_corrige = models.FileField(
         upload_to='epreuves/corriges/%Y/%m/', 
         blank=True, null=True,
+        storage=cas_storage,
         verbose_name="Corrigé type"
     )
     fichier_rapport = models.FileField(
         upload_to='epreuves/rapports/%Y/%m/',
         blank=True, null=True,
+        storage=cas_storage,
         verbose_name="Rapport de l'épreuve (pour examens officiels)"
     )
     
+    # Empreintes SHA-256 des fichiers (ETag fort, cache immuable)
+    empreinte_sujet = models.CharField(max_length=64, blank=True, editable=False)
+    empreinte_corrige = models.CharField(max_length=64, blank=True, editable=False)
+    empreinte_rapport = models.CharField(max_length=64, blank=True, editable=False)
+    
     # Contenu
     enonce = models.TextField(blank=True, help_text="Texte de l'énoncé (optionnel)")
     description = models.TextField(blank=True)
@@ -242,18 +257,48 @@ class Epreuve(models.Model):
         ]
     
     def __str__(self):
-        serie_str = f" - Série {self.serie.code}" if self.serie else ""
-        return f"{self.get_type_epreuve_display()} - {self.matiere}{serie_str} ({self.classe} - {self.periode.nom})"
+        # Noms lus dans le registre du système scolaire (aucune requête)
+        from .taxonomy import par_id
+        matiere = par_id('matiere', self.matiere_id) or self.matiere
+        classe = par_id('classe', self.classe_id) or self.classe
+        periode = par_id('periode', self.periode_id) or self.periode
+        serie = (par_id('serie', self.serie_id) or self.serie) if self.serie_id else None
+        serie_str = f" - Série {serie.code}" if serie else ""
+        return f"{self.get_type_epreuve_display()} - {matiere}{serie_str} ({classe} - {periode.nom})"
+    
+    def base_slug(self):
+        return f"{self.type_epreuve}-{self.matiere}-{self.classe}-{self.annee_scolaire}"
+    
+    @staticmethod
+    def allouer_slug(base, pris):
+        """Premier slug libre pour `base` ; `pris` (ensemble des slugs existants) est complété"""
+        slug = slugify(base[:80])
+        prefixe = slugify(base[:75])
+        counter = 1
+        while slug in pris:
+            slug = f"{prefixe}-{counter}"
+            counter += 1
+        pris.add(slug)
+        return slug
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valeurs telles que chargées : comparées au save() suivant (compteurs
+        # de facettes, epreuves/signals.py ; fichiers, core.storage) sans relire la ligne
+        instance._etat_charge = dict(zip(field_names, values))
+        return instance
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            base = f"{self.type_epreuve}-{self.matiere}-{self.classe}-{self.annee_scolaire}"
-            slug = slugify(base[:80])
-            counter = 1
-            while Epreuve.objects.filter(slug=slug).exists():
-                slug = f"{slugify(base[:75])}-{counter}"
-                counter += 1
-            self.slug = slug
+            base = self.base_slug()
+            # Une seule requête pour tous les slugs candidats
+            pris = set(
+                Epreuve.objects.filter(
+                    models.Q(slug=slugify(base[:80])) | models.Q(slug__startswith=f"{slugify(base[:75])}-")
+                ).values_list('slug', flat=True)
+            )
+            self.slug = self.allouer_slug(base, pris)
         
         # Calcul taille
         if self.fichier_sujet and not self.taille_fichier:
@@ -309,6 +354,10 @@ class Telechargement(models.Model):
     class Meta:
         unique_together = ['user', 'epreuve']
         ordering = ['-date_telechargement']
+        indexes = [
+            # Téléchargements du jour (statistiques du site)
+            models.Index(fields=['date_telechargement'], name='epreuves_telech_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user} - {self.epreuve}"
@@ -324,4 +373,180 @@ class Favori(models.Model):
         unique_together = ['user', 'epreuve']
     
     def __str__(self):
-        return f"❤️ {self.user} - {self.epreuve}"
\ No newline at end of file
+        return f"❤️ {self.user} - {self.epreuve}"
+
+
+class CompteurFacette(models.Model):
+    """
+    Nombre d'épreuves actives par combinaison de filtres.
+    Maintenu par signaux (epreuves/signals.py), reconstruit par `rebuild_facets`.
+    """
+    annee_scolaire = models.CharField(max_length=9)
+    classe = models.ForeignKey(Classe, on_delete=models.CASCADE, related_name='+')
+    matiere = models.ForeignKey(Matiere, on_delete=models.CASCADE, related_name='+')
+    periode = models.ForeignKey(Periode, on_delete=models.CASCADE, related_name='+')
+    serie = models.ForeignKey(Serie, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    type_epreuve = models.CharField(max_length=20)
+    nombre = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Compteur de facette"
+        indexes = [
+            models.Index(
+                fields=['annee_scolaire', 'classe', 'matiere', 'periode', 'serie', 'type_epreuve'],
+                name='epreuves_facette_cle_idx',
+            ),
+        ]
+        # Une ligne par clé. NULL n'étant égal à rien dans un index unique,
+        # les clés sans série ont leur propre contrainte
+        constraints = [
+            models.UniqueConstraint(
+                fields=['annee_scolaire', 'classe', 'matiere', 'periode', 'serie', 'type_epreuve'],
+                condition=models.Q(serie__isnull=False),
+                name='epreuves_facette_cle_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['annee_scolaire', 'classe', 'matiere', 'periode', 'type_epreuve'],
+                condition=models.Q(serie__isnull=True),
+                name='epreuves_facette_cle_sans_serie_uniq',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.annee_scolaire} / {self.classe_id} / {self.matiere_id} : {self.nombre}"
+
+
+class EpreuveListing(models.Model):
+    """
+    Projection dénormalisée de Epreuve pour les listes : une ligne par
+    épreuve (même id), avec les noms affichés et les clés de tri, lue sans
+    aucune jointure. Maintenue par signaux (epreuves/signals.py), y compris
+    au renommage d'une matière ou d'une classe ; reconstruite par
+    `rebuild_listing`.
+    """
+    id = models.IntegerField(primary_key=True)  # = Epreuve.id
+    slug = models.SlugField(max_length=50)
+    titre = models.CharField(max_length=200)
+    resume = models.CharField(max_length=300, blank=True)  # Début de la description
+    annee_scolaire = models.CharField(max_length=9)
+    type_epreuve = models.CharField(max_length=20, choices=Epreuve.TYPE_EPREUVE_CHOICES)
+    is_examen = models.BooleanField(default=False)  # type_epreuve dans TYPES_EXAMEN_FINAL
+    is_premium = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=True)
+    has_corrige = models.BooleanField(default=False)
+    
+    # Filtres (ids) et noms affichés / clés de tri. Pas d'index par clé
+    # étrangère : le planificateur les préférerait aux index de Meta, puis trierait
+    niveau = models.ForeignKey(Niveau, on_delete=models.CASCADE, related_name='+', db_index=False)
+    classe = models.ForeignKey(Classe, on_delete=models.CASCADE, related_name='+', db_index=False)
+    serie = models.ForeignKey(Serie, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_index=False)
+    matiere = models.ForeignKey(Matiere, on_delete=models.CASCADE, related_name='+', db_index=False)
+    periode = models.ForeignKey(Periode, on_delete=models.CASCADE, related_name='+', db_index=False)
+    classe_nom = models.CharField(max_length=30)
+    serie_code = models.CharField(max_length=5, blank=True)
+    matiere_nom = models.CharField(max_length=100)
+    matiere_couleur = models.CharField(max_length=7)
+    matiere_icon = models.CharField(max_length=10, blank=True)
+    periode_code = models.CharField(max_length=5)
+    periode_nom = models.CharField(max_length=30)
+    
+    # Carte
+    duree = models.CharField(max_length=20, blank=True)
+    nombre_pages = models.PositiveSmallIntegerField(null=True, blank=True)
+    taille_fichier = models.PositiveIntegerField(null=True, blank=True)
+    nombre_telechargements = models.PositiveIntegerField(default=0)
+    
+    # Dernière modification de la carte (clé de son fragment en cache) ; le
+    # compteur de téléchargements, reflété sans sauvegarde, n'y est pas compris
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Épreuve (liste)"
+        verbose_name_plural = "Épreuves (liste)"
+        ordering = ['-annee_scolaire', 'periode_code', 'matiere_nom']
+        # Index partiels (épreuves actives seulement) : un filtre d'égalité puis
+        # les clés de tri dans leur sens. Quel que soit l'index retenu, les
+        # lignes sortent dans l'ordre de la liste (pas de tri temporaire) et les
+        # autres filtres sont vérifiés en le parcourant. is_active (et le type
+        # pour les examens) en dernier : les COUNT peu sélectifs (toutes les
+        # années, examens ou non) lisent l'index seul. Voir core.tests.PlansRequetesTests.
+        indexes = [
+            models.Index(
+                fields=['-annee_scolaire', 'periode_code', 'matiere_nom', 'id', 'is_active'],
+                condition=models.Q(is_active=True),
+                name='epreuves_listing_annee_idx',
+            ),
+            models.Index(
+                fields=['classe', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id'],
+                condition=models.Q(is_active=True),
+                name='epreuves_listing_classe_idx',
+            ),
+            models.Index(
+                fields=['matiere', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id'],
+                condition=models.Q(is_active=True),
+                name='epreuves_listing_matiere_idx',
+            ),
+            models.Index(
+                fields=['periode', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id'],
+                condition=models.Q(is_active=True),
+                name='epreuves_listing_periode_idx',
+            ),
+            models.Index(
+                fields=['serie', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id'],
+                condition=models.Q(is_active=True),
+                name='epreuves_listing_serie_idx',
+            ),
+            models.Index(
+                fields=['type_epreuve', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id'],
+                condition=models.Q(is_active=True),
+                name='epreuves_listing_type_idx',
+            ),
+            models.Index(
+                fields=['is_examen', '-annee_scolaire', 'periode_code', 'matiere_nom', 'id', 'type_epreuve', 'is_active'],
+                condition=models.Q(is_active=True),
+                name='epreuves_listing_examen_idx',
+            ),
+            # Nombre d'épreuves corrigées (statistiques du site) : lu dans l'index seul
+            models.Index(
+                fields=['id', 'has_corrige', 'is_active'],
+                condition=models.Q(is_active=True, has_corrige=True),
+                name='epreuves_listing_corrige_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_type_epreuve_display()} - {self.matiere_nom} ({self.classe_nom} - {self.periode_nom})"
+    
+    def get_absolute_url(self):
+        return reverse('epreuves:detail', kwargs={'slug': self.slug})
+    
+    def is_examen_officiel(self):
+        return Epreuve.is_examen_officiel(self)
+    
+    @property
+    def taille_formatee(self):
+        if not self.taille_fichier:
+            return ''
+        if self.taille_fichier >= 1024:
+            return f"{self.taille_fichier / 1024:.1f} Mo"
+        return f"{self.taille_fichier} Ko"
+
+
+class EpreuveSimilaire(models.Model):
+    """
+    Épreuves voisines précalculées (co-téléchargements et favoris communs).
+    Table reconstruite par la commande `build_similaires`.
+    """
+    epreuve = models.ForeignKey(Epreuve, on_delete=models.CASCADE, related_name='voisines')
+    voisine = models.ForeignKey(Epreuve, on_delete=models.CASCADE, related_name='similaire_de')
+    rang = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        verbose_name = "Épreuve similaire"
+        verbose_name_plural = "Épreuves similaires"
+        ordering = ['epreuve', 'rang']
+        unique_together = ['epreuve', 'rang']
+    
+    def __str__(self):
+        return f"{self.epreuve_id} -> {self.voisine_id} ({self.score:.3f})"
@@ -0,0 +1,173 @@
+# apps/epreuves/quota.py
+
+"""
+Consommation du quota de téléchargements
+
+Une seule transaction courte, deux requêtes, aucune sauvegarde de ligne
+complète :
+
+1. INSERT ... ON CONFLICT (user, epreuve) DO NOTHING des téléchargements :
+   seules les lignes réellement insérées (nombre de lignes / RETURNING)
+   sont des nouveaux téléchargements, les doublons ne lèvent plus
+   d'IntegrityError ;
+2. pour un compte gratuit, UPDATE conditionnel de l'abonnement
+   (... WHERE telechargements_utilises + n <= telechargements_inclus) :
+   la base refuse elle-même de dépasser le quota, même sous des clics
+   concurrents. S'il ne modifie aucune ligne, la transaction est annulée.
+
+L'insertion passe en premier : la transaction prend le verrou d'écriture
+dès sa première requête (pas de lecture suivie d'une écriture, qui
+provoque des « database is locked » sous SQLite).
+
+Les nouveaux téléchargements sont ensuite historisés dans la même
+transaction, avec les statistiques de l'utilisateur (dashboard.stats).
+
+    resultat = quota.consommer(request.user, [epreuve], subscription=request.subscription)
+    if resultat.statut is quota.Statut.QUOTA_EPUISE: ...
+"""
+
+import enum
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import counters
+from dashboard import stats as statistiques, subscription as abonnements
+from dashboard.models import Abonnement, Download
+
+from .models import Telechargement
+
+
+class Statut(enum.Enum):
+    ACCORDE = 'accorde'  # Nouveaux téléchargements enregistrés (et décomptés si gratuit)
+    DEJA_TELECHARGE = 'deja_telecharge'  # Rien de nouveau : rien à décompter
+    QUOTA_EPUISE = 'quota_epuise'  # Refusé, rien n'a été enregistré
+
+
+@dataclass(frozen=True)
+class Consommation:
+    statut: Statut
+    nouvelles: tuple = ()  # Ids des épreuves nouvellement téléchargées
+    necessaires: int = 0  # Crédits demandés
+    restants: int | None = None  # Crédits restants après l'opération (None : illimité ou inconnu)
+
+    def __bool__(self):
+        return self.statut is not Statut.QUOTA_EPUISE
+
+
+class _Refus(Exception):
+    pass
+
+
+# ==================== REQUÊTES ====================
+
+def _inserer(user_id, epreuve_ids, ip_address, gratuit, corriges):
+    """INSERT ... ON CONFLICT DO NOTHING. Retourne les ids des épreuves insérées."""
+    meta = Telechargement._meta
+    colonnes = ('user', 'epreuve', 'date_telechargement', 'ip_address',
+                'a_telecharge_sujet', 'a_telecharge_corrige', 'utilise_credit_gratuit')
+    champs = [meta.get_field(nom) for nom in colonnes]
+    maintenant = timezone.now()
+
+    lignes = []
+    for epreuve_id in epreuve_ids:
+        valeurs = (user_id, epreuve_id, maintenant, ip_address, True, epreuve_id in corriges, gratuit)
+        lignes.extend(champ.get_db_prep_save(valeur, connection) for champ, valeur in zip(champs, valeurs))
+
+    qn = connection.ops.quote_name
+    ligne = '(' + ', '.join(['%s'] * len(champs)) + ')'
+    sql = (
+        f"INSERT INTO {qn(meta.db_table)} ({', '.join(qn(champ.column) for champ in champs)}) "
+        f"VALUES {', '.join([ligne] * len(epreuve_ids))} "
+        f"ON CONFLICT ({qn(champs[0].column)}, {qn(champs[1].column)}) DO NOTHING"
+    )
+    with connection.cursor() as cursor:
+        if len(epreuve_ids) == 1:
+            cursor.execute(sql, lignes)
+            return list(epreuve_ids) if cursor.rowcount == 1 else []
+        cursor.execute(f"{sql} RETURNING {qn(champs[1].column)}", lignes)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _decompter(user_id, n):
+    """
+    UPDATE conditionnel du compteur de l'abonnement.
+    Retourne les crédits restants, ou None si le quota ne suffit pas
+    (ou que l'abonnement n'existe pas).
+    """
+    meta = Abonnement._meta
+    qn = connection.ops.quote_name
+    utilises = qn(meta.get_field('telechargements_utilises').column)
+    inclus = qn(meta.get_field('telechargements_inclus').column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {qn(meta.db_table)} SET {utilises} = {utilises} + %s "
+            f"WHERE {qn(meta.get_field('user').column)} = %s AND {utilises} + %s <= {inclus} "
+            f"RETURNING {inclus} - {utilises}",
+            [n, user_id, n],
+        )
+        row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+def _annee(annee_scolaire):
+    """Première année de "2023-2024", 0 si le format est inattendu (l'historique ne fait pas échouer le téléchargement)"""
+    debut = (annee_scolaire or '')[:4]
+    return int(debut) if debut.isascii() and debut.isdigit() else 0
+
+
+def _historique(epreuve, gratuit):
+    """Ligne d'historique (Download) du téléchargement de `epreuve` (matière et classe déjà chargées)"""
+    return Download(
+        epreuve_id=epreuve.pk,
+        epreuve_title=epreuve.titre[:200],
+        matiere=epreuve.matiere.nom[:50],
+        classe=epreuve.classe.nom[:20],
+        annee=_annee(epreuve.annee_scolaire),
+        is_free=gratuit,
+    )
+
+
+# ==================== SERVICE ====================
+
+def consommer(user, epreuves, subscription=None, ip_address=None, corriges=()):
+    """
+    Enregistre le téléchargement de `epreuves` par `user` et décompte les
+    nouvelles du quota gratuit, tout ou rien. `corriges` : ids des épreuves
+    dont le corrigé est aussi téléchargé. Retourne une Consommation.
+    """
+    subscription = subscription or abonnements.charger(user)
+    ids = list(dict.fromkeys(epreuve.pk for epreuve in epreuves))
+    if not ids:
+        return Consommation(Statut.DEJA_TELECHARGE)
+    gratuit = not subscription.is_premium
+    corriges = set(corriges)
+
+    try:
+        with transaction.atomic():
+            nouvelles = _inserer(user.pk, ids, ip_address, gratuit, corriges)
+            if not nouvelles:
+                return Consommation(Statut.DEJA_TELECHARGE)
+            restants = None
+            if gratuit:
+                restants = _decompter(user.pk, len(nouvelles))
+                if restants is None and not Abonnement.objects.filter(user_id=user.pk).exists():
+                    # Compte sans abonnement (antérieur au provisionnement) : créé une fois
+                    abonnements.provisionner(user)
+                    restants = _decompter(user.pk, len(nouvelles))
+                if restants is None:
+                    raise _Refus
+                transaction.on_commit(lambda: abonnements.invalider(user.pk))
+            par_id = {epreuve.pk: epreuve for epreuve in epreuves}
+            statistiques.enregistrer(user.pk, [_historique(par_id[epreuve_id], gratuit) for epreuve_id in nouvelles])
+    except _Refus:
+        return Consommation(
+            Statut.QUOTA_EPUISE,
+            necessaires=len(nouvelles),
+            restants=subscription.downloads_remaining,
+        )
+
+    for epreuve_id in nouvelles:
+        counters.incrementer(par_id[epreuve_id], 'nombre_telechargements')
+    return Consommation(Statut.ACCORDE, tuple(nouvelles), len(nouvelles), restants)
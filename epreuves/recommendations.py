@@ -0,0 +1,233 @@
+# apps/epreuves/recommendations.py
+
+"""
+Recommandations « épreuves similaires » par co-occurrence (item-item)
+
+Deux épreuves sont proches si les mêmes utilisateurs les ont téléchargées
+ou mises en favori. Pour chaque utilisateur, son panier associe un poids à
+chaque épreuve (1 pour un téléchargement, POIDS_FAVORI pour un favori,
+le maximum des deux si les deux) ; la similarité est le cosinus :
+
+    sim(a, b) = Σ_u w(u,a)·w(u,b) / √(Σ_u w(u,a)² · Σ_u w(u,b)²)
+
+Le calcul est fait hors ligne par la commande `build_similaires` :
+l'historique est lu par tranches d'utilisateurs (clé croissante, index de
+unique_together), les paires de chaque tranche sont comptées dans un pool
+de processus et cumulées dans une table temporaire (INSERT ... ON CONFLICT
+DO UPDATE), relue ensuite en flux pour garder les K meilleurs voisins de
+chaque épreuve, écrits dans EpreuveSimilaire. La mémoire dépend de la
+taille d'une tranche et du nombre d'épreuves, pas du nombre de paires.
+La page de détail n'a plus qu'une lecture indexée.
+
+Ce module n'importe pas les modèles au chargement : les processus du pool
+n'exécutent que _compter_paires, qui ne touche pas à la base.
+"""
+
+import heapq
+import math
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.db import connection, transaction
+
+
+POIDS_TELECHARGEMENT = 1.0
+POIDS_FAVORI = 2.0
+
+NB_VOISINS = 8
+NB_SIMILAIRES = 4
+
+# Un panier démesuré (robot, compte partagé) ne dit rien sur la proximité
+# des épreuves et coûte n² paires : on n'en garde que les plus récentes
+MAX_PANIER = 200
+
+
+# ==================== CALCUL (PROCESSUS DU POOL) ====================
+
+def _compter_paires(paniers, max_panier=MAX_PANIER):
+    """
+    Compte les co-occurrences pondérées d'une tranche de paniers.
+    `paniers` : liste de listes [(epreuve_id, poids), ...]
+    Retourne (normes, paires) : {id: Σ w²} et {(a, b): Σ wa·wb} avec a < b.
+    """
+    normes = defaultdict(float)
+    paires = defaultdict(float)
+    for panier in paniers:
+        panier = sorted(panier[:max_panier])
+        for i, (a, wa) in enumerate(panier):
+            normes[a] += wa * wa
+            for b, wb in panier[i + 1:]:
+                paires[(a, b)] += wa * wb
+    return dict(normes), dict(paires)
+
+
+# ==================== LECTURE DE L'HISTORIQUE ====================
+
+def _tranches(taille):
+    """
+    Générateur : listes de paniers pour `taille` utilisateurs à la fois.
+    Parcours par clé (user_id) croissante, sans OFFSET.
+    """
+    from .models import Favori, Telechargement
+
+    dernier = 0
+    while True:
+        utilisateurs = list(
+            Telechargement.objects.filter(user_id__gt=dernier).order_by().values_list('user_id')
+            .union(Favori.objects.filter(user_id__gt=dernier).order_by().values_list('user_id'))
+            .order_by('user_id')[:taille]
+        )
+        if not utilisateurs:
+            return
+        borne = utilisateurs[-1][0]
+
+        paniers = defaultdict(dict)
+        sources = (
+            (Telechargement, POIDS_TELECHARGEMENT, '-date_telechargement'),
+            (Favori, POIDS_FAVORI, '-date_ajout'),
+        )
+        for modele, poids, ordre in sources:
+            lignes = (
+                modele.objects.filter(user_id__gt=dernier, user_id__lte=borne)
+                .order_by('user_id', ordre)
+                .values_list('user_id', 'epreuve_id')
+            )
+            for user_id, epreuve_id in lignes.iterator(chunk_size=5000):
+                panier = paniers[user_id]
+                panier[epreuve_id] = max(panier.get(epreuve_id, 0.0), poids)
+
+        yield [list(panier.items()) for panier in paniers.values() if len(panier) > 1]
+        dernier = borne
+
+
+def _executer(tranches, workers):
+    """
+    Applique _compter_paires à chaque tranche (dans un pool si workers > 1)
+    et produit les résultats au fil de l'eau, sans lire tout l'historique
+    d'avance : au plus 2 tranches en attente par processus.
+    """
+    if workers <= 1:
+        for paniers in tranches:
+            yield _compter_paires(paniers)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        en_cours = set()
+        for paniers in tranches:
+            en_cours.add(pool.submit(_compter_paires, paniers))
+            if len(en_cours) >= workers * 2:
+                faits, en_cours = wait(en_cours, return_when=FIRST_COMPLETED)
+                for futur in faits:
+                    yield futur.result()
+        for futur in en_cours:
+            yield futur.result()
+
+
+# ==================== CONSTRUCTION DE LA TABLE ====================
+
+# Table temporaire (propre à la connexion) des co-occurrences cumulées
+TABLE_PAIRES = 'epreuves_similaires_paires'
+
+
+def _cumuler(cursor, paires):
+    """Ajoute les paires d'une tranche aux totaux de la table temporaire"""
+    with transaction.atomic():
+        cursor.executemany(
+            f"INSERT INTO {TABLE_PAIRES} (a, b, commun) VALUES (%s, %s, %s) "
+            f"ON CONFLICT (a, b) DO UPDATE SET commun = {TABLE_PAIRES}.commun + excluded.commun",
+            [(a, b, commun) for (a, b), commun in paires.items()],
+        )
+
+
+def calculer(taille_tranche=1000, workers=1, nb_voisins=NB_VOISINS, min_commun=1):
+    """
+    Calcule les voisins de chaque épreuve.
+    Retourne {epreuve_id: [(score, voisine_id), ...]} trié par score décroissant.
+    `min_commun` : co-occurrence pondérée minimale pour retenir une paire.
+    """
+    normes = defaultdict(float)
+    meilleurs = defaultdict(list)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE_PAIRES}")
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {TABLE_PAIRES} "
+            "(a integer NOT NULL, b integer NOT NULL, commun real NOT NULL, PRIMARY KEY (a, b))"
+        )
+        try:
+            for normes_tranche, paires_tranche in _executer(_tranches(taille_tranche), workers):
+                for epreuve_id, valeur in normes_tranche.items():
+                    normes[epreuve_id] += valeur
+                _cumuler(cursor, paires_tranche)
+
+            cursor.execute(f"SELECT a, b, commun FROM {TABLE_PAIRES} WHERE commun >= %s", [min_commun])
+            for a, b, commun in cursor:
+                score = commun / math.sqrt(normes[a] * normes[b])
+                for epreuve_id, voisine_id in ((a, b), (b, a)):
+                    tas = meilleurs[epreuve_id]
+                    if len(tas) < nb_voisins:
+                        heapq.heappush(tas, (score, voisine_id))
+                    elif score > tas[0][0]:
+                        heapq.heapreplace(tas, (score, voisine_id))
+        finally:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE_PAIRES}")
+
+    return {epreuve_id: sorted(tas, reverse=True) for epreuve_id, tas in meilleurs.items()}
+
+
+def reconstruire(taille_tranche=1000, workers=1, nb_voisins=NB_VOISINS, min_commun=1):
+    """Recalcule toute la table EpreuveSimilaire. Retourne le nombre de lignes écrites."""
+    from .models import Epreuve, EpreuveSimilaire
+
+    voisins = calculer(taille_tranche, workers, nb_voisins, min_commun)
+    actives = set(Epreuve.objects.filter(is_active=True).values_list('id', flat=True))
+
+    lignes = []
+    for epreuve_id, scores in voisins.items():
+        if epreuve_id not in actives:
+            continue
+        rang = 0
+        for score, voisine_id in scores:
+            if voisine_id in actives:
+                rang += 1
+                lignes.append(EpreuveSimilaire(
+                    epreuve_id=epreuve_id, voisine_id=voisine_id, rang=rang, score=score
+                ))
+
+    with transaction.atomic():
+        EpreuveSimilaire.objects.all().delete()
+        EpreuveSimilaire.objects.bulk_create(lignes, batch_size=1000)
+    return len(lignes)
+
+
+# ==================== LECTURE ====================
+
+def similaires(epreuve, nombre=NB_SIMILAIRES):
+    """
+    Épreuves similaires à afficher sur la page de détail.
+    Une lecture indexée (epreuve_id, rang) de la table précalculée ; à défaut
+    (épreuve récente, pas encore d'historique), complète avec la même
+    classe et la même matière, puis la même classe.
+    """
+    from .models import Epreuve
+    from .taxonomy import attacher
+
+    resultats = list(
+        Epreuve.objects.filter(similaire_de__epreuve=epreuve, is_active=True)
+        .order_by('similaire_de__rang')[:nombre]
+    )
+    if len(resultats) >= nombre:
+        return attacher(resultats)
+
+    replis = (
+        {'classe_id': epreuve.classe_id, 'matiere_id': epreuve.matiere_id},
+        {'classe_id': epreuve.classe_id},
+    )
+    for filtres in replis:
+        exclus = [epreuve.pk] + [e.pk for e in resultats]
+        resultats += list(
+            Epreuve.objects.filter(is_active=True, **filtres)
+            .exclude(pk__in=exclus)[:nombre - len(resultats)]
+        )
+        if len(resultats) >= nombre:
+            break
+    return attacher(resultats)
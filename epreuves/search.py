@@ -0,0 +1,193 @@
+# apps/epreuves/search.py
+
+"""
+Recherche plein texte des épreuves (SQLite FTS5)
+
+Une table virtuelle FTS5 indexe, pour chaque épreuve (rowid = id de l'épreuve),
+le titre, la description, le nom de la matière et celui de la classe.
+Le texte est indexé en minuscules et sans accents : "mathematiques"
+trouve donc "Mathématiques". Les résultats sont classés par BM25.
+"""
+
+import re
+import unicodedata
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+
+TABLE_RECHERCHE = 'epreuves_recherche'
+
+# Poids BM25 des colonnes : titre, description, matiere, classe
+POIDS_COLONNES = (10.0, 2.0, 5.0, 5.0)
+
+# Nombre maximum de résultats classés par BM25 (les suivants le sont par id)
+MAX_RESULTATS = 500
+
+TAILLE_LOT = 1000
+
+
+def normaliser(texte):
+    """Minuscules sans accents : "Mathématiques" -> "mathematiques" """
+    texte = unicodedata.normalize('NFKD', texte or '')
+    return ''.join(c for c in texte if not unicodedata.combining(c)).lower()
+
+
+def est_disponible():
+    """FTS5 n'existe que sous SQLite"""
+    return connection.vendor == 'sqlite'
+
+
+def construire_requete(saisie):
+    """
+    Transforme la saisie utilisateur en requête FTS5 :
+    chaque mot devient un préfixe ("math" trouve "mathematiques"),
+    les mots sont combinés en ET. Les caractères spéciaux FTS5 sont ignorés.
+    """
+    mots = re.findall(r'\w+', normaliser(saisie))
+    return ' '.join(f'"{mot}"*' for mot in mots)
+
+
+def preparer_document(row):
+    """(id, titre, description, matiere, classe) -> ligne à indexer"""
+    pk, titre, description, matiere, classe = row
+    return (pk, normaliser(titre), normaliser(description), normaliser(matiere), normaliser(classe))
+
+
+def _lignes(queryset):
+    return queryset.values_list('id', 'titre', 'description', 'matiere__nom', 'classe__nom')
+
+
+def _inserer(cursor, rows):
+    cursor.executemany(
+        f"INSERT INTO {TABLE_RECHERCHE} (rowid, titre, description, matiere, classe) "
+        "VALUES (%s, %s, %s, %s, %s)",
+        [preparer_document(row) for row in rows]
+    )
+
+
+def supprimer(ids):
+    """Retire des épreuves de l'index"""
+    ids = list(ids)
+    if not ids or not est_disponible():
+        return
+    with connection.cursor() as cursor:
+        for debut in range(0, len(ids), TAILLE_LOT):
+            lot = ids[debut:debut + TAILLE_LOT]
+            placeholders = ', '.join(['%s'] * len(lot))
+            cursor.execute(f"DELETE FROM {TABLE_RECHERCHE} WHERE rowid IN ({placeholders})", lot)
+
+
+def indexer(ids):
+    """(Ré)indexe les épreuves données"""
+    from .models import Epreuve
+
+    ids = list(ids)
+    if not ids or not est_disponible():
+        return
+    supprimer(ids)
+    with connection.cursor() as cursor:
+        for debut in range(0, len(ids), TAILLE_LOT):
+            lot = ids[debut:debut + TAILLE_LOT]
+            _inserer(cursor, _lignes(Epreuve.objects.filter(id__in=lot).order_by()))
+
+
+def reconstruire(queryset=None):
+    """Vide et reconstruit tout l'index par lots. Retourne le nombre d'épreuves indexées."""
+    from .models import Epreuve
+
+    if not est_disponible():
+        return 0
+    if queryset is None:
+        queryset = Epreuve.objects.all()
+
+    total = 0
+    lot = []
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE_RECHERCHE}")
+        for row in _lignes(queryset.order_by()).iterator(chunk_size=TAILLE_LOT):
+            lot.append(row)
+            if len(lot) >= TAILLE_LOT:
+                _inserer(cursor, lot)
+                total += len(lot)
+                lot = []
+        if lot:
+            _inserer(cursor, lot)
+            total += len(lot)
+        # Fusionne les segments de l'index après un chargement massif
+        cursor.execute(f"INSERT INTO {TABLE_RECHERCHE} ({TABLE_RECHERCHE}) VALUES ('optimize')")
+    return total
+
+
+def _restriction(queryset):
+    """Clause `AND rowid IN (...)` limitant la recherche aux ids de `queryset`"""
+    if queryset is None:
+        return '', []
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    return f" AND rowid IN ({sql})", list(params)
+
+
+def rechercher(saisie, limite=None, parmi=None):
+    """
+    Retourne les ids des épreuves correspondantes, du plus pertinent au moins
+    pertinent. `parmi` : queryset d'épreuves auquel restreindre la recherche
+    (filtres de la liste), appliqué avant la limite (MAX_RESULTATS par défaut).
+    """
+    requete = construire_requete(saisie)
+    if not requete:
+        return []
+    if limite is None:
+        limite = MAX_RESULTATS
+    poids = ', '.join(str(p) for p in POIDS_COLONNES)
+    try:
+        restriction, params = _restriction(parmi)
+    except EmptyResultSet:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABLE_RECHERCHE} WHERE {TABLE_RECHERCHE} MATCH %s{restriction} "
+            f"ORDER BY bm25({TABLE_RECHERCHE}, {poids}) LIMIT %s",
+            [requete, *params, limite]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filtrer(queryset, saisie):
+    """
+    Restreint un queryset d'épreuves (Epreuve ou EpreuveListing, mêmes ids)
+    à la recherche `saisie`, trié par pertinence (annotation `pertinence`,
+    0 = plus pertinent).
+
+    Toutes les correspondances sont gardées : les MAX_RESULTATS plus
+    pertinentes parmi celles du queryset sont classées par BM25, les
+    suivantes viennent après, par id.
+    """
+    if not est_disponible():
+        from .models import Epreuve
+
+        # Recherche sur Epreuve, restriction par id : valable pour les deux modèles
+        correspondances = Epreuve.objects.filter(
+            Q(titre__icontains=saisie) |
+            Q(matiere__nom__icontains=saisie) |
+            Q(description__icontains=saisie) |
+            Q(classe__nom__icontains=saisie)
+        ).values('pk')
+        return queryset.filter(pk__in=correspondances)
+
+    ids = rechercher(saisie, parmi=queryset)
+    if not ids:
+        return queryset.none()
+
+    correspondances = RawSQL(
+        f"SELECT rowid FROM {TABLE_RECHERCHE} WHERE {TABLE_RECHERCHE} MATCH %s",
+        [construire_requete(saisie)],
+    )
+    return queryset.filter(pk__in=correspondances).annotate(
+        pertinence=Case(
+            *[When(pk=pk, then=Value(rang)) for rang, pk in enumerate(ids)],
+            default=Value(len(ids)),
+            output_field=IntegerField(),
+        )
+    ).order_by('pertinence')
@@ -0,0 +1,159 @@
+# apps/epreuves/signals.py
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from core import pagecache
+from core.storage import suivre_references
+
+from . import facets, listing, search, taxonomy
+from .models import Epreuve, Matiere, Classe, Niveau, Periode, Serie, SystemeScolaire
+
+
+# ==================== INDEX DE RECHERCHE ====================
+
+@receiver(post_save, sender=Epreuve)
+def indexer_epreuve(sender, instance, raw=False, **kwargs):
+    """Réindexe l'épreuve après chaque sauvegarde"""
+    if raw:
+        return
+    search.indexer([instance.pk])
+
+
+@receiver(post_delete, sender=Epreuve)
+def desindexer_epreuve(sender, instance, **kwargs):
+    """Retire l'épreuve supprimée de l'index"""
+    search.supprimer([instance.pk])
+
+
+@receiver(post_save, sender=Matiere)
+@receiver(post_save, sender=Classe)
+def reindexer_epreuves_liees(sender, instance, raw=False, **kwargs):
+    """Le nom de la matière/classe est indexé : réindexer ses épreuves"""
+    if raw or kwargs.get('created'):
+        return
+    lien = 'matiere' if sender is Matiere else 'classe'
+    search.indexer(
+        Epreuve.objects.filter(**{lien: instance}).values_list('id', flat=True)
+    )
+
+
+# ==================== COMPTEURS DE FACETTES ====================
+
+CHAMPS_FACETTE = facets.CHAMPS_CLE + ('is_active',)
+
+
+@receiver(pre_save, sender=Epreuve)
+def memoriser_facette(sender, instance, raw=False, **kwargs):
+    """Mémorise la clé et l'état actif avant modification"""
+    instance._facette_avant = None
+    if raw or not instance.pk:
+        return
+    avant = getattr(instance, '_etat_charge', {})
+    if not all(champ in avant for champ in CHAMPS_FACETTE):
+        # Instance construite à la main ou chargée sans ces champs (only/defer) : relue
+        avant = Epreuve.objects.filter(pk=instance.pk).values(*CHAMPS_FACETTE).first() or {}
+    if avant.get('is_active'):
+        instance._facette_avant = tuple(avant[champ] for champ in facets.CHAMPS_CLE)
+
+
+@receiver(post_save, sender=Epreuve)
+def mettre_a_jour_facette(sender, instance, raw=False, **kwargs):
+    """Déplace l'épreuve d'un compteur à l'autre (changement de clé ou de is_active)"""
+    if raw:
+        return
+    avant = getattr(instance, '_facette_avant', None)
+    apres = facets.cle(instance) if instance.is_active else None
+    # État de référence du prochain save()
+    etat = getattr(instance, '_etat_charge', None)
+    if etat is None:
+        etat = instance._etat_charge = {}
+    etat.update((champ, getattr(instance, champ)) for champ in CHAMPS_FACETTE)
+    if avant == apres:
+        return
+    with transaction.atomic():
+        if avant:
+            facets.ajuster(avant, -1)
+        if apres:
+            facets.ajuster(apres, 1)
+
+
+@receiver(post_delete, sender=Epreuve)
+def retirer_facette(sender, instance, **kwargs):
+    if instance.is_active:
+        facets.ajuster(facets.cle(instance), -1)
+
+
+# ==================== PROJECTION DE LA LISTE ====================
+
+@receiver(post_save, sender=Epreuve)
+def projeter_epreuve(sender, instance, raw=False, **kwargs):
+    """Met à jour la ligne de l'épreuve dans EpreuveListing"""
+    if raw:
+        return
+    listing.enregistrer([instance])
+
+
+@receiver(post_delete, sender=Epreuve)
+def retirer_projection(sender, instance, **kwargs):
+    listing.supprimer([instance.pk])
+
+
+@receiver(post_save, sender=Matiere)
+@receiver(post_save, sender=Classe)
+@receiver(post_save, sender=Periode)
+@receiver(post_save, sender=Serie)
+def renommer_projection(sender, instance, raw=False, **kwargs):
+    """Nom, code ou couleur recopiés dans les lignes des épreuves liées"""
+    if raw or kwargs.get('created'):
+        return
+    listing.renommer(instance)
+
+
+# ==================== REGISTRE DU SYSTÈME SCOLAIRE ====================
+
+@receiver(post_save, sender=SystemeScolaire)
+@receiver(post_save, sender=Niveau)
+@receiver(post_save, sender=Classe)
+@receiver(post_save, sender=Serie)
+@receiver(post_save, sender=Periode)
+@receiver(post_save, sender=Matiere)
+@receiver(post_delete, sender=SystemeScolaire)
+@receiver(post_delete, sender=Niveau)
+@receiver(post_delete, sender=Classe)
+@receiver(post_delete, sender=Serie)
+@receiver(post_delete, sender=Periode)
+@receiver(post_delete, sender=Matiere)
+@receiver(m2m_changed, sender=Matiere.niveaux.through)
+@receiver(m2m_changed, sender=Serie.matieres_principales.through)
+def invalider_taxonomie(sender, action=None, **kwargs):
+    """Les données de référence ont changé : nouvelle version du registre"""
+    if action and not action.startswith('post_'):
+        return
+    transaction.on_commit(taxonomy.invalider)
+    transaction.on_commit(invalider_pages)
+
+
+# ==================== PAGES EN CACHE (VISITEURS ANONYMES) ====================
+
+def invalider_pages():
+    pagecache.invalider('epreuves')
+
+
+@receiver(post_save, sender=Epreuve)
+@receiver(post_delete, sender=Epreuve)
+def invalider_pages_epreuve(sender, raw=False, **kwargs):
+    """Liste et détails des épreuves en cache : nouvelle version après le commit"""
+    if raw:
+        return
+    transaction.on_commit(invalider_pages)
+
+
+# ==================== FICHIERS (STOCKAGE PAR CONTENU) ====================
+
+suivre_references(Epreuve, {
+    'fichier_sujet': 'empreinte_sujet',
+    'fichier_corrige': 'empreinte_corrige',
+    'fichier_rapport': 'empreinte_rapport',
+})
@@ -0,0 +1,234 @@
+# apps/epreuves/taxonomy.py
+
+"""
+Registre du système scolaire (données de référence)
+
+SystemeScolaire, Niveau, Classe, Serie, Periode et Matiere ne changent que
+quelques fois par an : ils sont chargés une fois par processus, avec leurs
+relations déjà résolues (classe.niveau, niveau.systeme, liens M2M), puis
+servis depuis la mémoire.
+
+Invalidation : un jeton de version partagé est conservé dans le cache
+Django ; les signaux de ces modèles le changent après commit. Chaque
+processus compare ce jeton à celui de son instantané et recharge au
+besoin. Le cache par défaut (core.cache.SQLiteCache) est commun aux
+workers d'une machine ; sur plusieurs machines, configurer un cache commun.
+
+Pendant une requête (TaxonomieMiddleware) ou un bloc par_requete(), le jeton
+n'est lu qu'une fois : les appels suivants (par_id() des __str__ de chaque
+ligne d'une liste...) servent le même instantané sans accès au cache.
+
+Les instances du registre sont partagées entre requêtes : ne pas les
+modifier, utiliser copier() avant d'y ajouter des attributs.
+"""
+
+import copy
+import threading
+import uuid
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.cache import cache
+
+from .models import Classe, Matiere, Niveau, Periode, Serie, SystemeScolaire
+
+
+CLE_VERSION = 'epreuves:taxonomie:version'
+
+MODELES = {
+    'systeme': SystemeScolaire,
+    'niveau': Niveau,
+    'classe': Classe,
+    'serie': Serie,
+    'periode': Periode,
+    'matiere': Matiere,
+}
+
+
+class Taxonomie:
+    """Instantané immuable des données de référence"""
+
+    def __init__(self, version=None):
+        self.version = version
+
+        self.systemes = {s.pk: s for s in SystemeScolaire.objects.all()}
+        self.niveaux = {n.pk: n for n in Niveau.objects.all()}
+        self.classes = {c.pk: c for c in Classe.objects.all()}
+        self.series = {s.pk: s for s in Serie.objects.all()}
+        self.periodes = {p.pk: p for p in Periode.objects.all()}
+        self.matieres = {m.pk: m for m in Matiere.objects.all()}
+
+        # Clés étrangères résolues sans requête
+        for niveau in self.niveaux.values():
+            _lier(niveau, 'systeme', self.systemes)
+        for classe in self.classes.values():
+            _lier(classe, 'niveau', self.niveaux)
+
+        # Liens M2M, sous forme de tuples d'ids
+        niveaux_matiere = {pk: [] for pk in self.matieres}
+        matieres_niveau = {pk: [] for pk in self.niveaux}
+        for matiere_id, niveau_id in Matiere.niveaux.through.objects.values_list('matiere_id', 'niveau_id'):
+            niveaux_matiere[matiere_id].append(niveau_id)
+            matieres_niveau[niveau_id].append(matiere_id)
+        for pk, matiere in self.matieres.items():
+            matiere.niveaux_ids = tuple(niveaux_matiere[pk])
+        for pk, niveau in self.niveaux.items():
+            niveau.matieres_ids = tuple(matieres_niveau[pk])
+
+        principales = {pk: [] for pk in self.series}
+        for serie_id, matiere_id in Serie.matieres_principales.through.objects.values_list('serie_id', 'matiere_id'):
+            principales[serie_id].append(matiere_id)
+        for pk, serie in self.series.items():
+            serie.matieres_principales_ids = tuple(principales[pk])
+
+        self._tables = {
+            'systeme': self.systemes,
+            'niveau': self.niveaux,
+            'classe': self.classes,
+            'serie': self.series,
+            'periode': self.periodes,
+            'matiere': self.matieres,
+        }
+        self._par_code = {
+            nom: {objet.code: objet for objet in self._tables[nom].values()}
+            for nom in MODELES
+        }
+
+    def par_id(self, nom, pk):
+        """Objet `nom` ('classe', 'matiere'...) d'identifiant `pk`, ou None"""
+        try:
+            return self._tables[nom].get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def par_code(self, nom, code):
+        """Objet `nom` de code `code`, ou None"""
+        return self._par_code[nom].get(code)
+
+    def liste(self, nom):
+        """Objets `nom` dans l'ordre du modèle (Meta.ordering)"""
+        return list(self._tables[nom].values())
+
+
+def _lier(instance, champ, table):
+    """Met en cache la clé étrangère `champ` de l'instance si la cible est connue"""
+    cible = table.get(getattr(instance, f'{champ}_id'))
+    if cible is not None:
+        instance._meta.get_field(champ).set_cached_value(instance, cible)
+
+
+# ==================== INSTANTANÉ DU PROCESSUS ====================
+
+_instantane = None
+_verrou = threading.Lock()
+
+# Instantané retenu pour la requête en cours (thread ou tâche asynchrone)
+_requete = Local()
+
+
+def version():
+    """Version partagée des données de référence"""
+    valeur = cache.get(CLE_VERSION)
+    if valeur is None:
+        cache.add(CLE_VERSION, uuid.uuid4().hex, None)
+        valeur = cache.get(CLE_VERSION)
+    return valeur
+
+
+def registre():
+    """
+    Instantané courant, rechargé si la version partagée a changé ; dans une
+    requête, celui du premier appel
+    """
+    if getattr(_requete, 'active', False):
+        if _requete.instantane is None:
+            _requete.instantane = _registre()
+        return _requete.instantane
+    return _registre()
+
+
+def _registre():
+    global _instantane
+    courante = version()
+    instantane = _instantane
+    if instantane is None or instantane.version != courante:
+        with _verrou:
+            if _instantane is None or _instantane.version != courante:
+                _instantane = Taxonomie(courante)
+            instantane = _instantane
+    return instantane
+
+
+def invalider():
+    """Change la version partagée : tous les processus rechargeront"""
+    global _instantane
+    cache.set(CLE_VERSION, uuid.uuid4().hex, None)
+    _instantane = None
+    # Modification pendant la requête : elle voit aussitôt le nouvel état
+    _requete.instantane = None
+
+
+@contextmanager
+def par_requete():
+    """Bloc dans lequel la version partagée n'est vérifiée qu'une fois"""
+    if getattr(_requete, 'active', False):
+        yield
+        return
+    _requete.active, _requete.instantane = True, None
+    try:
+        yield
+    finally:
+        _requete.active, _requete.instantane = False, None
+
+
+class TaxonomieMiddleware:
+    """Une seule vérification de la version du registre par requête"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with par_requete():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with par_requete():
+            return await self.get_response(request)
+
+
+def par_id(nom, pk):
+    return registre().par_id(nom, pk)
+
+
+def par_code(nom, code):
+    return registre().par_code(nom, code)
+
+
+def copier(objets):
+    """Copies des objets du registre, modifiables sans toucher à l'instantané"""
+    return [copy.copy(objet) for objet in objets]
+
+
+# Clés étrangères d'une épreuve résolues par le registre
+CHAMPS_EPREUVE = ('niveau', 'classe', 'serie', 'matiere', 'periode')
+
+
+def attacher(epreuves):
+    """
+    Renseigne niveau, classe, serie, matiere et periode des épreuves depuis
+    le registre : l'affichage d'une liste ne fait plus de jointure ni de
+    requête sur les tables de référence.
+    """
+    taxonomie = registre()
+    for epreuve in epreuves:
+        for champ in CHAMPS_EPREUVE:
+            _lier(epreuve, champ, taxonomie._tables[champ])
+    return epreuves
@@ -1,3 +1,553 @@
-from django.test import TestCase
+# apps/epreuves/tests.py
 
-# Create your tests here.
+import csv
+import io
+import math
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.test.utils import CaptureQueriesContext
+
+from core.outils_tests import CACHES_TESTS, DonneesScolaires, creer_utilisateur, vider_caches
+from dashboard.models import Abonnement, Download
+
+from . import bundles, facets, importation, quota, recommendations, search, taxonomy, views
+from .models import (
+    CompteurFacette, Epreuve, EpreuveListing, EpreuveSimilaire, Favori, Matiere, Serie, Telechargement,
+)
+
+
+@override_settings(CACHES=CACHES_TESTS)
+class EpreuvesTestCase(DonneesScolaires, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creer_referentiel()
+
+
+# ==================== RECHERCHE ====================
+
+class RechercheTests(EpreuvesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        premiere, seconde = cls.classes
+        # Les plus pertinentes (titre) sont dans la seconde classe
+        cls.hors_filtre = [cls.creer_epreuve(f'Algèbre algèbre {i}', classe=seconde) for i in range(3)]
+        cls.dans_filtre = [
+            cls.creer_epreuve(f'Devoir {i}', classe=premiere, description='Exercices d\'algèbre')
+            for i in range(3)
+        ]
+
+    def test_accents_et_prefixes(self):
+        ids = search.rechercher('ALGEB')
+        self.assertCountEqual(ids, [e.pk for e in self.hors_filtre + self.dans_filtre])
+        self.assertCountEqual(ids[:3], [e.pk for e in self.hors_filtre])
+
+    def test_filtres_appliques_avant_la_limite(self):
+        """Une recherche filtrée garde toutes ses correspondances, même hors du classement global"""
+        listing = EpreuveListing.objects.filter(classe_id=self.classes[0].pk)
+        with mock.patch.object(search, 'MAX_RESULTATS', 2):
+            resultats = list(search.filtrer(listing, 'algebre'))
+        self.assertCountEqual([e.pk for e in resultats], [e.pk for e in self.dans_filtre])
+        # Les deux classées par BM25 d'abord, la troisième ensuite
+        self.assertEqual([e.pertinence for e in resultats], [0, 1, 2])
+
+    def test_total_au_dela_de_la_limite(self):
+        with mock.patch.object(search, 'MAX_RESULTATS', 2):
+            self.assertEqual(search.filtrer(EpreuveListing.objects.all(), 'algebre').count(), 6)
+
+    def test_aucune_correspondance(self):
+        self.assertFalse(search.filtrer(EpreuveListing.objects.all(), 'chimie organique').exists())
+
+    def test_sans_fts5(self):
+        """Hors SQLite : icontains sur Epreuve, restreint par id"""
+        listing = EpreuveListing.objects.filter(classe_id=self.classes[0].pk)
+        with mock.patch.object(search, 'est_disponible', return_value=False):
+            resultats = search.filtrer(listing, 'algèbre')
+            self.assertCountEqual([e.pk for e in resultats], [e.pk for e in self.dans_filtre])
+
+
+# ==================== COMPTEURS DE FACETTES ====================
+
+class FacettesTests(EpreuvesTestCase):
+
+    def compteurs(self):
+        return {
+            tuple(ligne[:-1]): ligne[-1]
+            for ligne in CompteurFacette.objects.filter(nombre__gt=0).values_list(*facets.CHAMPS_CLE, 'nombre')
+        }
+
+    def test_suivi_par_les_signaux(self):
+        premiere = self.creer_epreuve('Premier devoir')
+        seconde = self.creer_epreuve('Second devoir')
+        self.assertEqual(self.compteurs(), {facets.cle(premiere): 2})
+
+        seconde = Epreuve.objects.get(pk=seconde.pk)
+        seconde.matiere = self.matieres[1]
+        seconde.save()
+        self.assertEqual(self.compteurs(), {facets.cle(premiere): 1, facets.cle(seconde): 1})
+
+        premiere.is_active = False
+        premiere.save()
+        seconde.delete()
+        self.assertEqual(self.compteurs(), {})
+        self.assertEqual(facets.reconstruire(), 0)
+
+    def test_une_ligne_par_cle(self):
+        serie = Serie.objects.first()
+        for serie_id in (None, serie.pk):
+            cle = ('2024-2025', self.classes[0].pk, self.matieres[0].pk, self.periode.pk, serie_id, 'bepc')
+            with self.subTest(serie=serie_id):
+                facets.ajuster(cle, 1)
+                facets.ajuster(cle, 2)
+                facets.ajuster(cle, -1)
+                facets.ajuster(cle, -5)  # Jamais sous zéro
+                lignes = CompteurFacette.objects.filter(**dict(zip(facets.CHAMPS_CLE, cle)))
+                self.assertEqual(list(lignes.values_list('nombre', flat=True)), [2])
+                with self.assertRaises(IntegrityError), transaction.atomic():
+                    CompteurFacette.objects.create(nombre=1, **dict(zip(facets.CHAMPS_CLE, cle)))
+
+    def test_sauvegarde_sans_relecture(self):
+        """La clé d'avant vient de l'instance chargée, pas d'une nouvelle requête"""
+        epreuve = Epreuve.objects.get(pk=self.creer_epreuve('Devoir').pk)
+        with CaptureQueriesContext(connection) as requetes:
+            epreuve.titre = 'Devoir corrigé'
+            epreuve.save()
+            epreuve.matiere = self.matieres[2]
+            epreuve.save()
+        relectures = [
+            requete['sql'] for requete in requetes.captured_queries
+            if requete['sql'].startswith('SELECT "epreuves_epreuve"."annee_scolaire"')
+        ]
+        self.assertEqual(relectures, [])
+        self.assertEqual(self.compteurs(), {facets.cle(epreuve): 1})
+
+    def test_compter(self):
+        self.creer_epreuve('Maths', matiere=self.matieres[0])
+        self.creer_epreuve('Français', matiere=self.matieres[1])
+        self.creer_epreuve('Français 2', matiere=self.matieres[1], classe=self.classes[1])
+        resultats = facets.compter({'annee_scolaire': '2024-2025', 'classe': str(self.classes[0].pk)})
+        # Chaque facette ignore son propre filtre
+        self.assertEqual(resultats['classe'], {self.classes[0].pk: 2, self.classes[1].pk: 1})
+        self.assertEqual(resultats['matiere'], {self.matieres[0].pk: 1, self.matieres[1].pk: 1})
+
+
+# ==================== ÉPREUVES SIMILAIRES ====================
+
+class RecommandationsTests(EpreuvesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.a, cls.b, cls.c = (cls.creer_epreuve(titre) for titre in 'ABC')
+        User = get_user_model()
+        u1, u2, u3 = (User.objects.create_user(email=f'u{i}@example.com', password=None) for i in range(3))
+        for user, epreuves in ((u1, [cls.a, cls.b]), (u2, [cls.a, cls.b, cls.c]), (u3, [cls.a])):
+            Telechargement.objects.bulk_create([Telechargement(user=user, epreuve=e) for e in epreuves])
+        Favori.objects.create(user=u3, epreuve=cls.c)
+
+    def test_cosinus(self):
+        # Normes : a = 3, b = 2, c = 1 + 2² ; co-occurrences : ab = 2, ac = 1 + 2, bc = 1
+        attendus = {
+            self.a.pk: [(2 / math.sqrt(6), self.b.pk), (3 / math.sqrt(15), self.c.pk)],
+            self.b.pk: [(2 / math.sqrt(6), self.a.pk), (1 / math.sqrt(10), self.c.pk)],
+            self.c.pk: [(3 / math.sqrt(15), self.a.pk), (1 / math.sqrt(10), self.b.pk)],
+        }
+        # Une tranche par utilisateur : les paires sont cumulées d'une tranche à l'autre
+        for taille_tranche in (1, 1000):
+            with self.subTest(taille_tranche=taille_tranche):
+                voisins = recommendations.calculer(taille_tranche=taille_tranche)
+                self.assertEqual(voisins.keys(), attendus.keys())
+                for epreuve_id, scores in attendus.items():
+                    self.assertEqual([v for _, v in voisins[epreuve_id]], [v for _, v in scores])
+                    for (score, _), (attendu, _) in zip(voisins[epreuve_id], scores):
+                        self.assertAlmostEqual(score, attendu)
+
+    def test_voisins_et_seuil(self):
+        voisins = recommendations.calculer(nb_voisins=1, min_commun=2)
+        self.assertEqual({pk: [v for _, v in scores] for pk, scores in voisins.items()}, {
+            self.a.pk: [self.b.pk], self.b.pk: [self.a.pk], self.c.pk: [self.a.pk],
+        })
+
+    def test_reconstruire_et_lire(self):
+        self.c.is_active = False
+        self.c.save()
+        self.assertEqual(recommendations.reconstruire(), 2)
+        self.assertEqual(
+            list(EpreuveSimilaire.objects.values_list('epreuve_id', 'voisine_id', 'rang')),
+            [(self.a.pk, self.b.pk, 1), (self.b.pk, self.a.pk, 1)],
+        )
+        self.assertEqual(recommendations.similaires(self.a, nombre=1), [self.b])
+
+
+# ==================== REGISTRE DU SYSTÈME SCOLAIRE ====================
+
+class TaxonomieTests(EpreuvesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.epreuves = [cls.creer_epreuve(f'Devoir {i}') for i in range(5)]
+
+    def test_version_lue_une_fois_par_requete(self):
+        epreuves = list(Epreuve.objects.all())
+        with mock.patch.object(taxonomy, 'version', wraps=taxonomy.version) as version:
+            [str(epreuve) for epreuve in epreuves]
+            self.assertGreaterEqual(version.call_count, len(epreuves))
+            version.reset_mock()
+            with taxonomy.par_requete():
+                [str(epreuve) for epreuve in epreuves]
+                [str(classe) for classe in self.classes]
+            self.assertEqual(version.call_count, 1)
+
+    def test_middleware(self):
+        with mock.patch.object(taxonomy, 'version', wraps=taxonomy.version) as version:
+            reponse = self.client.get(reverse('epreuves:liste'), {'annee_scolaire': ''})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(version.call_count, 1)
+
+    def test_modification_visible_dans_la_requete(self):
+        with taxonomy.par_requete():
+            self.assertIsNone(taxonomy.par_code('matiere', 'eps'))
+            matiere = Matiere.objects.create(nom='EPS', code='eps')
+            taxonomy.invalider()  # Signal, après le commit
+            self.assertEqual(taxonomy.par_code('matiere', 'eps'), matiere)
+
+
+# ==================== IMPORT EN MASSE ====================
+
+class Interruption(Exception):
+    """Arrêt brutal simulé"""
+
+
+@override_settings(CACHES=CACHES_TESTS)
+class ImportationTests(DonneesScolaires, TransactionTestCase):
+    """Fichiers copiés par un pool de threads, chacun sur sa propre connexion"""
+
+    def setUp(self):
+        super().setUp()
+        self.creer_referentiel()
+        self.dossier = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dossier, ignore_errors=True)
+        classe = self.classes[0].code
+        lignes = []
+        for i in range(5):
+            (self.dossier / f'sujet-{i}.pdf').write_bytes(b'%PDF-1.4 ' + bytes([i]) * 2048)
+            lignes.append({
+                # La troisième ligne désigne une classe inconnue
+                'classe': 'inconnue' if i == 2 else classe, 'matiere': 'maths', 'periode': 's1',
+                'annee_scolaire': '2023-2024', 'type_epreuve': 'composition_1', 'sujet': f'sujet-{i}.pdf',
+                'titre': f'Import {i}',
+            })
+        self.manifeste = self.dossier / 'manifeste.csv'
+        with open(self.manifeste, 'w', encoding='utf-8', newline='') as fichier:
+            ecrivain = csv.DictWriter(fichier, fieldnames=list(lignes[0]))
+            ecrivain.writeheader()
+            ecrivain.writerows(lignes)
+
+    def importer(self):
+        return importation.Importation(self.manifeste, taille_lot=2, workers=2)
+
+    def test_import_csv(self):
+        importeur = self.importer()
+        self.assertEqual(importeur.executer(), 4)
+        self.assertEqual(importeur.erreurs, [(4, "classe inconnu(e) : 'inconnue'")])
+        self.assertEqual(Epreuve.objects.count(), 4)
+        self.assertEqual(EpreuveListing.objects.count(), 4)
+        self.assertCountEqual(search.rechercher('import'), Epreuve.objects.values_list('pk', flat=True))
+        self.assertEqual(Epreuve.objects.get(titre='Import 0').taille_fichier, 2)
+        # Lignes déjà traitées : rien à refaire
+        self.assertEqual(self.importer().executer(), 0)
+        self.assertEqual(Epreuve.objects.count(), 4)
+
+    def interrompre(self, *, apres_validation):
+        """Importe jusqu'à l'arrêt simulé du premier lot, avant ou après sa validation en base"""
+        ecrire = importation.Importation._ecrire_reprise
+
+        def ecrire_puis_arreter(importeur, empreinte, lignes, en_cours=None):
+            if lignes == 2 and en_cours is None:
+                raise Interruption
+            return ecrire(importeur, empreinte, lignes, en_cours)
+
+        if apres_validation:
+            arret = mock.patch.object(importation.Importation, '_ecrire_reprise', ecrire_puis_arreter)
+        else:
+            arret = mock.patch.object(importation.listing, 'enregistrer', side_effect=Interruption)
+        with arret, self.assertRaises(Interruption):
+            self.importer().executer()
+
+    def test_reprise_apres_validation(self):
+        """Arrêt entre la validation du lot et son point de reprise : le lot n'est pas réimporté"""
+        self.interrompre(apres_validation=True)
+        self.assertEqual(Epreuve.objects.count(), 2)
+        self.assertEqual(self.importer().executer(), 4)
+        self.assertCountEqual(
+            Epreuve.objects.values_list('titre', flat=True), ['Import 0', 'Import 1', 'Import 3', 'Import 4']
+        )
+        self.assertEqual(EpreuveListing.objects.count(), 4)
+
+    def test_reprise_avant_validation(self):
+        self.interrompre(apres_validation=False)
+        self.assertEqual(Epreuve.objects.count(), 0)
+        self.assertEqual(self.importer().executer(), 4)
+        self.assertEqual(Epreuve.objects.count(), 4)
+
+
+# ==================== QUOTA DE TÉLÉCHARGEMENTS ====================
+
+class QuotaTests(EpreuvesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.epreuves = [cls.creer_epreuve(f'Devoir {i}') for i in range(4)]
+
+    def utilises(self, user):
+        return Abonnement.objects.get(user=user).telechargements_utilises
+
+    def test_jusqu_a_la_limite(self):
+        user = creer_utilisateur('gratuit@example.com', inclus=2)
+        a, b, c, d = self.epreuves
+
+        resultat = quota.consommer(user, [a])
+        self.assertEqual(resultat, quota.Consommation(quota.Statut.ACCORDE, (a.pk,), 1, 1))
+        self.assertTrue(resultat)
+
+        resultat = quota.consommer(user, [a])
+        self.assertIs(resultat.statut, quota.Statut.DEJA_TELECHARGE)
+        self.assertTrue(resultat)
+        self.assertEqual(self.utilises(user), 1)
+
+        # Tout ou rien : deux crédits demandés, un seul restant
+        resultat = quota.consommer(user, [b, c])
+        self.assertIs(resultat.statut, quota.Statut.QUOTA_EPUISE)
+        self.assertFalse(resultat)
+        self.assertEqual(resultat.necessaires, 2)
+        self.assertEqual(Telechargement.objects.filter(user=user).count(), 1)
+        self.assertEqual(Download.objects.filter(user=user).count(), 1)
+
+        vider_caches()
+        resultat = quota.consommer(user, [b, a])
+        self.assertEqual((resultat.statut, resultat.nouvelles, resultat.restants), (quota.Statut.ACCORDE, (b.pk,), 0))
+
+        resultat = quota.consommer(user, [d])
+        self.assertIs(resultat.statut, quota.Statut.QUOTA_EPUISE)
+        self.assertEqual(self.utilises(user), 2)
+        self.assertEqual(Telechargement.objects.filter(user=user).count(), 2)
+
+    def test_premium_illimite(self):
+        user = creer_utilisateur('premium@example.com', plan='mensuel', inclus=0)
+        resultat = quota.consommer(user, self.epreuves)
+        self.assertEqual(resultat.statut, quota.Statut.ACCORDE)
+        self.assertIsNone(resultat.restants)
+        self.assertEqual(len(resultat.nouvelles), len(self.epreuves))
+        self.assertEqual(self.utilises(user), 0)
+        self.assertFalse(Download.objects.filter(user=user, is_free=True).exists())
+
+    def test_annee_scolaire_mal_formee(self):
+        """L'historique garde l'année 0, le téléchargement est accordé"""
+        user = creer_utilisateur('annee@example.com')
+        epreuve = self.epreuves[0]
+        Epreuve.objects.filter(pk=epreuve.pk).update(annee_scolaire='24/25')
+        epreuve.refresh_from_db()
+        resultat = quota.consommer(user, [epreuve])
+        self.assertIs(resultat.statut, quota.Statut.ACCORDE)
+        self.assertEqual(Download.objects.get(user=user).annee, 0)
+
+    def test_compte_sans_abonnement(self):
+        user = creer_utilisateur('ancien@example.com')
+        Abonnement.objects.filter(user=user).delete()
+        vider_caches()
+        resultat = quota.consommer(user, [self.epreuves[0]])
+        self.assertEqual((resultat.statut, resultat.restants), (quota.Statut.ACCORDE, 2))
+        self.assertEqual(self.utilises(user), 1)
+
+
+class LotsTests(EpreuvesTestCase):
+    """Archive ZIP d'un lot et quota décompté pour tout le lot ou pas du tout"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.epreuves = [cls.creer_epreuve(f'Devoir {i}', matiere=cls.matieres[i % 2]) for i in range(3)]
+        corrigee = cls.epreuves[0]
+        corrigee.fichier_corrige.save('corrige.pdf', ContentFile(b'%PDF-1.4 corrige'), save=False)
+        corrigee.save()
+        cls.url = reverse('epreuves:lot')
+        cls.params = {'annee_scolaire': '2024-2025', 'classe': cls.classes[0].pk}
+
+    def lire(self, contenu):
+        archive = zipfile.ZipFile(io.BytesIO(contenu))
+        self.assertIsNone(archive.testzip())
+        return {nom: archive.read(nom) for nom in archive.namelist()}
+
+    def test_archive(self):
+        lot = bundles.Lot('2024-2025', classe=self.classes[0].pk)
+        archive = lot.archive()
+        contenu = b''.join(archive)
+        self.assertEqual(len(contenu), archive.taille())
+        membres = self.lire(contenu)
+        corrigee = self.epreuves[0]
+        dossier = self.matieres[0].nom  # Un dossier par matière
+        self.assertEqual(len(membres), 4)
+        self.assertEqual(membres[f'{dossier}/{corrigee.slug}_corrige.pdf'], b'%PDF-1.4 corrige')
+        self.assertEqual(membres[f'{dossier}/{corrigee.slug}.pdf'], corrigee.fichier_sujet.read())
+
+    def test_telechargement(self):
+        user = creer_utilisateur('lot@example.com', inclus=5)
+        self.client.force_login(user)
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        contenu = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(contenu))
+        self.assertEqual(len(self.lire(contenu)), 4)
+        self.assertEqual(Abonnement.objects.get(user=user).telechargements_utilises, 3)
+        self.assertEqual(Telechargement.objects.filter(user=user).count(), 3)
+
+    def test_quota_insuffisant(self):
+        """Deux crédits pour un lot de trois nouvelles épreuves : rien n'est décompté"""
+        user = creer_utilisateur('lot@example.com', inclus=2)
+        self.client.force_login(user)
+        response = self.client.get(self.url, self.params)
+        self.assertRedirects(response, reverse('abonnements:plans'), fetch_redirect_response=False)
+        self.assertEqual(Abonnement.objects.get(user=user).telechargements_utilises, 0)
+        self.assertFalse(Telechargement.objects.filter(user=user).exists())
+        self.assertFalse(Download.objects.filter(user=user).exists())
+
+
+@override_settings(CACHES=CACHES_TESTS)
+class QuotaConcurrenceTests(DonneesScolaires, TransactionTestCase):
+    """Téléchargements simultanés d'un même utilisateur, chacun sur sa propre connexion"""
+
+    THREADS = 8
+    TENTATIVES = 40
+    INCLUS = 3
+
+    def setUp(self):
+        super().setUp()
+        self.creer_referentiel()
+        self.epreuves = [self.creer_epreuve(f'Devoir {i}') for i in range(10)]
+
+    def lancer(self, user, lots):
+        depart = threading.Barrier(self.THREADS)
+        restantes = iter(lots)
+        verrou = threading.Lock()
+        statuts, erreurs = Counter(), []
+
+        def travailleur():
+            depart.wait()
+            try:
+                while True:
+                    with verrou:
+                        lot = next(restantes, None)
+                    if lot is None:
+                        return
+                    try:
+                        statut = quota.consommer(user, lot).statut
+                    except Exception as erreur:
+                        erreurs.append(erreur)
+                    else:
+                        with verrou:
+                            statuts[statut] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=travailleur) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(erreurs, [])
+        return statuts
+
+    def test_jamais_au_dela_du_quota(self):
+        user = creer_utilisateur('concurrence@example.com', inclus=self.INCLUS)
+        lots = [[self.epreuves[i % len(self.epreuves)]] for i in range(self.TENTATIVES)]
+        statuts = self.lancer(user, lots)
+
+        abonnement = Abonnement.objects.get(user=user)
+        self.assertEqual(abonnement.telechargements_utilises, abonnement.telechargements_inclus)
+        self.assertEqual(Telechargement.objects.filter(user=user).count(), self.INCLUS)
+        self.assertEqual(Download.objects.filter(user=user).count(), self.INCLUS)
+        self.assertEqual(statuts[quota.Statut.ACCORDE], self.INCLUS)
+        self.assertEqual(sum(statuts.values()), self.TENTATIVES)
+
+    def test_lots_tout_ou_rien(self):
+        user = creer_utilisateur('lots@example.com', inclus=self.INCLUS)
+        lots = [self.epreuves[i:i + 2] for i in range(0, len(self.epreuves), 2)] * 4
+        self.lancer(user, lots)
+
+        abonnement = Abonnement.objects.get(user=user)
+        telecharges = Telechargement.objects.filter(user=user).count()
+        # Des lots de deux : au plus un lot accordé avec trois crédits, jamais de dépassement
+        self.assertEqual(abonnement.telechargements_utilises, telecharges)
+        self.assertLessEqual(telecharges, self.INCLUS)
+        self.assertEqual(telecharges, 2)
+
+
+# ==================== PAGES PARTAGÉES PAR LES CONNECTÉS ====================
+
+class CoquilleTests(EpreuvesTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.epreuves = [cls.creer_epreuve(f'Devoir {i}') for i in range(3)]
+        cls.alice = creer_utilisateur('alice.dupont@example.com')
+        cls.alice.first_name, cls.alice.last_name = 'Alice', 'Dupont'
+        cls.alice.save(update_fields=['first_name', 'last_name'])
+        Favori.objects.create(user=cls.alice, epreuve=cls.epreuves[0])
+        cls.bob = creer_utilisateur('bob@example.com')
+
+    def page(self, user, url):
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_coquille_sans_donnee_personnelle(self):
+        for url in (reverse('epreuves:liste'), reverse('epreuves:detail', args=[self.epreuves[0].slug])):
+            with self.subTest(url=url):
+                premiere = self.page(self.alice, url)
+                seconde = self.page(self.bob, url)
+                self.assertEqual((premiere['X-Cache'], seconde['X-Cache']), ('MISS', 'HIT'))
+                self.assertEqual(premiere.content, seconde.content)
+                contenu = premiere.content.decode()
+                for donnee in ('alice.dupont', 'Dupont', 'csrfmiddlewaretoken'):
+                    self.assertNotIn(donnee, contenu)
+
+    def test_personnalisation(self):
+        self.client.force_login(self.alice)
+        ids = ','.join(str(epreuve.pk) for epreuve in self.epreuves)
+        response = self.client.get(reverse('epreuves:personnalisation'), {'ids': f'{ids},abc,'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response['Cache-Control'].split(', ')), {'private', 'no-store'})
+        donnees = response.json()
+        self.assertEqual(donnees['utilisateur']['nom'], 'Alice')
+        self.assertEqual(len(donnees['epreuves']), 3)
+        self.assertTrue(donnees['epreuves'][str(self.epreuves[0].pk)]['favori'])
+        self.assertFalse(donnees['epreuves'][str(self.epreuves[1].pk)]['favori'])
+
+    def test_personnalisation_limitee(self):
+        self.assertEqual(views.PERSONNALISATION_MAX, 50)
+        self.client.force_login(self.alice)
+        ids = ','.join(str(epreuve.pk) for epreuve in self.epreuves)
+        with mock.patch.object(views, 'PERSONNALISATION_MAX', 2):
+            donnees = self.client.get(reverse('epreuves:personnalisation'), {'ids': ids}).json()
+        self.assertEqual(list(donnees['epreuves']), [str(epreuve.pk) for epreuve in self.epreuves[:2]])
+
+    def test_personnalisation_anonyme(self):
+        response = self.client.get(reverse('epreuves:personnalisation'), {'ids': self.epreuves[0].pk})
+        self.assertEqual(response.status_code, 302)
@@ -8,7 +8,13 @@ app_name = 'epreuves'
 urlpatterns = [
     # Liste des épreuves avec filtres
     path('liste/', views.liste_epreuves, name='liste'),
-    
+
+    # Lot d'épreuves (classe / matière / année) en une archive ZIP
+    path('lot/', views.telecharger_lot, name='lot'),
+
+    # Données de l'utilisateur pour les pages partagées en cache (JSON)
+    path('personnalisation/', views.personnalisation, name='personnalisation'),
+
     # Détail d'une épreuve
     path('<slug:slug>/', views.detail_epreuve, name='detail'),
     
@@ -1,17 +1,23 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import FileResponse, Http404, JsonResponse
-from django.db.models import Q, Count, Prefetch
-from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from datetime import datetime
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header
 
-from .models import (
-    Epreuve, Matiere, Classe, Niveau, Serie, Periode, 
-    Telechargement, Favori
-)
-from dashboard.models import Abonnement
+from .models import Epreuve, EpreuveListing, Telechargement, Favori
+from . import search as recherche
+from . import bundles, quota, recommendations, taxonomy
+from .facets import compter as compter_facettes
+from core import delivery, pagecache
+from core.decorators import budget_requetes, connexion_requise
+from core.pagecache import cache_partage
+from core.pagination import CursorPaginator
+from dashboard import subscription
 
 
 def get_annee_scolaire_actuelle():
@@ -23,13 +29,19 @@ def get_annee_scolaire_actuelle():
         return f"{now.year - 1}-{now.year}"
 
 
+@budget_requetes(16)
+@cache_partage('epreuves', parametres={
+    'classe': None, 'matiere': None, 'periode': None, 'serie': None, 'type_epreuve': None,
+    # Absent : année en cours ; vide : toutes les années
+    'annee_scolaire': get_annee_scolaire_actuelle,
+    'q': None, 'curseur': None,
+}, connectes=True)
 def liste_epreuves(request):
     """Liste des épreuves avec filtres adaptés au Bénin"""
     
-    # Base queryset optimisée
-    epreuves = Epreuve.objects.filter(is_active=True).select_related(
-        'matiere', 'classe', 'classe__niveau', 'serie', 'periode'
-    )
+    # Projection dénormalisée : noms affichés et clés de tri dans une seule
+    # table, filtrée et triée par ses index, sans jointure
+    epreuves = EpreuveListing.objects.filter(is_active=True)
     
     # Filtres
     classe_id = request.GET.get('classe')
@@ -46,173 +58,175 @@ def liste_epreuves(request):
         epreuves = epreuves.filter(matiere_id=matiere_id)
     if periode_id:
         if periode_id == 'exam':
-            epreuves = epreuves.filter(type_epreuve__in=['ceped', 'bepc', 'bac_1', 'bac_2', 'bac_blanc'])
+            epreuves = epreuves.filter(is_examen=True)
         else:
             epreuves = epreuves.filter(periode_id=periode_id)
     if serie_id:
-        epreuves = epreuves.filter(serie_id=series_id)
+        epreuves = epreuves.filter(serie_id=serie_id)
     if type_epreuve:
         epreuves = epreuves.filter(type_epreuve=type_epreuve)
     if annee_scolaire:
         epreuves = epreuves.filter(annee_scolaire=annee_scolaire)
     if search:
-        epreuves = epreuves.filter(
-            Q(titre__icontains=search) |
-            Q(matiere__nom__icontains=search) |
-            Q(description__icontains=search) |
-            Q(classe__nom__icontains=search)
-        )
+        # Index plein texte (FTS5), trié par pertinence
+        epreuves = recherche.filtrer(epreuves, search)
+    
+    # Pagination par curseur (pas d'OFFSET, total mis en cache)
+    paginator = CursorPaginator(epreuves, 12)
+    epreuves_page = paginator.get_page(request.GET.get('curseur'))
     
-    # Pagination
-    paginator = Paginator(epreuves, 12)
-    page = request.GET.get('page')
-    epreuves_page = paginator.get_page(page)
+    filtres = {
+        'classe': classe_id,
+        'matiere': matiere_id,
+        'periode': periode_id,
+        'serie': serie_id,
+        'type_epreuve': type_epreuve,
+        'annee_scolaire': annee_scolaire,
+        'q': search,
+    }
+    
+    # Données pour les filtres, avec le nombre d'épreuves par option
+    facettes = compter_facettes(filtres)
+    taxonomie = taxonomy.registre()
+    classes = taxonomy.copier(taxonomie.liste('classe'))
+    matieres = taxonomy.copier(m for m in taxonomie.liste('matiere') if m.is_active)
+    periodes = taxonomy.copier(taxonomie.liste('periode'))
+    series = taxonomy.copier(taxonomie.liste('serie'))
+    for facette, options in (('classe', classes), ('matiere', matieres), ('periode', periodes), ('serie', series)):
+        for option in options:
+            option.nb_epreuves = facettes[facette].get(option.id, 0)
     
-    # Données pour les filtres
     context = {
         'epreuves': epreuves_page,
-        'total_epreuves': epreuves.count(),
-        'classes': Classe.objects.select_related('niveau').all(),
-        'matieres': Matiere.objects.filter(is_active=True),
-        'periodes': Periode.objects.all(),
-        'series': Serie.objects.all(),
+        'total_epreuves': paginator.count,
+        'classes': classes,
+        'matieres': matieres,
+        'periodes': periodes,
+        'series': series,
+        'facettes': facettes,
         'annees_scolaires': [f"{y}-{y+1}" for y in range(2024, 2019, -1)],
         'annee_actuelle': get_annee_scolaire_actuelle(),
-        'filtres': {
-            'classe': classe_id,
-            'matiere': matiere_id,
-            'periode': periode_id,
-            'serie': serie_id,
-            'type_epreuve': type_epreuve,
-            'annee_scolaire': annee_scolaire,
-            'q': search,
-        }
+        'filtres': filtres,
+        'duree_cache_cartes': settings.FRAGMENT_CACHE_TIMEOUT,
+        # Connecté : coquille commune, complétée par `personnalisation` (JSON)
+        'coquille': request.user.is_authenticated,
     }
     
-    # Données utilisateur connecté
-    if request.user.is_authenticated:
-        abonnement, _ = Abonnement.objects.get_or_create(
-            user=request.user,
-            defaults={'plan': 'gratuit', 'telechargements_inclus': 3}
-        )
-        context['abonnement'] = abonnement
-        context['can_download'] = abonnement.telechargements_restant() > 0 or abonnement.plan != 'gratuit'
-        context['downloads_remaining'] = abonnement.telechargements_restant()
-        
-        # IDs déjà téléchargés
-        context['downloaded_ids'] = list(
-            Telechargement.objects.filter(user=request.user).values_list('epreuve_id', flat=True)
-        )
-        
-        # Favoris
-        context['favoris_ids'] = list(
-            Favori.objects.filter(user=request.user).values_list('epreuve_id', flat=True)
-        )
-    
     return render(request, 'epreuves/liste.html', context)
 
 
+@budget_requetes(17)
+@cache_partage('epreuves', connectes=True)
 def detail_epreuve(request, slug):
     """Page détail d'une épreuve"""
-    epreuve = get_object_or_404(
-        Epreuve.objects.select_related('matiere', 'classe', 'serie', 'periode'),
-        slug=slug, 
-        is_active=True
-    )
+    epreuve = get_object_or_404(Epreuve, slug=slug, is_active=True)
+    taxonomy.attacher([epreuve])
     
-    # Incrémenter les vues
-    epreuve.nombre_vues += 1
-    epreuve.save(update_fields=['nombre_vues'])
+    # Incrémenter les vues (écriture différée, groupée par intervalle)
+    pagecache.compter(request, epreuve, 'nombre_vues')
     
-    # Épreuves similaires (même classe, même matière ou même période)
-    similaires = Epreuve.objects.filter(
-        classe=epreuve.classe,
-        is_active=True
-    ).exclude(id=epreuve.id).select_related('matiere', 'periode')[:4]
+    # Épreuves similaires (co-téléchargements, sinon même classe / matière)
+    similaires = recommendations.similaires(epreuve)
     
     context = {
         'epreuve': epreuve,
         'similaires': similaires,
+        # Connecté : coquille commune ; accès, téléchargement, favori et
+        # quota viennent de `personnalisation` (JSON)
+        'coquille': request.user.is_authenticated,
     }
     
-    if request.user.is_authenticated:
-        # Abonnement
-        abonnement, _ = Abonnement.objects.get_or_create(
-            user=request.user,
-            defaults={'plan': 'gratuit'}
-        )
-        
-        # Droits d'accès
-        has_access = (
-            abonnement.plan in ['mensuel', 'annuel'] or
-            not epreuve.is_premium
-        )
-        
-        # Déjà téléchargé ?
-        deja_telecharge = Telechargement.objects.filter(
-            user=request.user,
-            epreuve=epreuve
-        ).exists()
-        
-        context.update({
-            'abonnement': abonnement,
-            'has_access': has_access,
-            'deja_telecharge': deja_telecharge,
-            'downloads_remaining': abonnement.telechargements_restant(),
-            'est_favori': Favori.objects.filter(user=request.user, epreuve=epreuve).exists(),
-        })
-    
     return render(request, 'epreuves/detail.html', context)
 
 
+# Épreuves au plus par appel : une page de la liste, ou une seule (détail)
+PERSONNALISATION_MAX = 50
+
+
 @login_required
-def telecharger_epreuve(request, slug):
-    """Téléchargement d'une épreuve"""
-    epreuve = get_object_or_404(Epreuve, slug=slug, is_active=True)
+@budget_requetes(8)
+def personnalisation(request):
+    """
+    Données propres à l'utilisateur des pages partagées (liste, détail) :
+    profil affiché dans l'en-tête, abonnement et, pour chaque épreuve de
+    ?ids=1,2,3, accès, déjà téléchargée, en favori. Une requête IN par table.
+    """
+    ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.isdigit()][:PERSONNALISATION_MAX]
+    user = request.user
+    abonnement = request.subscription
     
-    # Vérifier droits
-    abonnement, _ = Abonnement.objects.get_or_create(
-        user=request.user,
-        defaults={'plan': 'gratuit', 'telechargements_inclus': 3}
+    premium = dict(EpreuveListing.objects.filter(pk__in=ids).values_list('id', 'is_premium'))
+    telechargees = set(
+        Telechargement.objects.filter(user=user, epreuve_id__in=premium).values_list('epreuve_id', flat=True)
+    )
+    favorites = set(
+        Favori.objects.filter(user=user, epreuve_id__in=premium).values_list('epreuve_id', flat=True)
     )
     
-    deja_telecharge = Telechargement.objects.filter(
-        user=request.user, 
-        epreuve=epreuve
-    ).exists()
+    response = JsonResponse({
+        'utilisateur': {
+            'nom': user.get_display_name(),
+            'email': user.email,
+            'initiales': user.get_initials(),
+            'avatar': user.avatar.url if user.avatar else None,
+        },
+        'abonnement': {
+            'plan': abonnement.plan,
+            'plan_nom': abonnement.get_plan_display(),
+            'is_premium': abonnement.is_premium,
+            'can_download': abonnement.can_download,
+            'downloads_remaining': abonnement.downloads_remaining,
+        },
+        'epreuves': {
+            pk: {
+                'acces': abonnement.is_premium or not est_premium,
+                'telecharge': pk in telechargees,
+                'favori': pk in favorites,
+            }
+            for pk, est_premium in premium.items()
+        },
+        # La coquille en cache ne porte pas de jeton : celui-ci sert aux favoris
+        'csrf': get_token(request),
+    })
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+# Vues asynchrones : l'envoi du fichier (parfois long sur mobile) n'occupe
+# pas de worker ; droits et quota sont vérifiés avec l'ORM asynchrone
+@connexion_requise
+@budget_requetes(11)
+async def telecharger_epreuve(request, slug):
+    """Téléchargement d'une épreuve"""
+    epreuve = await aget_object_or_404(
+        Epreuve.objects.select_related('matiere', 'classe'), slug=slug, is_active=True
+    )
+    user = await request.auser()
     
-    if not deja_telecharge:
-        if abonnement.plan == 'gratuit' and abonnement.telechargements_restant() <= 0:
-            messages.error(request, "Vous avez épuisé vos 3 téléchargements gratuits.")
-            return redirect('abonnements:plans')
-        
-        # Enregistrer téléchargement
-        Telechargement.objects.create(
-            user=request.user,
-            epreuve=epreuve,
-            ip_address=get_client_ip(request),
-            utilise_credit_gratuit=(abonnement.plan == 'gratuit')
-        )
-        
-        # Mettre à jour compteurs
-        if abonnement.plan == 'gratuit':
-            abonnement.telechargements_utilises += 1
-            abonnement.save()
-        
-        epreuve.nombre_telechargements += 1
-        epreuve.save()
-        
-        messages.success(
-            request, 
-            f"Téléchargement réussi ! Il vous reste {abonnement.telechargements_restant()} téléchargements."
-        )
+    # Enregistrer et décompter (atomique, sans risque de dépasser le quota)
+    resultat = await sync_to_async(quota.consommer)(
+        user, [epreuve], subscription=await subscription.acharger(user), ip_address=get_client_ip(request)
+    )
+    if resultat.statut is quota.Statut.QUOTA_EPUISE:
+        messages.error(request, "Vous avez épuisé vos 3 téléchargements gratuits.")
+        return redirect('abonnements:plans')
+    if resultat.statut is quota.Statut.ACCORDE:
+        if resultat.restants is None:
+            messages.success(request, "Téléchargement réussi !")
+        else:
+            messages.success(
+                request,
+                f"Téléchargement réussi ! Il vous reste {resultat.restants} téléchargements."
+            )
     
     # Servir fichier
     try:
-        response = FileResponse(
-            epreuve.fichier_sujet.open(),
+        response = await delivery.aservir(
+            request,
+            epreuve.fichier_sujet,
             content_type='application/pdf',
             as_attachment=True,
+            empreinte=epreuve.empreinte_sujet,
             filename=f"{epreuve.matiere.nom}_{epreuve.classe.nom}_{epreuve.annee_scolaire}.pdf"
         )
         return response
@@ -220,10 +234,13 @@ def telecharger_epreuve(request, slug):
         raise Http404("Fichier non trouvé")
 
 
-@login_required
-def telecharger_corrige(request, slug):
+@connexion_requise
+@budget_requetes(8)
+async def telecharger_corrige(request, slug):
     """Téléchargement du corrigé"""
-    epreuve = get_object_or_404(Epreuve, slug=slug, is_active=True)
+    epreuve = await aget_object_or_404(
+        Epreuve.objects.select_related('matiere', 'classe'), slug=slug, is_active=True
+    )
     
     if not epreuve.fichier_corrige:
         raise Http404("Corrigé non disponible")
@@ -232,10 +249,12 @@ def telecharger_corrige(request, slug):
     # (code similaire)
     
     try:
-        response = FileResponse(
-            epreuve.fichier_corrige.open(),
+        response = await delivery.aservir(
+            request,
+            epreuve.fichier_corrige,
             content_type='application/pdf',
             as_attachment=True,
+            empreinte=epreuve.empreinte_corrige,
             filename=f"CORRIGE_{epreuve.matiere.nom}_{epreuve.classe.nom}_{epreuve.annee_scolaire}.pdf"
         )
         return response
@@ -244,6 +263,71 @@ def telecharger_corrige(request, slug):
 
 
 @login_required
+@budget_requetes(18)
+def telecharger_lot(request):
+    """Épreuves d'une classe et/ou d'une matière pour une année, en une archive ZIP"""
+    annee_scolaire = request.GET.get('annee_scolaire', get_annee_scolaire_actuelle())
+    criteres = {}
+    for critere in bundles.CRITERES:
+        valeur = request.GET.get(critere)
+        if valeur:
+            if not valeur.isdigit():
+                raise Http404("Critère invalide")
+            criteres[critere] = int(valeur)
+    if not criteres.get('classe') and not criteres.get('matiere'):
+        raise Http404("Choisissez une classe ou une matière")
+
+    abonnement = request.subscription
+    lot = bundles.Lot(
+        annee_scolaire,
+        corriges=request.GET.get('corriges', '1') != '0',
+        premium=abonnement.is_premium,
+        **criteres,
+    )
+    if not lot:
+        raise Http404("Aucune épreuve dans ce lot")
+
+    resultat = quota.consommer(
+        request.user,
+        lot.epreuves,
+        subscription=abonnement,
+        ip_address=get_client_ip(request),
+        corriges=lot.ids_corriges(),
+    )
+    if resultat.statut is quota.Statut.QUOTA_EPUISE:
+        messages.error(
+            request,
+            f"Ce lot compte {resultat.necessaires} nouvelles épreuves, "
+            f"il vous reste {resultat.restants} téléchargements."
+        )
+        return redirect('abonnements:plans')
+    nouvelles = len(resultat.nouvelles)
+    if nouvelles:
+        messages.success(request, f"{nouvelles} épreuve{'s' if nouvelles > 1 else ''} ajoutée{'s' if nouvelles > 1 else ''} à vos téléchargements.")
+
+    # Archive déjà sur disque : servie comme un fichier (Range, ETag)
+    archive = bundles.en_cache(lot)
+    if archive is not None:
+        return delivery.servir(
+            request,
+            archive,
+            content_type='application/zip',
+            as_attachment=True,
+            empreinte=lot.empreinte(),
+            cache_control='private, no-cache',
+            filename=lot.nom_archive(),
+        )
+
+    response = StreamingHttpResponse(bundles.flux(lot), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, lot.nom_archive())
+    taille = lot.archive().taille()
+    if taille is not None:
+        response['Content-Length'] = str(taille)
+    return response
+
+
+@login_required
+@budget_requetes(7)
 def toggle_favori(request, slug):
     """Ajouter/Retirer des favoris"""
     epreuve = get_object_or_404(Epreuve, slug=slug)
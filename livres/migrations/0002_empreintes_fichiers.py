@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:43
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livres', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livre',
+            name='empreinte_epub',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='livre',
+            name='empreinte_pdf',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='livre',
+            name='fichier_epub',
+            field=models.FileField(blank=True, null=True, storage=core.storage.cas_storage, upload_to='livres/epub/%Y/'),
+        ),
+        migrations.AlterField(
+            model_name='livre',
+            name='fichier_pdf',
+            field=models.FileField(blank=True, null=True, storage=core.storage.cas_storage, upload_to='livres/pdf/%Y/'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('livres', '0002_empreintes_fichiers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='livre',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', 'id', 'is_active'], name='livres_actifs_recents_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livre',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['categorie', '-created_at', 'id'], name='livres_actifs_categorie_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livre',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['format_disponible', '-created_at', 'id'], name='livres_actifs_format_idx'),
+        ),
+    ]
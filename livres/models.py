@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils.text import slugify
 
+from core.storage import cas_storage
+
 User = get_user_model()
 
 
@@ -52,9 +54,13 @@ class Livre(models.Model):
     annee_publication = models.PositiveSmallIntegerField(null=True, blank=True)
     langue = models.CharField(max_length=20, default='Français')
     
-    # Fichiers
-    fichier_pdf = models.FileField(upload_to='livres/pdf/%Y/', blank=True, null=True)
-    fichier_epub = models.FileField(upload_to='livres/epub/%Y/', blank=True, null=True)
+    # Fichiers (stockés une fois par contenu, voir core/storage.py)
+    fichier_pdf = models.FileField(upload_to='livres/pdf/%Y/', blank=True, null=True, storage=cas_storage)
+    fichier_epub = models.FileField(upload_to='livres/epub/%Y/', blank=True, null=True, storage=cas_storage)
+    
+    # Empreintes SHA-256 des fichiers (ETag fort, cache immuable)
+    empreinte_pdf = models.CharField(max_length=64, blank=True, editable=False)
+    empreinte_epub = models.CharField(max_length=64, blank=True, editable=False)
     format_disponible = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='pdf')
     
     # Couverture
@@ -81,11 +87,36 @@ class Livre(models.Model):
         indexes = [
             models.Index(fields=['categorie', 'is_premium']),
             models.Index(fields=['slug']),
+            # Bibliothèque : livres actifs dans l'ordre de la pagination (-created_at, id) ;
+            # is_active en dernier pour que le total lise l'index seul
+            models.Index(
+                fields=['-created_at', 'id', 'is_active'],
+                condition=models.Q(is_active=True),
+                name='livres_actifs_recents_idx',
+            ),
+            models.Index(
+                fields=['categorie', '-created_at', 'id'],
+                condition=models.Q(is_active=True),
+                name='livres_actifs_categorie_idx',
+            ),
+            models.Index(
+                fields=['format_disponible', '-created_at', 'id'],
+                condition=models.Q(is_active=True),
+                name='livres_actifs_format_idx',
+            ),
         ]
     
     def __str__(self):
         return f"{self.titre} - {self.auteur}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valeurs telles que chargées : noms des fichiers comparés au save()
+        # suivant (références, core.storage) sans relire la ligne
+        instance._etat_charge = dict(zip(field_names, values))
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             base_slug = slugify(self.titre[:50])
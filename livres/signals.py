@@ -0,0 +1,48 @@
+# apps/livres/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core import pagecache
+from core.storage import suivre_references
+
+from .models import Avis, Categorie, Livre
+
+
+# ==================== FICHIERS (STOCKAGE PAR CONTENU) ====================
+
+suivre_references(Livre, {
+    'fichier_pdf': 'empreinte_pdf',
+    'fichier_epub': 'empreinte_epub',
+})
+
+
+# ==================== CARTES EN CACHE ====================
+
+@receiver(post_save, sender=Categorie)
+def renouveler_cartes(sender, instance, raw=False, created=False, **kwargs):
+    """La couleur de la catégorie est dans la carte en cache de ses livres"""
+    if raw or created:
+        return
+    Livre.objects.filter(categorie=instance).update(updated_at=timezone.now())
+
+
+# ==================== PAGES EN CACHE (VISITEURS ANONYMES) ====================
+
+def invalider_pages():
+    pagecache.invalider('livres')
+
+
+@receiver(post_save, sender=Livre)
+@receiver(post_delete, sender=Livre)
+@receiver(post_save, sender=Categorie)
+@receiver(post_delete, sender=Categorie)
+@receiver(post_save, sender=Avis)
+@receiver(post_delete, sender=Avis)
+def invalider_pages_livres(sender, raw=False, **kwargs):
+    """Bibliothèque et détails des livres en cache : nouvelle version après le commit"""
+    if raw:
+        return
+    transaction.on_commit(invalider_pages)
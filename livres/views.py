@@ -1,14 +1,20 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import FileResponse, Http404, JsonResponse
+from django.http import Http404, JsonResponse
 from django.db.models import Q, Avg
-from django.core.paginator import Paginator
 
 from .models import Livre, Categorie, AchatLivre, Lecture, Avis
-from dashboard.models import Abonnement
+from core import counters, delivery
+from core.decorators import budget_requetes, connexion_requise
+from core.pagecache import cache_partage
+from core.pagination import CursorPaginator
+from dashboard import subscription
 
 
+@budget_requetes(9)
+@cache_partage('livres', parametres={'categorie': None, 'q': None, 'format': None, 'curseur': None})
 def bibliotheque(request):
     """Bibliothèque de livres"""
     livres = Livre.objects.filter(is_active=True).select_related('categorie')
@@ -29,34 +35,36 @@ def bibliotheque(request):
     if format_type:
         livres = livres.filter(format_disponible=format_type)
     
-    # Pagination
-    paginator = Paginator(livres, 9)
-    page = request.GET.get('page')
-    livres_page = paginator.get_page(page)
+    # Pagination par curseur (pas d'OFFSET, total mis en cache)
+    paginator = CursorPaginator(livres, 9)
+    livres_page = paginator.get_page(request.GET.get('curseur'))
     
     context = {
         'livres': livres_page,
         'categories': Categorie.objects.filter(is_active=True),
-        'total_livres': livres.count(),
+        'total_livres': paginator.count,
+        'duree_cache_cartes': settings.FRAGMENT_CACHE_TIMEOUT,
     }
     
     # Si connecté, vérifier accès
     if request.user.is_authenticated:
-        abonnement, _ = Abonnement.objects.get_or_create(
-            user=request.user,
-            defaults={'plan': 'gratuit'}
-        )
-        context['abonnement'] = abonnement
-        context['has_access'] = abonnement.plan in ['mensuel', 'annuel']
+        context['abonnement'] = request.subscription
+        context['has_access'] = request.subscription.is_premium
         
-        # Livres achetés individuellement
-        context['achats_ids'] = list(
-            AchatLivre.objects.filter(user=request.user).values_list('livre_id', flat=True)
+        # Livres achetés individuellement, parmi ceux de la page
+        achetes = set(
+            AchatLivre.objects.filter(
+                user=request.user, livre_id__in=[livre.id for livre in livres_page]
+            ).values_list('livre_id', flat=True)
         )
+        for livre in livres_page:
+            livre.is_achete = livre.id in achetes
     
     return render(request, 'livres/bibliotheque.html', context)
 
 
+@budget_requetes(14)
+@cache_partage('livres')
 def detail_livre(request, slug):
     """Page détail d'un livre"""
     livre = get_object_or_404(Livre, slug=slug, is_active=True)
@@ -80,13 +88,10 @@ def detail_livre(request, slug):
     
     if request.user.is_authenticated:
         # Vérifier accès
-        abonnement, _ = Abonnement.objects.get_or_create(
-            user=request.user,
-            defaults={'plan': 'gratuit'}
-        )
+        abonnement = request.subscription
         
         has_access = (
-            abonnement.plan in ['mensuel', 'annuel'] or
+            abonnement.is_premium or
             AchatLivre.objects.filter(user=request.user, livre=livre).exists() or
             not livre.is_premium
         )
@@ -111,18 +116,14 @@ def detail_livre(request, slug):
 
 
 @login_required
+@budget_requetes(10)
 def lecture_livre(request, slug):
     """Lecteur en ligne"""
     livre = get_object_or_404(Livre, slug=slug, is_active=True)
     
     # Vérifier les droits d'accès
-    abonnement, _ = Abonnement.objects.get_or_create(
-        user=request.user,
-        defaults={'plan': 'gratuit'}
-    )
-    
     has_access = (
-        abonnement.plan in ['mensuel', 'annuel'] or
+        request.subscription.is_premium or
         AchatLivre.objects.filter(user=request.user, livre=livre).exists() or
         not livre.is_premium
     )
@@ -140,8 +141,7 @@ def lecture_livre(request, slug):
     
     # Incrémenter le compteur de lectures
     if created:
-        livre.nombre_lectures += 1
-        livre.save()
+        counters.incrementer(livre, 'nombre_lectures')
     
     context = {
         'livre': livre,
@@ -151,21 +151,20 @@ def lecture_livre(request, slug):
     return render(request, 'livres/lecture.html', context)
 
 
-@login_required
-def telecharger_livre(request, slug):
+# Vue asynchrone : le fichier (et les plages lues par le lecteur en ligne)
+# est envoyé sans occuper de worker ; droits vérifiés avec l'ORM asynchrone
+@connexion_requise
+@budget_requetes(8)
+async def telecharger_livre(request, slug):
     """Téléchargement du livre"""
-    livre = get_object_or_404(Livre, slug=slug, is_active=True)
+    livre = await aget_object_or_404(Livre, slug=slug, is_active=True)
+    user = await request.auser()
     
     # Vérifier droits
-    abonnement, _ = Abonnement.objects.get_or_create(
-        user=request.user,
-        defaults={'plan': 'gratuit'}
-    )
-    
     has_access = (
-        abonnement.plan in ['mensuel', 'annuel'] or
-        AchatLivre.objects.filter(user=request.user, livre=livre).exists() or
-        not livre.is_premium
+        not livre.is_premium or
+        (await subscription.acharger(user)).is_premium or
+        await AchatLivre.objects.filter(user=user, livre=livre).aexists()
     )
     
     if not has_access:
@@ -174,20 +173,23 @@ def telecharger_livre(request, slug):
     
     # Choisir le fichier
     fichier = livre.fichier_pdf or livre.fichier_epub
+    empreinte = livre.empreinte_pdf if livre.fichier_pdf else livre.empreinte_epub
     if not fichier:
         raise Http404("Fichier non disponible")
     
-    # Incrémenter compteur
-    livre.nombre_telechargements += 1
-    livre.save()
+    # Incrémenter compteur (écriture différée), sauf pour les reprises (Range)
+    if not request.headers.get('Range'):
+        await counters.aincrementer(livre, 'nombre_telechargements')
     
     # Servir le fichier
     try:
-        response = FileResponse(
-            fichier.open(),
+        response = await delivery.aservir(
+            request,
+            fichier,
             content_type='application/pdf' if fichier.name.endswith('.pdf') else 'application/epub+zip',
             as_attachment=True,
-            filename=f"{livre.titre}.{fichier.name.split('.')[-1]}"
+            filename=f"{livre.titre}.{fichier.name.split('.')[-1]}",
+            empreinte=empreinte,
         )
         return response
     except FileNotFoundError:
@@ -195,6 +197,7 @@ def telecharger_livre(request, slug):
 
 
 @login_required
+@budget_requetes(7)
 def sauvegarder_progression(request, slug):
     """API pour sauvegarder la progression (AJAX)"""
     if request.method != 'POST':
@@ -211,13 +214,14 @@ def sauvegarder_progression(request, slug):
     
     lecture.page_actuelle = int(page)
     lecture.pourcentage = int(pourcentage)
-    lecture.termine = (pourcentage >= 95)
+    lecture.termine = (lecture.pourcentage >= 95)
     lecture.save()
     
     return JsonResponse({'success': True, 'termine': lecture.termine})
 
 
 @login_required
+@budget_requetes(11)
 def ajouter_avis(request, slug):
     """Ajouter un avis"""
     livre = get_object_or_404(Livre, slug=slug)
@@ -240,7 +244,8 @@ def ajouter_avis(request, slug):
         moyenne = livre.avis.aggregate(Avg('note'))['note__avg'] or 0
         livre.note_moyenne = round(moyenne, 2)
         livre.nombre_avis = livre.avis.count()
-        livre.save()
+        # updated_at : la note est affichée dans la carte en cache (bibliotheque.html)
+        livre.save(update_fields=['note_moyenne', 'nombre_avis', 'updated_at'])
         
         messages.success(request, "Merci pour votre avis !")
     